@@ -1,41 +1,104 @@
+import io
 import os
 import re
+import csv
+import hmac
+import json
+import secrets
+import time
 import logging
-import random
-import string
-from datetime import datetime, timedelta
-from flask import Flask, render_template, request, redirect, url_for, flash, abort, jsonify, session
+import functools
+from datetime import datetime, timedelta, timezone
+from flask import Flask, Response, current_app, make_response, render_template, request, redirect, url_for, flash, abort, jsonify, session, g, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import bindparam
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import validates
 from urllib.parse import urlparse
+from url_utils import canonicalize_url, url_digest
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.exceptions import HTTPException
 
-logging.basicConfig(level=logging.DEBUG)
+from log_config import configure_logging, get_logger
+log_handler = configure_logging()
+redirect_log = get_logger('redirect')
+shorten_log = get_logger('shorten')
 
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "default-secret-key-for-development")
+class Views:
+    """Collects routes, error handlers and request hooks so create_app() can
+    add them to each app it builds, with the same endpoint names as ``@app.route``."""
 
-from config import get_database_url
-app.config['SQLALCHEMY_DATABASE_URI'] = get_database_url()
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    def __init__(self):
+        self._setup = []
 
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-    'pool_size': 10,  
-    'pool_recycle': 300,  
-    'pool_pre_ping': True,  
-    'max_overflow': 20,  
-    'connect_args': {
-        'connect_timeout': 10,  
-        'application_name': 'url_shortener',  
-    },
-    'pool_timeout': 30,  
-    'echo_pool': True if app.debug else False  
-}
+    def route(self, rule, **options):
+        def decorator(view):
+            self._setup.append(lambda app: app.add_url_rule(rule, view_func=view, **options))
+            return view
+        return decorator
 
-db = SQLAlchemy(app)
+    def errorhandler(self, code):
+        def decorator(handler):
+            self._setup.append(lambda app: app.register_error_handler(code, handler))
+            return handler
+        return decorator
 
-login_manager = LoginManager(app)
+    def before_request(self, hook):
+        self._setup.append(lambda app: app.before_request(hook))
+        return hook
+
+    def after_request(self, hook):
+        self._setup.append(lambda app: app.after_request(hook))
+        return hook
+
+    def register(self, app):
+        for setup in self._setup:
+            setup(app)
+
+views = Views()
+
+# The app that background work (visit flushes, code filter scans, scheduled
+# cleanup) runs in: the one create_app() built last.
+background_app = None
+
+def background_context():
+    if background_app is None:
+        raise RuntimeError("create_app() has not been called")
+    return background_app.app_context()
+
+from config import get_database_url, get_replica_urls, get_engine_options, get_int_setting, get_float_setting
+
+from metrics import Metrics, instrument_engine, pool_collector, timed_pool_class
+metrics = Metrics(flush_interval=get_float_setting('METRICS_FLUSH_INTERVAL', 5.0))
+
+from rate_limit import LoadShedder, TokenBucketStore, parse_limits
+load_shedder = LoadShedder(threshold=get_float_setting('SHED_POOL_WAIT_MS', 100) / 1000)
+rate_limits = parse_limits(os.environ.get('RATE_LIMITS', 'shorten=30/60,api=60/60,batch=10/60'))
+rate_limiter = TokenBucketStore(path=os.environ.get('RATE_LIMIT_PATH'))
+
+from replicas import ReplicaSet, RoutingSession, replica_reads, NO_PIN_KEY
+replica_set = ReplicaSet(
+    get_replica_urls(),
+    engine_options=get_engine_options,
+    max_lag=get_float_setting('REPLICA_MAX_LAG', 5.0),
+    check_interval=get_float_setting('REPLICA_CHECK_INTERVAL', 5.0),
+    on_engine=lambda engine: instrument_engine(engine, metrics)
+)
+
+db = SQLAlchemy(session_options={
+    'class_': RoutingSession,
+    'replicas': replica_set,
+    'read_your_writes': get_float_setting('READ_YOUR_WRITES_WINDOW', 10.0)
+})
+
+from url_cache import URLCache, CachedURL
+url_cache = URLCache(
+    max_size=get_int_setting('URL_CACHE_SIZE', 10000),
+    ttl=get_float_setting('URL_CACHE_TTL', 60)
+)
+
+login_manager = LoginManager()
 login_manager.login_view = 'login'
 login_manager.login_message_category = 'info'
 
@@ -60,22 +123,39 @@ class User(UserMixin, db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+user_cache = URLCache(
+    max_size=get_int_setting('USER_CACHE_SIZE', 10000),
+    ttl=get_float_setting('USER_CACHE_TTL', 30)
+)
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Cached users are detached from any session and shared by this worker's
+    # requests, so they are read-only: views that change a user must load it
+    # with db.session.get() and call forget_user() after committing.
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    user = db.session.get(User, int(user_id))
+    if user is not None and user_cache.max_size > 0:
+        db.session.expunge(user)
+        user_cache.put(user_id, user)
+    return user
 
-with app.app_context():
-    try:
-        db.create_all()
-        logging.info("Database tables created successfully")
-    except Exception as e:
-        logging.error(f"Error creating database tables: {str(e)}")
+def forget_user(user_id):
+    user_cache.invalidate(str(user_id))
 
 class URL(db.Model):
     __tablename__ = 'urls'
+    __table_args__ = (
+        db.Index('ix_urls_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_urls_created', 'created_at', 'id'),
+        db.Index('ix_urls_last_checked', 'last_checked'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     original_url = db.Column(db.String(2048), nullable=False)
+    url_hash = db.Column(db.String(64), nullable=True, index=True)
     short_code = db.Column(db.String(50), unique=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     expires_at = db.Column(db.DateTime, nullable=True)
@@ -98,6 +178,11 @@ class URL(db.Model):
     
     def __repr__(self):
         return f'<URL {self.short_code}>'
+    
+    @validates('original_url')
+    def _update_url_hash(self, key, value):
+        self.url_hash = url_digest(value) if value else None
+        return value
         
     def is_expired(self):
         
@@ -117,6 +202,29 @@ class URL(db.Model):
         
         return False
     
+    @classmethod
+    def expired_clause(cls, now=None):
+        """SQL equivalent of is_expired(), for filtering and set-based deletes."""
+        now = now or datetime.utcnow()
+        time_expired = db.and_(cls.expires_at.isnot(None), cls.expires_at < now)
+        visits_expired = db.and_(cls.max_visits.isnot(None), cls.visits >= cls.max_visits)
+        return db.or_(
+            db.and_(cls.expiration_type == 'date', time_expired),
+            db.and_(cls.expiration_type == 'visits', visits_expired),
+            db.and_(cls.expiration_type == 'both', db.or_(time_expired, visits_expired))
+        )
+    
+    @classmethod
+    def visit_left_clause(cls, now=None):
+        """Visit-limited links that are live and have at least one visit left."""
+        now = now or datetime.utcnow()
+        return db.and_(
+            cls.expiration_type.in_(['visits', 'both']),
+            cls.max_visits.isnot(None),
+            cls.visits < cls.max_visits,
+            db.or_(cls.expiration_type == 'visits', cls.expires_at.is_(None), cls.expires_at >= now)
+        )
+    
     def get_health_status(self):
         if not self.is_active:
             return "Inactive"
@@ -147,25 +255,419 @@ class URL(db.Model):
         else:  
             return "Slow"
 
-def generate_short_code(length=6):
-    chars = string.ascii_letters + string.digits
+class ClickEvent(db.Model):
+    __tablename__ = 'click_events'
+    # Append-only; on PostgreSQL the table is range-partitioned by day (see
+    # click_log.py) so retention drops whole partitions instead of rows. The
+    # PARTITION BY clause is added by migrate_db.create_tables, so importing
+    # the app does not load the PostgreSQL dialect.
+    __table_args__ = (
+        db.PrimaryKeyConstraint('clicked_at', 'id'),
+        db.Index('ix_click_events_url_clicked', 'url_id', 'clicked_at'),
+    )
+    
+    id = db.Column(db.BigInteger, nullable=False, autoincrement=False)
+    clicked_at = db.Column(db.DateTime, nullable=False)
+    url_id = db.Column(db.Integer, nullable=False)
+    short_code = db.Column(db.String(50), nullable=True)
+    referer = db.Column(db.String(2048), nullable=True)
+    user_agent = db.Column(db.String(512), nullable=True)
+    ip_address = db.Column(db.String(45), nullable=True)
+    
+    def __repr__(self):
+        return f'<ClickEvent {self.url_id} {self.clicked_at}>'
+
+    def to_dict(self):
+        return {
+            'clicked_at': self.clicked_at.isoformat(),
+            'referer': self.referer,
+            'user_agent': self.user_agent
+        }
+
+class ClickRollup(db.Model):
+    __tablename__ = 'click_rollups'
+    # Click counts per link and minute, hour and day bucket, split by referer
+    # domain and user agent class; maintained by flush_visits (see rollups.py).
+    __table_args__ = (
+        db.PrimaryKeyConstraint('url_id', 'granularity', 'bucket_start', 'referer_domain', 'agent_class'),
+        db.Index('ix_click_rollups_granularity_bucket', 'granularity', 'bucket_start'),
+    )
+    
+    url_id = db.Column(db.Integer, nullable=False)
+    granularity = db.Column(db.String(10), nullable=False)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    referer_domain = db.Column(db.String(255), nullable=False)
+    agent_class = db.Column(db.String(20), nullable=False)
+    clicks = db.Column(db.BigInteger, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<ClickRollup {self.url_id} {self.granularity} {self.bucket_start}>'
+
+from click_log import ClickLogMaintenance, new_event_id
+from rollups import aggregate as aggregate_rollups, upsert_statement as rollup_upsert_statement
+click_log_maintenance = ClickLogMaintenance(
+    retention_days=get_int_setting('CLICK_RETENTION_DAYS', 90),
+    days_ahead=get_int_setting('CLICK_PARTITIONS_AHEAD', 7),
+    rollup_retention={
+        'minute': get_int_setting('ROLLUP_MINUTE_RETENTION_DAYS', 7),
+        'hour': get_int_setting('ROLLUP_HOUR_RETENTION_DAYS', 400),
+        'day': get_int_setting('ROLLUP_DAY_RETENTION_DAYS', 0)
+    }
+)
+
+def flush_visits(batch, events):
+    urls = URL.__table__
+    stmt = urls.update().where(urls.c.id == bindparam('b_id')).values(
+        visits=urls.c.visits + bindparam('b_count'),
+        last_visited=bindparam('b_last_visited')
+    )
+    params = [{
+        'b_id': url_id,
+        'b_count': pending.count,
+        'b_last_visited': pending.last_visited
+    } for url_id, pending in sorted(batch, key=lambda item: item[0]) if pending.count]
+    
+    rows = [{
+        'id': new_event_id(),
+        'clicked_at': event.clicked_at,
+        'url_id': event.url_id,
+        'short_code': event.short_code,
+        'referer': event.referer[:2048] if event.referer else None,
+        'user_agent': event.user_agent[:512] if event.user_agent else None,
+        'ip_address': event.ip_address
+    } for event in events]
+    
+    with background_context():
+        # Counting visits is not a write of the visitor's own.
+        db.session.info[NO_PIN_KEY] = True
+        if rows:
+            click_log_maintenance.run_if_due(db.engine)
+        try:
+            if params:
+                db.session.execute(stmt, params)
+            if rows:
+                db.session.execute(ClickEvent.__table__.insert(), rows)
+                # Rollups are written in the same transaction as the events
+                # they count, so a retried flush never counts a click twice.
+                db.session.execute(
+                    rollup_upsert_statement(ClickRollup.__table__, db.engine.dialect.name),
+                    aggregate_rollups(events)
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+from visit_buffer import VisitBuffer
+visit_buffer = VisitBuffer(
+    flush_visits,
+    flush_interval=get_float_setting('VISIT_FLUSH_INTERVAL', 5.0),
+    max_pending=get_int_setting('VISIT_FLUSH_SIZE', 1000)
+)
+
+REDIRECT_CACHE_MAX_AGE = get_int_setting('REDIRECT_CACHE_MAX_AGE', 86400)
+STATUS_CACHE_MAX_AGE = get_int_setting('STATUS_CACHE_MAX_AGE', 0)
+
+def redirect_response(original_url, entry, now=None):
+    """Redirect to ``original_url`` with caching that matches how ``entry`` expires.
+    
+    Links that never expire are permanent (301) and cacheable for
+    REDIRECT_CACHE_MAX_AGE seconds; date-expiring links are cacheable until
+    they expire, at most as long. Visit-limited links are never cached, since
+    every click has to reach us to be counted. Cached clicks are not counted
+    either, so REDIRECT_CACHE_MAX_AGE=0 restores uncached 302s.
+    """
+    if REDIRECT_CACHE_MAX_AGE <= 0:
+        return redirect(original_url)
+    visit_limited = entry.max_visits is not None and entry.expiration_type in ['visits', 'both']
+    expires = entry.expires_at if entry.expiration_type in ['date', 'both'] else None
+    if visit_limited:
+        response = redirect(original_url)
+        response.headers['Cache-Control'] = 'no-store'
+    elif expires is not None:
+        response = redirect(original_url)
+        max_age = min(REDIRECT_CACHE_MAX_AGE, int((expires - (now or datetime.utcnow())).total_seconds()))
+        response.headers['Cache-Control'] = f'public, max-age={max_age}' if max_age > 0 else 'no-store'
+    else:
+        response = redirect(original_url, 301)
+        response.headers['Cache-Control'] = f'public, max-age={REDIRECT_CACHE_MAX_AGE}'
+    return response
+
+def record_visit(url_id, short_code, counted=False):
+    # counted=True means the visit counter was already incremented in the
+    # request; only the click event still needs to be logged.
+    record = visit_buffer.record_event if counted else visit_buffer.record
+    record(
+        url_id,
+        short_code=short_code,
+        referer=request.referrer,
+        user_agent=request.headers.get('User-Agent'),
+        ip_address=request.remote_addr,
+        visited_at=datetime.utcnow()
+    )
+
+class CodeSequence(db.Model):
+    __tablename__ = 'code_sequences'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    next_value = db.Column(db.BigInteger, nullable=False, default=0)
+
+def reserve_code_block(size, name='urls'):
+    # Runs on its own connection so a rolled back request never hands the
+    # same block to two workers.
+    table = CodeSequence.__table__
+    for _ in range(2):
+        with db.engine.begin() as conn:
+            row = conn.execute(
+                table.update()
+                .where(table.c.name == name)
+                .values(next_value=table.c.next_value + size)
+                .returning(table.c.next_value)
+            ).first()
+            if row is not None:
+                return row[0] - size
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(table.insert().values(name=name, next_value=size))
+            return 0
+        except IntegrityError:
+            continue
+    raise RuntimeError(f"Could not reserve a short code block for {name}")
+
+class AppSecret(db.Model):
+    __tablename__ = 'app_secrets'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.String(128), nullable=False)
+
+def load_app_secret(name):
+    """Return the secret stored under ``name``, generating it on first use.
+    
+    The first worker to get here inserts a random value; everyone else,
+    including other hosts, reads that one.
+    """
+    table = AppSecret.__table__
+    for _ in range(2):
+        with db.engine.connect() as conn:
+            value = conn.execute(db.select(table.c.value).where(table.c.name == name)).scalar()
+        if value is not None:
+            return value
+        value = secrets.token_hex(32)
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(table.insert().values(name=name, value=value))
+            logging.info(f"Generated the {name} secret")
+            return value
+        except IntegrityError:
+            continue
+    raise RuntimeError(f"Could not load the {name} secret")
+
+def code_secret():
+    return os.environ.get('CODE_SECRET') or load_app_secret('code_allocator')
+
+from code_allocator import CodeAllocator
+code_allocator = CodeAllocator(
+    reserve_code_block,
+    code_secret,
+    block_size=get_int_setting('CODE_BLOCK_SIZE', 1000),
+    min_length=get_int_setting('CODE_MIN_LENGTH', 6)
+)
+
+def load_short_codes(after_id, batch_size=10000):
+    """Yield ``(id, short_code)`` for every URL with ``id > after_id``, in id order."""
+    table = URL.__table__
     while True:
-        code = ''.join(random.choices(chars, k=length))
-        
-        existing = URL.query.filter_by(short_code=code).first()
-        if not existing:
-            return code
+        with background_context():
+            with db.engine.connect() as conn:
+                rows = conn.execute(
+                    db.select(table.c.id, table.c.short_code)
+                    .where(table.c.id > after_id)
+                    .order_by(table.c.id)
+                    .limit(batch_size)
+                ).all()
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        after_id = rows[-1][0]
+
+def max_url_id():
+    with background_context():
+        with db.engine.connect() as conn:
+            return conn.execute(db.select(db.func.max(URL.__table__.c.id))).scalar()
+
+from code_filter import ShortCodeFilter
+code_filter = None
+if get_int_setting('CODE_FILTER_ENABLED', 1):
+    code_filter = ShortCodeFilter(
+        load_short_codes,
+        max_url_id,
+        error_rate=get_float_setting('CODE_FILTER_ERROR_RATE', 0.01),
+        max_staleness=get_float_setting('CODE_FILTER_MAX_STALENESS', 1.0),
+        rebuild_interval=get_int_setting('CODE_FILTER_REBUILD_INTERVAL', 3600),
+        start_delay=get_float_setting('CODE_FILTER_START_DELAY', 5.0)
+    )
+
+def generate_short_code():
+    # Allocated codes never repeat, but may hit a legacy random code or a
+    # custom alias; the filter lets us skip those without a failed insert.
+    for _ in range(10):
+        short_code = code_allocator.next_code()
+        if code_filter is None or not code_filter.probably_contains(short_code):
+            break
+    return short_code
+
+def save_new_url(new_url, attempts=5):
+    """Insert a new URL and return its short code.
+    
+    Allocated codes are unique among themselves, so the only conflicts left are
+    legacy random codes and custom aliases; those are retried with a fresh code.
+    """
+    if new_url.created_at is None:
+        new_url.created_at = datetime.utcnow()
+    for attempt in range(attempts):
+        short_code = new_url.short_code
+        entry = RecentURL(
+            short_code=short_code,
+            original_url=new_url.original_url,
+            created_at=new_url.created_at,
+            expiration_type=new_url.expiration_type,
+            max_visits=new_url.max_visits
+        )
+        try:
+            db.session.add(new_url)
+            db.session.commit()
+            if code_filter is not None:
+                code_filter.add(short_code)
+            recent_feed.add([entry])
+            return short_code
+        except IntegrityError:
+            db.session.rollback()
+            if new_url.is_custom or attempt == attempts - 1:
+                raise
+            logging.warning(f"Short code collision on {short_code}, retrying")
+            new_url.short_code = generate_short_code()
+
+def load_recent_urls(limit):
+    return URL.query.order_by(URL.created_at.desc(), URL.id.desc()).limit(limit).all()
+
+from recent_feed import RecentFeed, RecentURL
+recent_feed = RecentFeed(
+    path=os.environ.get('RECENT_FEED_PATH'),
+    maxlen=100,
+    loader=load_recent_urls,
+    refresh_interval=get_int_setting('RECENT_FEED_REFRESH', 300)
+)
 
-@app.route('/')
+def recent_urls(count=10):
+    """The newest ``count`` links, with visits, expiry and health read live.
+
+    The feed saves the query for which links are newest; what changes after
+    creation comes from one indexed lookup of the shown codes.
+    Links deleted on another host are left out.
+    """
+    entries = recent_feed.get(count)
+    if not entries:
+        return []
+    table = URL.__table__
+    rows = db.session.execute(
+        db.select(table.c.short_code, *[table.c[name] for name in RecentURL.LIVE_FIELDS])
+        .where(table.c.short_code.in_([entry.short_code for entry in entries]))
+    )
+    live = {row.short_code: row._mapping for row in rows}
+    return [entry.with_live_fields(live[entry.short_code]) for entry in entries if entry.short_code in live]
+
+from url_shortener import URLStore, URLRecord, ReadThroughURLStore
+
+def claim_visit_statement(short_code, now):
+    """Count one click of a visit-limited link if it has a visit left.
+    
+    The limit and the expiry date are checked in the same UPDATE that
+    increments the counter, so concurrent clicks can never exceed
+    max_visits, and a valid click is one round trip. Returns the redirect
+    metadata of the link, or no row when it is unknown, not visit-limited,
+    expired or used up.
+    """
+    urls = URL.__table__
+    return urls.update().where(
+        urls.c.short_code == short_code, URL.visit_left_clause(now)
+    ).values(visits=urls.c.visits + 1, last_visited=now).returning(
+        urls.c.id, urls.c.original_url, urls.c.expires_at, urls.c.expiration_type, urls.c.max_visits, urls.c.visits
+    )
+
+class SQLAlchemyURLStore(URLStore):
+    """The read side of URLStore backed by the urls table, for the redirect path.
+
+    Only lookups and visit claims go through the store; the views create,
+    deduplicate and delete links with their own queries, and plain visits
+    are counted by the visit buffer.
+    """
+
+    def lookup(self, short_code):
+        row = db.session.query(
+            URL.id, URL.original_url, URL.expires_at, URL.expiration_type, URL.max_visits, URL.visits
+        ).filter(URL.short_code == short_code).first()
+        if row is None:
+            return None
+        return URLRecord(short_code, row.original_url, row.expires_at, row.expiration_type,
+                         row.max_visits, row.visits, row.id)
+
+    def claim_visit(self, short_code):
+        row = db.session.execute(claim_visit_statement(short_code, datetime.utcnow())).first()
+        db.session.commit()
+        if row is None:
+            return None
+        return URLRecord(short_code, row.original_url, row.expires_at, row.expiration_type,
+                         row.max_visits, row.visits, row.id)
+
+if os.environ.get('URL_STORE', 'sql') == 'readthrough':
+    url_store = ReadThroughURLStore(SQLAlchemyURLStore(), ttl=get_int_setting('URL_STORE_TTL', 300))
+else:
+    url_store = SQLAlchemyURLStore()
+
+def forget_short_codes(short_codes):
+    """Drop deleted short codes from every per-worker and per-host structure."""
+    url_cache.invalidate_many(short_codes)
+    url_store.invalidate(short_codes)
+    recent_feed.remove(short_codes)
+
+@views.route('/')
+@replica_reads(db)
 def index():
     try:
-        recent_urls = URL.query.order_by(URL.created_at.desc()).limit(10).all()
-        return render_template('index.html', recent_urls=recent_urls)
+        return render_template('index.html', recent_urls=recent_urls())
     except Exception as e:
         logging.error(f"Database error in index route: {str(e)}")
         return render_template('index.html', recent_urls=[], db_error=True)
 
-@app.route('/shorten', methods=['POST'])
+def limited_response(scope, status, message, retry_after):
+    if scope == 'shorten':
+        response = make_response(render_template('index.html', error=message, recent_urls=[]), status)
+    else:
+        response = make_response(jsonify({'error': message}), status)
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def rate_limited(scope):
+    """Apply the ``scope`` token bucket per user (or client IP) and shed the view under pool pressure."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(*args, **kwargs):
+            if load_shedder.should_shed():
+                metrics.inc('requests_shed_total', scope=scope)
+                return limited_response(scope, 503, 'The service is busy, please retry shortly.', 1)
+            limit = rate_limits.get(scope)
+            if limit is not None:
+                client = f"user:{current_user.id}" if current_user.is_authenticated else f"ip:{request.remote_addr}"
+                allowed, retry_after = rate_limiter.take(f"{scope}:{client}", limit)
+                if not allowed:
+                    metrics.inc('rate_limited_total', scope=scope)
+                    return limited_response(scope, 429, 'Too many requests, please slow down.', retry_after)
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+@views.route('/shorten', methods=['POST'])
+@rate_limited('shorten')
 def shorten_url():
     """Handle URL shortening form submission."""
     long_url = request.form.get('url', '')
@@ -174,8 +676,9 @@ def shorten_url():
     expiration_days = request.form.get('expiration', '')
     max_visits = request.form.get('max_visits', '')
     
-    logging.debug(f"Received URL shortening request for: {long_url}, alias: {custom_alias}, " +
-                 f"expiration_type: {expiration_type}, expiration: {expiration_days}, max_visits: {max_visits}")
+    shorten_log.debug("Received URL shortening request for: %s, alias: %s, expiration_type: %s, "
+                      "expiration: %s, max_visits: %s",
+                      long_url, custom_alias, expiration_type, expiration_days, max_visits)
     
     if not long_url:
         flash('Please enter a URL', 'danger')
@@ -188,6 +691,7 @@ def shorten_url():
         if not all([result.scheme, result.netloc]):
             flash('Invalid URL format. Please enter a valid URL.', 'danger')
             return redirect(url_for('index'))
+        long_url = canonicalize_url(long_url)
         
         expires_at = None
         max_visits_count = None
@@ -241,7 +745,7 @@ def shorten_url():
             short_code = custom_alias
             is_custom = True
         else:
-            existing_url = URL.query.filter_by(original_url=long_url, is_custom=False).first()
+            existing_url = URL.query.filter_by(url_hash=url_digest(long_url), is_custom=False).order_by(URL.id.desc()).first()
             if existing_url and not existing_url.is_expired():
                 short_code = existing_url.short_code
                 is_custom = False
@@ -249,6 +753,7 @@ def shorten_url():
                 if expires_at and expires_at != existing_url.expires_at:
                     existing_url.expires_at = expires_at
                     db.session.commit()
+                    url_cache.invalidate(existing_url.short_code)
             else:
                 short_code = generate_short_code()
                 is_custom = False
@@ -265,19 +770,17 @@ def shorten_url():
                 
                 user_id=current_user.id if current_user.is_authenticated else None
             )
-            db.session.add(new_url)
-            db.session.commit()
+            short_code = save_new_url(new_url)
         
         short_url = request.host_url + short_code
         
-        logging.debug(f"Generated short URL: {short_url}")
+        shorten_log.debug("Generated short URL: %s", short_url)
         
         flash('URL shortened successfully!', 'success')
-        recent_urls = URL.query.order_by(URL.created_at.desc()).limit(10).all()
         return render_template('index.html', 
                               short_url=short_url, 
                               original_url=long_url, 
-                              recent_urls=recent_urls)
+                              recent_urls=recent_urls())
     
     except Exception as e:
         logging.error(f"Error shortening URL: {str(e)}")
@@ -294,100 +797,263 @@ def shorten_url():
         flash(error_message, 'danger')
         return redirect(url_for('index'))
 
-@app.route('/<short_code>')
+# Key in the ASGI scope where asgi.py leaves the outcome of a redirect it
+# passes on to Flask, so the page is rendered without a second lookup.
+ASGI_REDIRECT_OUTCOME = 'url_shortener.redirect_outcome'
+
+def expired_link_page(short_code):
+    metrics.inc('redirect_outcomes_total', outcome='expired')
+    redirect_log.debug("Expired URL: %s", short_code)
+    flash('This shortened URL has expired.', 'warning')
+    return render_template('index.html', error="Sorry, this shortened URL has expired."), 410
+
+def missing_link_page(short_code):
+    metrics.inc('redirect_outcomes_total', outcome='not_found')
+    redirect_log.debug("No URL found for code: %s", short_code)
+    flash('This shortened URL does not exist.', 'danger')
+    return render_template('index.html', error="Sorry, that shortened URL was not found."), 404
+
+@views.route('/<short_code>')
+@replica_reads(db)
 def redirect_to_url(short_code):
-    logging.debug(f"Redirect request for code: {short_code}")
-    url_entry = URL.query.filter_by(short_code=short_code).first()
+    known_outcome = request.environ.get('asgi.scope', {}).get(ASGI_REDIRECT_OUTCOME)
+    if known_outcome == 'expired':
+        return expired_link_page(short_code)
+    if known_outcome == 'not_found':
+        return missing_link_page(short_code)
+    redirect_log.debug("Redirect request for code: %s", short_code)
+    cached = url_cache.get(short_code)
+    if cached is not None:
+        if cached.is_expired():
+            url_cache.invalidate(short_code)
+            return expired_link_page(short_code)
+        
+        if cached.is_visit_limited():
+            # The cache only says the link is visit-limited; the UPDATE decides.
+            claimed = url_store.claim_visit(short_code)
+            if claimed is not None:
+                record_visit(claimed.id, short_code, counted=True)
+                metrics.inc('redirect_outcomes_total', outcome='cache_hit')
+                redirect_log.debug("Redirecting to: %s (claimed)", claimed.original_url)
+                return redirect_response(claimed.original_url, claimed)
+            # Used up or deleted meanwhile: the lookup below tells which.
+            url_cache.invalidate(short_code)
+        else:
+            record_visit(cached.id, short_code)
+            metrics.inc('redirect_outcomes_total', outcome='cache_hit')
+            redirect_log.debug("Redirecting to: %s (cached)", cached.original_url)
+            return redirect_response(cached.original_url, cached)
+    
+    if code_filter is not None and code_filter.probably_absent(short_code):
+        # Most likely a probe for a code that does not exist, but it may have
+        # been created since the filter last synced: ask the primary, where
+        # a new row is sure to be, instead of a replica first.
+        db.session.info.pop('use_replica', None)
+    url_entry = url_store.lookup(short_code)
+    if url_entry is None and db.session.info.get('use_replica'):
+        # A missing row may not have replicated yet: ask the primary.
+        db.session.info.pop('use_replica')
+        url_entry = url_store.lookup(short_code)
     
     if not url_entry:
-        logging.debug(f"No URL found for code: {short_code}")
-        flash('This shortened URL does not exist.', 'danger')
-        return render_template('index.html', error="Sorry, that shortened URL was not found."), 404
+        return missing_link_page(short_code)
     
     if url_entry.is_expired():
-        logging.debug(f"Expired URL: {short_code}")
-        flash('This shortened URL has expired.', 'warning')
-        return render_template('index.html', error="Sorry, this shortened URL has expired."), 410
-        
-    url_entry.visits += 1
-    
-    url_entry.referer = request.referrer
-    url_entry.user_agent = request.user_agent.string if request.user_agent else None
-    url_entry.ip_address = request.remote_addr
+        return expired_link_page(short_code)
     
-    url_entry.last_visited = datetime.utcnow()
+    # Visit-limited links are counted by an atomic conditional UPDATE on the
+    # primary, which also re-checks the limit a lagging replica may have
+    # reported as not yet reached. Everything else is buffered.
+    if url_entry.is_visit_limited():
+        url_entry = url_store.claim_visit(short_code)
+        if url_entry is None:
+            return expired_link_page(short_code)
+        record_visit(url_entry.id, short_code, counted=True)
+    else:
+        record_visit(url_entry.id, short_code)
+    metrics.inc('redirect_outcomes_total', outcome='hit')
+    original_url = url_entry.original_url
+    url_cache.put(short_code, CachedURL(
+        url_entry.id, original_url, url_entry.expires_at, url_entry.expiration_type, url_entry.max_visits
+    ))
     
-    db.session.commit()
-    
-    logging.debug(f"URL expanded: {short_code} -> {url_entry.original_url}")
-    logging.debug(f"Redirecting to: {url_entry.original_url}")
-    return redirect(url_entry.original_url)
+    redirect_log.debug("Redirecting %s to: %s", short_code, original_url)
+    return redirect_response(original_url, url_entry)
+
+class RedirectFastPath:
+    """WSGI middleware that answers cached redirects before Flask sees them.
+
+    A GET or HEAD of a short code held in this worker's URL cache, neither
+    expired nor visit-limited, needs no session, user, database or template,
+    so it gets the response, visit record and metrics of redirect_to_url
+    without a request context. Everything else goes to Flask.
+    """
+
+    def __init__(self, app, wsgi_app):
+        self.url_map = app.url_map
+        self.wsgi_app = wsgi_app
 
-@app.errorhandler(404)
+    def __call__(self, environ, start_response):
+        response = None
+        if environ['REQUEST_METHOD'] in ('GET', 'HEAD'):
+            response = self.cached_redirect(environ)
+        if response is None:
+            return self.wsgi_app(environ, start_response)
+        return response(environ, start_response)
+
+    def cached_redirect(self, environ):
+        started = time.perf_counter()
+        if ASGI_REDIRECT_OUTCOME in environ.get('asgi.scope', {}):
+            return None
+        try:
+            rule, args = self.url_map.bind_to_environ(environ).match(return_rule=True)
+        except HTTPException:
+            return None
+        if rule.endpoint != 'redirect_to_url':
+            return None
+        short_code = args['short_code']
+        cached = url_cache.get(short_code)
+        if cached is None or cached.is_expired() or cached.is_visit_limited():
+            return None
+        visit_buffer.record(
+            cached.id,
+            short_code=short_code,
+            referer=environ.get('HTTP_REFERER'),
+            user_agent=environ.get('HTTP_USER_AGENT'),
+            ip_address=environ.get('REMOTE_ADDR'),
+            visited_at=datetime.utcnow()
+        )
+        metrics.inc('redirect_outcomes_total', outcome='cache_hit')
+        redirect_log.debug("Redirecting to: %s (cached)", cached.original_url)
+        response = redirect_response(cached.original_url, cached)
+        metrics.observe(
+            'http_request_duration_seconds',
+            time.perf_counter() - started,
+            route=rule.rule,
+            method=environ['REQUEST_METHOD'],
+            status=response.status_code
+        )
+        metrics.maybe_write_snapshot()
+        return response
+
+@views.errorhandler(404)
 def page_not_found(e):
     return render_template('index.html', error="Sorry, that shortened URL was not found."), 404
 
-@app.route('/api/shorten', methods=['POST'])
+class ShortenRequestError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def parse_timestamp(value):
+    """Naive UTC datetime of an ISO 8601 timestamp or date, or None if invalid."""
+    try:
+        moment = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def parse_api_shorten_data(data):
+    """Validate one API shorten payload without touching the database."""
+    if not isinstance(data, dict):
+        raise ShortenRequestError('Invalid JSON data')
+    
+    url = data.get('url')
+    if not url or not isinstance(url, str):
+        raise ShortenRequestError('URL is required')
+
+    if not urlparse(url).scheme:
+        url = 'http://' + url
+
+    result = urlparse(url)
+    if not all([result.scheme, result.netloc]):
+        raise ShortenRequestError('Invalid URL format')
+    url = canonicalize_url(url)
+
+    custom_alias = str(data.get('alias') or '').strip()
+    expiration_days = data.get('expiration')
+    expiration_type = data.get('expiration_type', 'never')
+    max_visits = data.get('max_visits')
+
+    max_visits_count = None
+    if expiration_type in ['visits', 'both'] and max_visits:
+        try:
+            max_visits_count = int(max_visits)
+            if max_visits_count <= 0:
+                max_visits_count = None
+                expiration_type = 'date' if expiration_type == 'both' else 'never'
+        except (ValueError, TypeError) as e:
+            logging.warning(f"Invalid API max_visits value: {max_visits}. Error: {e}")
+            max_visits_count = None
+            expiration_type = 'date' if expiration_type == 'both' else 'never'
+
+    expires_at = None
+    if expiration_type in ['date', 'both'] and data.get('expires_at'):
+        # An absolute expiry, e.g. from an export; takes precedence over 'expiration'.
+        expires_at = parse_timestamp(data['expires_at'])
+        if expires_at is None:
+            raise ShortenRequestError('expires_at must be an ISO 8601 timestamp')
+        if expires_at <= datetime.utcnow():
+            raise ShortenRequestError('expires_at must be in the future')
+    elif expiration_type in ['date', 'both'] and expiration_days:
+        try:
+            days = float(expiration_days) if isinstance(expiration_days, (int, float, str)) else 0
+            if days > 0:
+                if days < 1:
+                    minutes = int(days * 24 * 60)  
+                    expires_at = datetime.utcnow() + timedelta(minutes=minutes)
+                else:
+                    expires_at = datetime.utcnow() + timedelta(days=days)
+        except (ValueError, TypeError) as e:
+            logging.warning(f"Invalid API expiration value: {expiration_days}. Error: {e}")
+
+    if custom_alias:
+        if not re.match(r'^[a-zA-Z0-9_-]+$', custom_alias):
+            raise ShortenRequestError('Custom alias can only contain letters, numbers, hyphens, and underscores')
+
+        if custom_alias.lower() in ['api', 'admin', 'static', 'health', 'shorten', 'logout', 'login', 'register']:
+            raise ShortenRequestError('This alias is a reserved word and cannot be used')
+
+        if len(custom_alias) < 3:
+            raise ShortenRequestError('Custom alias must be at least 3 characters long')
+
+        if len(custom_alias) > 30:
+            raise ShortenRequestError('Custom alias must be no more than 30 characters long')
+    
+    return {
+        'url': url,
+        'custom_alias': custom_alias,
+        # An alias is custom unless the payload says otherwise, as imported
+        # generated codes do.
+        'is_custom': bool(custom_alias) and data.get('is_custom') is not False,
+        'expires_at': expires_at,
+        'expiration_type': expiration_type,
+        'max_visits': max_visits_count
+    }
+
+@views.route('/api/shorten', methods=['POST'])
+@rate_limited('api')
 def api_shorten_url():
     try:
         data = request.get_json()
         if not data:
             return jsonify({'error': 'Invalid JSON data'}), 400
         
-        url = data.get('url')
-        if not url:
-            return jsonify({'error': 'URL is required'}), 400
-        
-        if not urlparse(url).scheme:
-            url = 'http://' + url
-        
-        result = urlparse(url)
-        if not all([result.scheme, result.netloc]):
-            return jsonify({'error': 'Invalid URL format'}), 400
+        try:
+            params = parse_api_shorten_data(data)
+        except ShortenRequestError as e:
+            return jsonify({'error': e.message}), e.status
         
-        custom_alias = data.get('alias', '').strip()
-        expiration_days = data.get('expiration')
-        expiration_type = data.get('expiration_type', 'never')
-        max_visits = data.get('max_visits')
-        
-        max_visits_count = None
-        if expiration_type in ['visits', 'both'] and max_visits:
-            try:
-                max_visits_count = int(max_visits)
-                if max_visits_count <= 0:
-                    max_visits_count = None
-                    expiration_type = 'date' if expiration_type == 'both' else 'never'
-            except (ValueError, TypeError) as e:
-                logging.warning(f"Invalid API max_visits value: {max_visits}. Error: {e}")
-                max_visits_count = None
-                expiration_type = 'date' if expiration_type == 'both' else 'never'
-                
-        expires_at = None
-        if expiration_type in ['date', 'both'] and expiration_days:
-            try:
-                days = float(expiration_days) if isinstance(expiration_days, (int, float, str)) else 0
-                if days > 0:
-                    if days < 1:
-                        minutes = int(days * 24 * 60)  
-                        expires_at = datetime.utcnow() + timedelta(minutes=minutes)
-                    else:
-                        expires_at = datetime.utcnow() + timedelta(days=days)
-            except (ValueError, TypeError) as e:
-                logging.warning(f"Invalid API expiration value: {expiration_days}. Error: {e}")
+        url = params['url']
+        custom_alias = params['custom_alias']
+        expires_at = params['expires_at']
+        expiration_type = params['expiration_type']
+        max_visits_count = params['max_visits']
         
         if custom_alias:
-            if not re.match(r'^[a-zA-Z0-9_-]+$', custom_alias):
-                return jsonify({'error': 'Custom alias can only contain letters, numbers, hyphens, and underscores'}), 400
-            
-            if custom_alias.lower() in ['api', 'admin', 'static', 'health', 'shorten', 'logout', 'login', 'register']:
-                return jsonify({'error': 'This alias is a reserved word and cannot be used'}), 400
-                
-            if len(custom_alias) < 3:
-                return jsonify({'error': 'Custom alias must be at least 3 characters long'}), 400
-                
-            if len(custom_alias) > 30:
-                return jsonify({'error': 'Custom alias must be no more than 30 characters long'}), 400
-                
             existing_alias = URL.query.filter_by(short_code=custom_alias).first()
             if existing_alias:
                 return jsonify({'error': 'This custom alias is already taken'}), 409
@@ -395,7 +1061,7 @@ def api_shorten_url():
             short_code = custom_alias
             is_custom = True
         else:
-            existing_url = URL.query.filter_by(original_url=url, is_custom=False).first()
+            existing_url = URL.query.filter_by(url_hash=url_digest(url), is_custom=False).order_by(URL.id.desc()).first()
             if existing_url and not existing_url.is_expired():
                 short_code = existing_url.short_code
                 is_custom = False
@@ -403,6 +1069,7 @@ def api_shorten_url():
                 if expires_at and expires_at != existing_url.expires_at:
                     existing_url.expires_at = expires_at
                     db.session.commit()
+                    url_cache.invalidate(existing_url.short_code)
             else:
                 short_code = generate_short_code()
                 is_custom = False
@@ -419,8 +1086,7 @@ def api_shorten_url():
                 
                 user_id=current_user.id if current_user.is_authenticated else None
             )
-            db.session.add(new_url)
-            db.session.commit()
+            short_code = save_new_url(new_url)
         
         short_url = request.host_url + short_code
         
@@ -440,12 +1106,327 @@ def api_shorten_url():
         logging.error(f"API Error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/status/<short_code>', methods=['GET'])
-def api_url_status(short_code):
-    url_entry = URL.query.filter_by(short_code=short_code).first()
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def read_batch_items():
+    """Return the list of items from a JSON array, {"urls": [...]} or NDJSON body."""
+    content_type = request.mimetype or ''
+    if content_type in ['application/x-ndjson', 'application/jsonl'] or request.args.get('format') == 'ndjson':
+        items = []
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                items.append(None)
+        return items
     
-    if not url_entry:
-        return jsonify({'error': 'URL not found'}), 404
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('urls')
+    if not isinstance(data, list):
+        raise ShortenRequestError('Expected a JSON array of URLs')
+    return data
+
+URL_COPY_COLUMNS = ('original_url', 'url_hash', 'short_code', 'created_at', 'expires_at', 'visits', 'is_custom',
+                    'is_active', 'expiration_type', 'max_visits', 'user_id')
+
+def insert_url_rows(rows):
+    """Insert new urls rows in the session's transaction.
+    
+    PostgreSQL gets them through one COPY, which is parsed and written far
+    faster than INSERTs; other databases get multi-row INSERTs of 1000 rows.
+    A taken short code raises IntegrityError either way.
+    """
+    if not rows:
+        return
+    connection = db.session.connection()
+    if connection.dialect.name != 'postgresql':
+        for chunk in _chunks(rows, 1000):
+            db.session.execute(URL.__table__.insert().values(chunk))
+        return
+    # In COPY's CSV format an unquoted empty field is NULL; none of these
+    # columns holds empty strings.
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([row[name] for name in URL_COPY_COLUMNS] for row in rows)
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY urls ({', '.join(URL_COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    except connection.dialect.dbapi.IntegrityError as e:
+        raise IntegrityError('COPY urls', None, e) from e
+    finally:
+        cursor.close()
+
+def shorten_batch(items, user_id=None):
+    """Validate and shorten a list of API payloads with set-based queries.
+    
+    Returns one result dict per item, in input order. Every item is validated
+    first; dedup hits and taken aliases are then resolved with one IN query per
+    chunk, codes are allocated in bulk and new rows are written with multi-row
+    INSERTs.
+    """
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        if isinstance(item, str):
+            item = {'url': item}
+        try:
+            valid.append((index, parse_api_shorten_data(item)))
+        except ShortenRequestError as e:
+            results[index] = {'index': index, 'status': e.status, 'error': e.message}
+    
+    aliases = {}
+    digests = {}
+    for index, params in valid:
+        if params['custom_alias']:
+            aliases.setdefault(params['custom_alias'], []).append(index)
+        else:
+            params['url_hash'] = url_digest(params['url'])
+            digests.setdefault(params['url_hash'], None)
+    
+    taken = set()
+    for chunk in _chunks(list(aliases), 500):
+        taken.update(code for (code,) in db.session.query(URL.short_code).filter(URL.short_code.in_(chunk)))
+    
+    existing = {}
+    for chunk in _chunks(list(digests), 500):
+        for url_entry in URL.query.filter(URL.url_hash.in_(chunk), URL.is_custom == False).order_by(URL.id):
+            if not url_entry.is_expired():
+                existing[url_entry.url_hash] = url_entry
+    
+    now = datetime.utcnow()
+    user_id = user_id if user_id is not None else (current_user.id if current_user.is_authenticated else None)
+    rows = []
+    row_indexes = []
+    expiry_updates = {}
+    created_by_hash = {}
+    for index, params in valid:
+        alias = params['custom_alias']
+        if alias:
+            if alias in taken or aliases[alias][0] != index:
+                results[index] = {'index': index, 'status': 409, 'error': 'This custom alias is already taken'}
+                continue
+        else:
+            url_entry = existing.get(params['url_hash'])
+            if url_entry is not None:
+                if params['expires_at'] and params['expires_at'] != url_entry.expires_at:
+                    expiry_updates[url_entry.id] = (url_entry.short_code, params['expires_at'])
+                results[index] = dict(params, short_code=url_entry.short_code, is_custom=False, status=200)
+                continue
+            if params['url_hash'] in created_by_hash:
+                results[index] = dict(params, short_code=None, is_custom=False, status=200)
+                continue
+            created_by_hash[params['url_hash']] = index
+        
+        results[index] = dict(params, short_code=alias or None, status=201)
+        row_indexes.append(index)
+        rows.append({
+            'original_url': params['url'],
+            'url_hash': params.get('url_hash') or url_digest(params['url']),
+            'short_code': alias or None,
+            'created_at': now,
+            'expires_at': params['expires_at'],
+            'visits': 0,
+            'is_custom': params['is_custom'],
+            'is_active': True,
+            'expiration_type': params['expiration_type'],
+            'max_visits': params['max_visits'],
+            'user_id': user_id
+        })
+    
+    generated = [row for row in rows if row['short_code'] is None]
+    for row, code in zip(generated, code_allocator.next_codes(len(generated))):
+        if code_filter is not None and code_filter.probably_contains(code):
+            code = generate_short_code()
+        row['short_code'] = code
+    
+    for attempt in range(3):
+        try:
+            insert_url_rows(rows)
+            for url_id, (short_code, expires_at) in expiry_updates.items():
+                db.session.execute(URL.__table__.update().where(URL.__table__.c.id == url_id).values(expires_at=expires_at))
+            db.session.commit()
+            break
+        except IntegrityError:
+            db.session.rollback()
+            if attempt == 2:
+                raise
+            # Someone else holds some of these codes: drop taken aliases and
+            # give generated codes that collided a fresh value.
+            codes = [row['short_code'] for row in rows]
+            conflicts = set()
+            for chunk in _chunks(codes, 500):
+                conflicts.update(code for (code,) in db.session.query(URL.short_code).filter(URL.short_code.in_(chunk)))
+            kept_rows, kept_indexes = [], []
+            for row, index in zip(rows, row_indexes):
+                if row['short_code'] in conflicts:
+                    if results[index]['custom_alias']:
+                        results[index] = {'index': index, 'status': 409, 'error': 'This custom alias is already taken'}
+                        continue
+                    row['short_code'] = generate_short_code()
+                kept_rows.append(row)
+                kept_indexes.append(index)
+            rows, row_indexes = kept_rows, kept_indexes
+    
+    for row, index in zip(rows, row_indexes):
+        results[index]['short_code'] = row['short_code']
+        if code_filter is not None:
+            code_filter.add(row['short_code'])
+    recent_feed.add([RecentURL(**{name: row.get(name) for name in RecentURL.FIELDS}) for row in rows])
+    url_cache.invalidate_many([short_code for short_code, _ in expiry_updates.values()])
+    
+    # Later duplicates of a URL created in this batch share the first item's code.
+    for index, params in valid:
+        result = results[index]
+        if result.get('status') == 200 and not result.get('short_code'):
+            result['short_code'] = results[created_by_hash[params['url_hash']]]['short_code']
+    
+    host_url = request.host_url
+    for index, result in enumerate(results):
+        if 'error' in result:
+            continue
+        results[index] = {
+            'index': index,
+            'status': result['status'],
+            'original_url': result['url'],
+            'short_code': result['short_code'],
+            'short_url': host_url + result['short_code'],
+            'expires_at': result['expires_at'].isoformat() if result['expires_at'] else None,
+            'is_custom': result['is_custom'],
+            'expiration_type': result['expiration_type'],
+            'max_visits': result['max_visits']
+        }
+    return results
+
+@views.route('/api/shorten/batch', methods=['POST'])
+@rate_limited('batch')
+def api_shorten_batch():
+    try:
+        try:
+            items = read_batch_items()
+        except ShortenRequestError as e:
+            return jsonify({'error': e.message}), e.status
+        
+        max_items = get_int_setting('BATCH_MAX_ITEMS', 10000)
+        if len(items) > max_items:
+            return jsonify({'error': f'A batch can contain at most {max_items} URLs'}), 413
+        
+        results = shorten_batch(items)
+        summary = {
+            'created': sum(1 for result in results if result['status'] == 201),
+            'existing': sum(1 for result in results if result['status'] == 200),
+            'errors': sum(1 for result in results if 'error' in result)
+        }
+        
+        if request.accept_mimetypes.best == 'application/x-ndjson':
+            body = ''.join(json.dumps(result) + '\n' for result in results)
+            return current_app.response_class(body, mimetype='application/x-ndjson')
+        return jsonify(dict(summary, results=results)), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"API Batch Error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+from bulk_io import EXPORT_FORMATS, EXPORT_FIELDS, export_lines, read_import_items, batches
+
+EXPORT_BATCH_SIZE = get_int_setting('EXPORT_BATCH_SIZE', 1000)
+IMPORT_BATCH_SIZE = get_int_setting('IMPORT_BATCH_SIZE', 5000)
+
+def export_response(where, fields, filename):
+    """Stream the urls rows matching ``where`` as CSV or NDJSON (``?format=``).
+    
+    Rows are read through a server-side cursor, EXPORT_BATCH_SIZE at a time,
+    from a read replica when one is available, and written out as they
+    arrive, so memory stays flat however many links are exported.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    urls = URL.__table__
+    # Ordered along ix_urls_user_created / ix_urls_created, so no sort is needed.
+    stmt = db.select(*[urls.c[name] for name in fields]).where(where).order_by(urls.c.created_at, urls.c.id)
+    # Read the primary: a lagging replica would leave out links just created.
+    engine = db.engine
+    
+    def generate():
+        with engine.connect() as conn:
+            result = conn.execution_options(yield_per=EXPORT_BATCH_SIZE).execute(stmt)
+            yield from export_lines(result, fields, fmt)
+    
+    response = current_app.response_class(generate(), mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}.{fmt}'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@views.route('/api/export')
+@login_required
+def api_export_urls():
+    """The current user's links."""
+    return export_response(URL.__table__.c.user_id == current_user.id, EXPORT_FIELDS, 'urls')
+
+def admin_authorized():
+    """True if the request carries ``Authorization: Bearer $ADMIN_TOKEN``; never without ADMIN_TOKEN."""
+    admin_token = os.environ.get('ADMIN_TOKEN')
+    auth_header = request.headers.get('Authorization', '')
+    return bool(admin_token) and hmac.compare_digest(auth_header.encode(), f'Bearer {admin_token}'.encode())
+
+@views.route('/api/admin/export')
+def api_admin_export_urls():
+    """Every link, with its owner; requires ``Authorization: Bearer $ADMIN_TOKEN``."""
+    if not admin_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    return export_response(db.true(), EXPORT_FIELDS + ('user_id',), 'urls-all')
+
+@views.route('/api/import', methods=['POST'])
+@login_required
+@rate_limited('batch')
+def api_import_urls():
+    """Create links from a CSV (with a header row) or NDJSON upload of any size.
+    
+    Rows take the fields of /api/shorten, or those of an export, and are
+    validated the same way. The upload is read and loaded IMPORT_BATCH_SIZE
+    rows at a time, one transaction per batch, and the response streams one
+    NDJSON result per row as its batch completes, followed by a summary.
+    """
+    fmt = request.args.get('format')
+    if fmt is None:
+        fmt = 'csv' if request.mimetype in ['text/csv', 'application/csv'] else 'ndjson'
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    user_id = current_user.id
+    
+    def generate():
+        summary = {'created': 0, 'existing': 0, 'errors': 0}
+        offset = 0
+        try:
+            for batch in batches(read_import_items(request.stream, fmt), IMPORT_BATCH_SIZE):
+                results = shorten_batch(batch, user_id=user_id)
+                for result in results:
+                    result['index'] += offset
+                    if 'error' in result:
+                        summary['errors'] += 1
+                    else:
+                        summary['created' if result['status'] == 201 else 'existing'] += 1
+                offset += len(batch)
+                yield ''.join(json.dumps(result) + '\n' for result in results)
+        except Exception as e:
+            # Earlier batches are committed; report where the import stopped.
+            db.session.rollback()
+            logging.error(f"Import Error after {offset} rows: {str(e)}")
+            yield json.dumps({'index': offset, 'status': 500, 'error': str(e)}) + '\n'
+        yield json.dumps({'summary': dict(summary, rows=offset)}) + '\n'
+    
+    return current_app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def url_status_payload(url_entry, recent_clicks, clicks_last_24h):
+    """The /api/status response for ``url_entry``; shared with the ASGI server."""
+    latest_click = recent_clicks[0] if recent_clicks else None
     
     response = {
         'short_code': url_entry.short_code,
@@ -463,46 +1444,207 @@ def api_url_status(short_code):
         'response_time': url_entry.response_time,
         
         'analytics': {
-            'referer': url_entry.referer,
-            'user_agent': url_entry.user_agent,
+            'referer': latest_click.referer if latest_click else url_entry.referer,
+            'user_agent': latest_click.user_agent if latest_click else url_entry.user_agent,
             'last_visited': url_entry.last_visited.isoformat() if getattr(url_entry, 'last_visited', None) else None,
-            'user_id': url_entry.user_id
+            'user_id': url_entry.user_id,
+            'clicks_last_24h': clicks_last_24h,
+            'recent_clicks': [click.to_dict() for click in recent_clicks]
         }
     }
+    return response
+
+def status_response(payload, url_entry, recent_clicks, environ, app=None):
+    """JSON response for ``payload`` that answers conditional requests with 304.
+    
+    The ETag is a hash of the body, so it also changes when the 24 hour
+    click count slides; Last-Modified is the latest change to the link or
+    click on it. Outside a request, pass the ``app`` whose JSON provider to use.
+    """
+    response = (app or current_app).json.response(payload)
+    response.add_etag()
+    response.last_modified = max(filter(None, [
+        url_entry.created_at,
+        url_entry.last_visited,
+        url_entry.last_checked,
+        recent_clicks[0].clicked_at if recent_clicks else None
+    ]), default=None)
+    response.cache_control.public = True
+    if STATUS_CACHE_MAX_AGE > 0:
+        response.cache_control.max_age = STATUS_CACHE_MAX_AGE
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(environ)
+
+@views.route('/api/status/<short_code>', methods=['GET'])
+@replica_reads(db)
+def api_url_status(short_code):
+    url_entry = URL.query.filter_by(short_code=short_code).first()
+    if not url_entry and db.session.info.pop('use_replica', False):
+        url_entry = URL.query.filter_by(short_code=short_code).first()
     
-    return jsonify(response), 200
+    if not url_entry:
+        return jsonify({'error': 'URL not found'}), 404
+    
+    recent_clicks = ClickEvent.query.filter_by(url_id=url_entry.id).order_by(
+        ClickEvent.clicked_at.desc()
+    ).limit(10).all()
+    clicks_last_24h = ClickEvent.query.filter(
+        ClickEvent.url_id == url_entry.id,
+        ClickEvent.clicked_at >= datetime.utcnow() - timedelta(hours=24)
+    ).count()
+    return status_response(url_status_payload(url_entry, recent_clicks, clicks_last_24h), url_entry, recent_clicks,
+                           request.environ)
+
+from rollups import GRANULARITIES, AGENT_CLASSES, bucket_start, bucket_end
+
+STATS_MAX_BUCKETS = get_int_setting('STATS_MAX_BUCKETS', 2000)
+STATS_TOP_REFERERS = get_int_setting('STATS_TOP_REFERERS', 20)
+STATS_DEFAULT_RANGE = {'minute': timedelta(hours=1), 'hour': timedelta(days=1), 'day': timedelta(days=30)}
 
-@app.route('/health')
+@views.route('/api/stats/<short_code>', methods=['GET'])
+@replica_reads(db)
+def api_url_stats(short_code):
+    """Click counts over time, by referer domain and by user agent class.
+    
+    Answered from the click rollups, so the cost depends on the number of
+    buckets in the range, not on how often the link was clicked.
+    """
+    granularity = request.args.get('granularity', 'hour')
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': f"granularity must be one of: {', '.join(GRANULARITIES)}"}), 400
+    step = timedelta(seconds=GRANULARITIES[granularity])
+    
+    end = parse_timestamp(request.args['to']) if request.args.get('to') else datetime.utcnow()
+    start = parse_timestamp(request.args['from']) if request.args.get('from') else None
+    if end is None or (request.args.get('from') and start is None):
+        return jsonify({'error': 'from and to must be ISO 8601 timestamps'}), 400
+    end = bucket_end(end, granularity)
+    start = bucket_start(start or end - STATS_DEFAULT_RANGE[granularity], granularity)
+    if start >= end:
+        return jsonify({'error': 'from must be before to'}), 400
+    if (end - start) // step > STATS_MAX_BUCKETS:
+        return jsonify({'error': f"Range too large: at most {STATS_MAX_BUCKETS} {granularity} buckets"}), 400
+    
+    url_entry = URL.query.filter_by(short_code=short_code).first()
+    if not url_entry and db.session.info.pop('use_replica', False):
+        url_entry = URL.query.filter_by(short_code=short_code).first()
+    if not url_entry:
+        return jsonify({'error': 'URL not found'}), 404
+    
+    in_range = (
+        ClickRollup.url_id == url_entry.id,
+        ClickRollup.granularity == granularity,
+        ClickRollup.bucket_start >= start,
+        ClickRollup.bucket_start < end
+    )
+    clicks = db.func.sum(ClickRollup.clicks)
+    series = dict(db.session.query(ClickRollup.bucket_start, clicks).filter(*in_range)
+                  .group_by(ClickRollup.bucket_start).all())
+    referers = db.session.query(ClickRollup.referer_domain, clicks).filter(*in_range).group_by(
+        ClickRollup.referer_domain
+    ).order_by(clicks.desc(), ClickRollup.referer_domain).limit(STATS_TOP_REFERERS).all()
+    agents = dict(db.session.query(ClickRollup.agent_class, clicks).filter(*in_range)
+                  .group_by(ClickRollup.agent_class).all())
+    
+    buckets = []
+    moment = start
+    while moment < end:
+        buckets.append({'bucket': moment.isoformat(), 'clicks': int(series.get(moment, 0))})
+        moment += step
+    return jsonify({
+        'short_code': url_entry.short_code,
+        'granularity': granularity,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'total_clicks': int(sum(series.values())),
+        'series': buckets,
+        'referers': [{'domain': domain, 'clicks': int(count)} for domain, count in referers],
+        'user_agents': {agent: int(agents.get(agent, 0)) for agent in AGENT_CLASSES}
+    })
+
+@views.route('/health')
 def health_check():
     """Health check endpoint."""
-    return jsonify({'status': 'ok'})
+    return jsonify(health_payload())
+
+def health_payload():
+    return {
+        'status': 'ok',
+        'cache': url_cache.stats(),
+        'visit_buffer': visit_buffer.stats(),
+        'code_filter': code_filter.stats() if code_filter is not None else None,
+        'replicas': replica_set.stats() if replica_set else None
+    }
 
-@app.route('/api/cleanup', methods=['POST'])
+def collect_app_metrics(metrics):
+    cache = url_cache.stats()
+    metrics.set('cache_hits_total', cache['hits'], cache='url')
+    metrics.set('cache_misses_total', cache['misses'], cache='url')
+    metrics.set('cache_evictions_total', cache['evictions'] + cache['expirations'], cache='url')
+    metrics.set('cache_entries', cache['size'], cache='url')
+    users = user_cache.stats()
+    metrics.set('cache_hits_total', users['hits'], cache='user')
+    metrics.set('cache_misses_total', users['misses'], cache='user')
+    metrics.set('cache_evictions_total', users['evictions'] + users['expirations'], cache='user')
+    metrics.set('cache_entries', users['size'], cache='user')
+    buffered = visit_buffer.stats()
+    metrics.set('visit_buffer_pending', buffered['pending_visits'])
+    metrics.set('visit_buffer_flushes_total', buffered['flushes'])
+    metrics.set('visit_buffer_failed_flushes_total', buffered['failed_flushes'])
+    metrics.set('log_records_dropped_total', log_handler.dropped)
+    metrics.set('db_pool_pressure_seconds', load_shedder.pressure())
+    if code_filter is not None:
+        code_filter_stats = code_filter.stats()
+        metrics.set('code_filter_codes', code_filter_stats['codes'])
+        metrics.set('code_filter_bytes', code_filter_stats['bytes'])
+        metrics.set('code_filter_misses_total', code_filter_stats['misses'])
+
+metrics.add_collector(collect_app_metrics)
+
+@views.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@views.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        metrics.observe(
+            'http_request_duration_seconds',
+            time.perf_counter() - started,
+            route=request.url_rule.rule if request.url_rule else 'unmatched',
+            method=request.method,
+            status=response.status_code
+        )
+        metrics.maybe_write_snapshot()
+    return response
+
+@views.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics for all workers of this server."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+from cleanup import CleanupScheduler, count_expired, delete_expired, log_progress
+
+@views.route('/api/cleanup', methods=['POST'])
 def cleanup_expired_urls():
     try:
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
+        if not admin_authorized():
             return jsonify({'error': 'Unauthorized'}), 401
             
         action = request.args.get('action', 'mark')
         
-        now = datetime.utcnow()
-        expired_urls = URL.query.filter(
-            URL.expires_at.isnot(None),
-            URL.expires_at < now
-        ).all()
-        
-        count = len(expired_urls)
-        
         if action == 'delete':
-            for url in expired_urls:
-                db.session.delete(url)
-            db.session.commit()
-            return jsonify({
-                'message': f'Deleted {count} expired URLs',
-                'count': count
-            })
+            chunk_size = request.args.get('chunk_size', 1000, type=int)
+            max_rows = request.args.get('limit', None, type=int)
+            report = delete_expired(
+                db, URL, chunk_size=max(1, min(chunk_size, 10000)), max_rows=max_rows,
+                on_deleted=forget_short_codes, progress=log_progress
+            )
+            return jsonify(dict(report.to_dict(), message=f'Deleted {report.count} expired URLs'))
         else:
+            count = count_expired(db, URL)
             return jsonify({
                 'message': f'Found {count} expired URLs',
                 'count': count
@@ -512,13 +1654,25 @@ def cleanup_expired_urls():
         logging.error(f"Cleanup error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-from forms import LoginForm, RegistrationForm
+cleanup_scheduler = CleanupScheduler(
+    None, db, URL,
+    interval=get_int_setting('CLEANUP_INTERVAL', 0),
+    chunk_size=get_int_setting('CLEANUP_CHUNK_SIZE', 1000),
+    on_deleted=forget_short_codes
+)
 
-@app.route('/register', methods=['GET', 'POST'])
+@views.before_request
+def start_background_work():
+    # Started by the first request rather than at import, so scripts that
+    # import the app and preforked workers do not run the scheduler.
+    cleanup_scheduler.start()
+
+@views.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
         return redirect(url_for('index'))
     
+    from forms import RegistrationForm
     form = RegistrationForm()
     if form.validate_on_submit():
         user = User(username=form.username.data, email=form.email.data)
@@ -535,11 +1689,12 @@ def register():
     
     return render_template('register.html', title='Register', form=form)
 
-@app.route('/login', methods=['GET', 'POST'])
+@views.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('index'))
     
+    from forms import LoginForm
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
@@ -553,24 +1708,122 @@ def login():
     
     return render_template('login.html', title='Login', form=form)
 
-@app.route('/logout')
+@views.route('/logout')
 def logout():
     """User logout route."""
+    if current_user.is_authenticated:
+        forget_user(current_user.id)
     logout_user()
     flash('You have been logged out.', 'info')
     return redirect(url_for('index'))
 
-@app.route('/dashboard')
+HEALTH_FILTERS = ['healthy', 'redirecting', 'client_error', 'server_error', 'not_checked', 'inactive', 'unknown']
+
+def health_clause(health):
+    """SQL filter matching URL.get_health_status() for one dashboard health filter."""
+    checked = db.and_(URL.is_active == True, URL.last_checked.isnot(None))
+    if health == 'inactive':
+        return URL.is_active == False
+    if health == 'not_checked':
+        return db.and_(URL.is_active == True, URL.last_checked.is_(None))
+    if health == 'unknown':
+        return db.and_(checked, URL.status_code.is_(None))
+    ranges = {'healthy': (200, 300), 'redirecting': (300, 400), 'client_error': (400, 500), 'server_error': (500, 600)}
+    low, high = ranges[health]
+    return db.and_(checked, URL.status_code >= low, URL.status_code < high)
+
+def escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def dashboard_filters():
+    return {
+        'q': request.args.get('q', '').strip(),
+        'domain': request.args.get('domain', '').strip().lower(),
+        'health': request.args.get('health', '') if request.args.get('health') in HEALTH_FILTERS else ''
+    }
+
+def filtered_user_urls(user_id, filters):
+    query = URL.query.filter(URL.user_id == user_id)
+    if filters['q']:
+        query = query.filter(URL.short_code.like(escape_like(filters['q']) + '%', escape='\\'))
+    if filters['domain']:
+        domain = escape_like(filters['domain'])
+        query = query.filter(db.or_(
+            URL.original_url.like(f'%://{domain}/%', escape='\\'),
+            URL.original_url.like(f'%://{domain}:%', escape='\\')
+        ))
+    if filters['health']:
+        query = query.filter(health_clause(filters['health']))
+    return query
+
+def encode_cursor(url_entry):
+    return f"{url_entry.created_at.isoformat()}_{url_entry.id}"
+
+def decode_cursor(cursor):
+    try:
+        created_at, url_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(created_at), int(url_id)
+    except (ValueError, AttributeError):
+        return None
+
+def dashboard_page(user_id, filters, cursor=None, page_size=None):
+    """One page of a user's URLs, newest first, seeking on (created_at, id)."""
+    page_size = page_size or get_int_setting('DASHBOARD_PAGE_SIZE', 50)
+    query = filtered_user_urls(user_id, filters)
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        query = query.filter(db.tuple_(URL.created_at, URL.id) < position)
+    urls = query.order_by(URL.created_at.desc(), URL.id.desc()).limit(page_size + 1).all()
+    next_cursor = encode_cursor(urls[page_size - 1]) if len(urls) > page_size else None
+    return urls[:page_size], next_cursor
+
+def user_url_totals(user_id):
+    total, visits, custom, expired = db.session.query(
+        db.func.count(URL.id),
+        db.func.coalesce(db.func.sum(URL.visits), 0),
+        db.func.coalesce(db.func.sum(db.case((URL.is_custom == True, 1), else_=0)), 0),
+        db.func.coalesce(db.func.sum(db.case((URL.expired_clause(), 1), else_=0)), 0)
+    ).filter(URL.user_id == user_id).one()
+    return {'total': total, 'visits': int(visits), 'custom': int(custom), 'active': total - int(expired)}
+
+@views.route('/dashboard')
 @login_required
+@replica_reads(db)
 def dashboard():
-    urls = URL.query.filter_by(user_id=current_user.id).order_by(URL.created_at.desc()).all()
-    return render_template('dashboard.html', title='Dashboard', urls=urls)
+    filters = dashboard_filters()
+    urls, next_cursor = dashboard_page(current_user.id, filters)
+    return render_template('dashboard.html', title='Dashboard', urls=urls, next_cursor=next_cursor,
+                           filters=filters, health_filters=HEALTH_FILTERS,
+                           totals=user_url_totals(current_user.id))
 
-@app.route('/account', methods=['GET', 'POST'])
+@views.route('/api/dashboard/urls')
+@login_required
+@replica_reads(db)
+def api_dashboard_urls():
+    filters = dashboard_filters()
+    urls, next_cursor = dashboard_page(current_user.id, filters, cursor=request.args.get('cursor'))
+    return jsonify({
+        'items': [{
+            'id': url.id,
+            'short_code': url.short_code,
+            'original_url': url.original_url,
+            'created_at': url.created_at.isoformat(),
+            'expires_at': url.expires_at.isoformat() if url.expires_at else None,
+            'visits': url.visits,
+            'is_custom': url.is_custom,
+            'is_expired': url.is_expired(),
+            'health': url.get_health_status()
+        } for url in urls],
+        'html': render_template('_dashboard_rows.html', urls=urls),
+        'next_cursor': next_cursor
+    })
+
+@views.route('/account', methods=['GET', 'POST'])
 @login_required
 def account():
     if request.method == 'POST':
         form_type = request.form.get('form_type')
+        user = db.session.get(User, current_user.id)
         
         if form_type == 'profile':
             username = request.form.get('username')
@@ -591,9 +1844,10 @@ def account():
                     flash('That email is already registered.', 'danger')
                     return redirect(url_for('account'))
                 
-                current_user.username = username
-                current_user.email = email
+                user.username = username
+                user.email = email
                 db.session.commit()
+                forget_user(user.id)
                 flash('Your profile has been updated.', 'success')
             except Exception as e:
                 db.session.rollback()
@@ -609,7 +1863,7 @@ def account():
                 flash('All password fields are required.', 'danger')
                 return redirect(url_for('account'))
                 
-            if not current_user.check_password(current_password):
+            if not user.check_password(current_password):
                 flash('Current password is incorrect.', 'danger')
                 return redirect(url_for('account'))
                 
@@ -622,17 +1876,21 @@ def account():
                 return redirect(url_for('account'))
             
             try:
-                current_user.set_password(new_password)
+                user.set_password(new_password)
                 db.session.commit()
+                forget_user(user.id)
                 flash('Your password has been updated.', 'success')
             except Exception as e:
                 db.session.rollback()
                 logging.error(f"Error updating password: {str(e)}")
                 flash('An error occurred while updating your password.', 'danger')
+        
+        # Redirect so the page is rendered with the reloaded user.
+        return redirect(url_for('account'))
                 
     return render_template('account.html', title='Account')
 
-@app.route('/url/delete/<int:url_id>')
+@views.route('/url/delete/<int:url_id>')
 @login_required
 def delete_url(url_id):
     url = URL.query.get_or_404(url_id)
@@ -641,8 +1899,10 @@ def delete_url(url_id):
         return redirect(url_for('dashboard'))
     
     try:
+        short_code = url.short_code
         db.session.delete(url)
         db.session.commit()
+        forget_short_codes([short_code])
         flash('Your URL has been deleted.', 'success')
     except Exception as e:
         db.session.rollback()
@@ -651,5 +1911,41 @@ def delete_url(url_id):
     
     return redirect(url_for('dashboard'))
 
+def create_app():
+    """Build and return a Flask app serving the views above.
+
+    Models, caches and other per-worker state are module-level and shared by
+    every app; each call configures a new app from the environment, binds
+    ``db`` and the login manager to it, registers the views and installs the
+    redirect fast path. Background work runs in the app built last. Nothing
+    here touches the database: engines connect on first use, and the schema
+    is created and upgraded only by migrate_db.py.
+    """
+    global background_app
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("SESSION_SECRET", "default-secret-key-for-development")
+    app.config['SQLALCHEMY_DATABASE_URI'] = get_database_url()
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = get_engine_options(app.config['SQLALCHEMY_DATABASE_URI'], app.debug)
+    if 'pool_size' in app.config['SQLALCHEMY_ENGINE_OPTIONS']:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS']['poolclass'] = timed_pool_class(metrics, on_wait=load_shedder.observe)
+    
+    db.init_app(app)
+    login_manager.init_app(app)
+    views.register(app)
+    with app.app_context():
+        instrument_engine(db.engine, metrics)
+        metrics.add_collector(pool_collector(db.engine))
+    
+    app.wsgi_app = RedirectFastPath(app, app.wsgi_app)
+    if os.environ.get('TRUSTED_PROXIES'):
+        # Take the client address from X-Forwarded-For, e.g. behind a load balancer.
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.environ['TRUSTED_PROXIES']), x_proto=1)
+    
+    background_app = app
+    cleanup_scheduler.app = app
+    return app
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    create_app().run(host='0.0.0.0', port=5000, debug=True)
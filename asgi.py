@@ -0,0 +1,245 @@
+"""ASGI entry point.
+
+Redirects, /api/status and /health are served on an async database engine,
+so a waiting redirect holds neither a thread nor a blocking connection.
+Every other route, and the 404/410 error pages, go to the Flask app, which
+runs in a thread pool.
+
+    uvicorn asgi:app --workers 4
+    gunicorn -k uvicorn.workers.UvicornWorker -c gunicorn.conf.py asgi:app
+"""
+import time
+import asyncio
+from datetime import datetime, timedelta
+from a2wsgi import WSGIMiddleware
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.exceptions import HTTPException
+from werkzeug.urls import iri_to_uri
+from app import (create_app, URL, ClickEvent, url_cache, visit_buffer, metrics,
+                 redirect_log, url_status_payload, health_payload, redirect_response, status_response,
+                 claim_visit_statement, ASGI_REDIRECT_OUTCOME)
+from config import get_async_database_url, get_async_engine_options, get_int_setting
+from metrics import instrument_engine
+from url_cache import CachedURL
+from url_shortener import URLRecord
+
+urls_table = URL.__table__
+clicks_table = ClickEvent.__table__
+
+
+async def send_response(send, response, head=False):
+    """Send a Werkzeug response (small and fully buffered) over ASGI."""
+    headers = []
+    for name, value in response.headers.items():
+        name = name.lower()
+        if name == 'location':
+            # As Werkzeug does for WSGI: Location must be ASCII.
+            value = iri_to_uri(value)
+        headers.append((name.encode('latin-1'), value.encode('latin-1')))
+    await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': b'' if head else response.get_data()})
+
+
+def conditional_environ(scope):
+    """The part of a WSGI environ that Werkzeug's conditional responses read."""
+    environ = {'REQUEST_METHOD': scope['method']}
+    for name, value in scope['headers']:
+        if name in (b'if-none-match', b'if-modified-since'):
+            environ['HTTP_' + name.decode('latin-1').upper().replace('-', '_')] = value.decode('latin-1')
+    return environ
+
+
+class AsyncServer:
+    """Serves the read hot paths itself and hands everything else to Flask.
+
+    Routing uses the Flask URL map, so a path is served here exactly when
+    Flask would have dispatched it to ``redirect_to_url``, ``api_url_status``
+    or ``health_check``. The views share the Flask app's per-process URL
+    cache, visit buffer and metrics. When a redirect
+    ends in a 404 or 410, the request is passed on to Flask with that
+    outcome in the scope; Flask renders the error page and flashes the
+    message as before, without a second lookup.
+
+    Reads go to the primary; the replica routing of the Flask views does
+    not apply here, and neither does the short code filter, whose only use
+    on the redirect path is to skip replicas for unknown codes.
+    """
+
+    def __init__(self, wsgi_app, database_url, wsgi_threads=10):
+        self.wsgi_app = wsgi_app
+        self.database_url = get_async_database_url(database_url)
+        self.wsgi = WSGIMiddleware(wsgi_app, workers=wsgi_threads)
+        self.routes = wsgi_app.url_map.bind('localhost')
+        self.views = {
+            'redirect_to_url': self.redirect,
+            'api_url_status': self.status,
+            'health_check': self.health
+        }
+        self._engine = None
+
+    @property
+    def engine(self):
+        # Created on first use so it belongs to the worker's event loop.
+        if self._engine is None:
+            self._engine = create_async_engine(self.database_url, **get_async_engine_options(self.database_url))
+            instrument_engine(self._engine.sync_engine, metrics)
+        return self._engine
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        view = None
+        if scope['type'] == 'http':
+            try:
+                rule, args = self.routes.match(scope['path'], method=scope['method'], return_rule=True)
+                view = self.views.get(rule.endpoint)
+            except HTTPException:
+                pass
+        if view is None:
+            return await self.wsgi(scope, receive, send)
+
+        started = time.perf_counter()
+        response = await view(scope, **args)
+        if response is None:
+            return await self.wsgi(scope, receive, send)
+        metrics.observe(
+            'http_request_duration_seconds',
+            time.perf_counter() - started,
+            route=rule.rule,
+            method=scope['method'],
+            status=response.status_code
+        )
+        metrics.maybe_write_snapshot()
+        await send_response(send, response, head=scope['method'] == 'HEAD')
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._engine is not None:
+                    await self._engine.dispose()
+                await asyncio.to_thread(visit_buffer.stop)
+                metrics.write_snapshot()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def redirect(self, scope, short_code):
+        """``redirect_to_url``; returns None to let Flask render a 404 or 410.
+
+        The outcome is left in the scope, so Flask renders the page without
+        looking the code up again.
+        """
+        redirect_log.debug("Redirect request for code: %s", short_code)
+        cached = url_cache.get(short_code)
+        if cached is not None:
+            if cached.is_expired():
+                url_cache.invalidate(short_code)
+                return self.error_page(scope, 'expired')
+            if cached.is_visit_limited():
+                claimed = await self.claim_visit(short_code)
+                if claimed is None:
+                    # Used up or deleted; Flask looks the code up again to
+                    # tell which, as its own view does.
+                    url_cache.invalidate(short_code)
+                    return None
+                await self.record_visit(scope, claimed.id, short_code, counted=True)
+                metrics.inc('redirect_outcomes_total', outcome='cache_hit')
+                redirect_log.debug("Redirecting to: %s (claimed)", claimed.original_url)
+                return redirect_response(claimed.original_url, claimed)
+            await self.record_visit(scope, cached.id, short_code)
+            metrics.inc('redirect_outcomes_total', outcome='cache_hit')
+            redirect_log.debug("Redirecting to: %s (cached)", cached.original_url)
+            return redirect_response(cached.original_url, cached)
+
+        async with self.engine.connect() as conn:
+            row = (await conn.execute(
+                select(urls_table.c.id, urls_table.c.original_url, urls_table.c.expires_at,
+                       urls_table.c.expiration_type, urls_table.c.max_visits, urls_table.c.visits)
+                .where(urls_table.c.short_code == short_code)
+            )).first()
+        if row is None:
+            return self.error_page(scope, 'not_found')
+        url_entry = URLRecord(short_code, row.original_url, row.expires_at, row.expiration_type,
+                              row.max_visits, row.visits, row.id)
+        if url_entry.is_expired():
+            return self.error_page(scope, 'expired')
+
+        if url_entry.is_visit_limited():
+            url_entry = await self.claim_visit(short_code)
+            if url_entry is None:
+                return self.error_page(scope, 'expired')
+            await self.record_visit(scope, url_entry.id, short_code, counted=True)
+        else:
+            await self.record_visit(scope, url_entry.id, short_code)
+        metrics.inc('redirect_outcomes_total', outcome='hit')
+        url_cache.put(short_code, CachedURL(
+            url_entry.id, url_entry.original_url, url_entry.expires_at, url_entry.expiration_type,
+            url_entry.max_visits
+        ))
+
+        redirect_log.debug("Redirecting %s to: %s", short_code, url_entry.original_url)
+        return redirect_response(url_entry.original_url, url_entry)
+
+    def error_page(self, scope, outcome):
+        scope[ASGI_REDIRECT_OUTCOME] = outcome
+        return None
+
+    async def claim_visit(self, short_code):
+        async with self.engine.begin() as conn:
+            row = (await conn.execute(claim_visit_statement(short_code, datetime.utcnow()))).first()
+        if row is None:
+            return None
+        return URLRecord(short_code, row.original_url, row.expires_at, row.expiration_type,
+                         row.max_visits, row.visits, row.id)
+
+    async def record_visit(self, scope, url_id, short_code, counted=False):
+        headers = dict(scope['headers'])
+        referer = headers.get(b'referer')
+        user_agent = headers.get(b'user-agent')
+        client = scope.get('client')
+        record = visit_buffer.record_event if counted else visit_buffer.record
+        args = (url_id, short_code, referer.decode('latin-1') if referer else None,
+                user_agent.decode('latin-1') if user_agent else None, client[0] if client else None,
+                datetime.utcnow())
+        if visit_buffer.flush_interval <= 0:
+            # Unbuffered mode writes the visit inline on a blocking connection.
+            await asyncio.to_thread(record, *args)
+        else:
+            record(*args)
+
+    async def status(self, scope, short_code):
+        async with self.engine.connect() as conn:
+            row = (await conn.execute(select(urls_table).where(urls_table.c.short_code == short_code))).first()
+            if row is None:
+                response = self.wsgi_app.json.response({'error': 'URL not found'})
+                response.status_code = 404
+                return response
+            recent_clicks = (await conn.execute(
+                select(clicks_table).where(clicks_table.c.url_id == row.id)
+                .order_by(clicks_table.c.clicked_at.desc()).limit(10)
+            )).all()
+            clicks_last_24h = (await conn.execute(
+                select(func.count()).select_from(clicks_table).where(
+                    clicks_table.c.url_id == row.id,
+                    clicks_table.c.clicked_at >= datetime.utcnow() - timedelta(hours=24)
+                )
+            )).scalar()
+        # Transient model instances, so the response is built exactly as in Flask.
+        url_entry = URL(**row._mapping)
+        recent_clicks = [ClickEvent(**click._mapping) for click in recent_clicks]
+        return status_response(url_status_payload(url_entry, recent_clicks, clicks_last_24h), url_entry,
+                               recent_clicks, conditional_environ(scope), app=self.wsgi_app)
+
+    async def health(self, scope):
+        return self.wsgi_app.json.response(health_payload())
+
+
+flask_app = create_app()
+app = AsyncServer(
+    flask_app,
+    flask_app.config['SQLALCHEMY_DATABASE_URI'],
+    wsgi_threads=get_int_setting('ASGI_WSGI_THREADS', 10)
+)
@@ -0,0 +1,515 @@
+import os
+import sys
+import json
+import math
+import time
+import bisect
+import random
+import socket
+import logging
+import argparse
+import platform
+import tempfile
+import itertools
+import threading
+import subprocess
+import http.client
+from datetime import datetime
+from urllib.parse import urlencode
+
+ROUTES = ('redirect', 'shorten', 'api_shorten', 'status')
+# Status codes that count as a successful request for each route.
+EXPECTED_STATUS = {
+    'redirect': (302, 301),
+    'shorten': (200,),
+    'api_shorten': (200, 201),
+    'status': (200,)
+}
+SEED_HOST = 'https://bench.example.com'
+
+
+class Request:
+    __slots__ = ('method', 'path', 'body', 'headers')
+
+    def __init__(self, method, path, body=None, headers=None):
+        self.method = method
+        self.path = path
+        self.body = body
+        self.headers = headers or {}
+
+
+class ZipfSampler:
+    """Draws indexes in ``range(count)`` where rank k has weight 1 / k**skew.
+
+    ``skew=0`` is uniform; around 1.0 matches typical link popularity, where
+    a few codes get most of the traffic.
+    """
+
+    def __init__(self, count, skew, rng):
+        self.rng = rng
+        self.cum_weights = list(itertools.accumulate(1.0 / (rank ** skew) for rank in range(1, count + 1)))
+        self.total = self.cum_weights[-1]
+
+    def sample(self):
+        return bisect.bisect_left(self.cum_weights, self.rng.random() * self.total)
+
+
+def seed_database(rows, batch_size=5000):
+    """Make sure the database holds at least ``rows`` benchmark URLs.
+
+    Returns the seeded short codes in insertion order, which is deterministic
+    for a fresh database and a fixed CODE_SECRET.
+    """
+    from app import create_app, db, URL, code_allocator
+    from url_utils import url_digest
+    import migrate_db
+    migrate_db.migrate_database()
+    app = create_app()
+
+    table = URL.__table__
+    with app.app_context():
+        prefix = SEED_HOST + '/seed/'
+        existing = db.session.query(db.func.count(URL.id)).filter(URL.original_url.like(prefix + '%')).scalar()
+        started = time.perf_counter()
+        for start in range(existing, rows, batch_size):
+            count = min(batch_size, rows - start)
+            now = datetime.utcnow()
+            codes = code_allocator.next_codes(count)
+            values = []
+            for offset, code in enumerate(codes):
+                original_url = f"{prefix}{start + offset}"
+                values.append({
+                    'original_url': original_url,
+                    'url_hash': url_digest(original_url),
+                    'short_code': code,
+                    'created_at': now,
+                    'visits': 0,
+                    'is_custom': False,
+                    'is_active': True,
+                    'expiration_type': 'never'
+                })
+            db.session.execute(table.insert(), values)
+            db.session.commit()
+        if rows > existing:
+            logging.info(f"Seeded {rows - existing} URLs in {time.perf_counter() - started:.1f}s")
+        return [row.short_code for row in db.session.query(URL.short_code).filter(
+            URL.original_url.like(prefix + '%')
+        ).order_by(URL.id).limit(rows)]
+
+
+def build_requests(route, count, codes, skew, rng, run_id):
+    """The request sequence for one route; identical for the same seed."""
+    if route in ('redirect', 'status'):
+        ranked = list(codes)
+        rng.shuffle(ranked)
+        sampler = ZipfSampler(len(ranked), skew, rng)
+        template = '/{}' if route == 'redirect' else '/api/status/{}'
+        return [Request('GET', template.format(ranked[sampler.sample()])) for _ in range(count)]
+
+    requests = []
+    for i in range(count):
+        target = f"{SEED_HOST}/new/{run_id}/{route}/{i}"
+        if route == 'shorten':
+            requests.append(Request('POST', '/shorten', urlencode({'url': target}),
+                                    {'Content-Type': 'application/x-www-form-urlencoded'}))
+        else:
+            requests.append(Request('POST', '/api/shorten', json.dumps({'url': target}),
+                                    {'Content-Type': 'application/json'}))
+    return requests
+
+
+class ClientDriver:
+    """Sends requests in-process through the Flask test client."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def send(self, req):
+        response = self.client.open(req.path, method=req.method, data=req.body, headers=req.headers)
+        response.close()
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class HTTPDriver:
+    """Sends requests over one keep-alive connection, reconnecting when the server closes it."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.conn = None
+
+    def send(self, req):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        try:
+            self.conn.request(req.method, req.path, body=req.body, headers=req.headers)
+            response = self.conn.getresponse()
+            response.read()
+        except (http.client.HTTPException, OSError):
+            self.close()
+            raise
+        if response.will_close:
+            self.close()
+        return response.status
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    # Nearest-rank percentile.
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_route(route, requests, make_driver, concurrency, warmup=0):
+    """Replay ``requests`` from ``concurrency`` threads and summarize latency."""
+    latencies = [None] * len(requests)
+    statuses = [None] * len(requests)
+    counter = itertools.count()
+
+    for req in requests[:warmup]:
+        driver = make_driver()
+        try:
+            driver.send(req)
+        except Exception:
+            pass
+        driver.close()
+    requests = requests[warmup:]
+
+    def worker():
+        driver = make_driver()
+        try:
+            while True:
+                index = next(counter)
+                if index >= len(requests):
+                    return
+                started = time.perf_counter()
+                try:
+                    statuses[index] = driver.send(requests[index])
+                except Exception as e:
+                    statuses[index] = type(e).__name__
+                latencies[index] = time.perf_counter() - started
+        finally:
+            driver.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    done = sorted(latency * 1000 for latency in latencies[:len(requests)] if latency is not None)
+    status_codes = {}
+    for status in statuses[:len(requests)]:
+        status_codes[str(status)] = status_codes.get(str(status), 0) + 1
+    errors = sum(count for status, count in status_codes.items()
+                 if not status.isdigit() or int(status) not in EXPECTED_STATUS[route])
+    return {
+        'route': route,
+        'requests': len(requests),
+        'errors': errors,
+        'status_codes': status_codes,
+        'duration_s': round(elapsed, 3),
+        'throughput_rps': round(len(requests) / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'mean': round(sum(done) / len(done), 3) if done else None,
+            'p50': _round(percentile(done, 50)),
+            'p95': _round(percentile(done, 95)),
+            'p99': _round(percentile(done, 99)),
+            'max': _round(done[-1] if done else None)
+        }
+    }
+
+
+def _round(value):
+    return None if value is None else round(value, 3)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(workers, port, log_path, env=None, ready_path='/health', poll_interval=0.2):
+    """Start gunicorn on ``main:app`` and wait until ``ready_path`` answers without an error."""
+    log_file = open(log_path, 'ab')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '-w', str(workers),
+         '-b', f'127.0.0.1:{port}', 'main:app'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env or os.environ.copy(),
+        stdout=log_file,
+        stderr=log_file
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {process.returncode}, see {log_path}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', ready_path)
+            if conn.getresponse().status < 400:
+                conn.close()
+                return process
+        except OSError:
+            time.sleep(poll_interval)
+    process.terminate()
+    raise RuntimeError(f"gunicorn did not become ready, see {log_path}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmark(args):
+    os.environ['DATABASE_URL'] = args.database_url
+    # Measure the routes, not the per-client rate limits (set RATE_LIMITS to override).
+    os.environ.setdefault('RATE_LIMITS', '')
+    codes = seed_database(args.rows)
+    from app import create_app, db
+    app = create_app()
+
+    # Per-request debug logging would dominate the in-process numbers.
+    logging.getLogger().setLevel(logging.WARNING)
+    with app.app_context():
+        dialect = db.engine.dialect.name
+
+    rng = random.Random(args.seed)
+    run_id = f"{int(time.time())}-{os.getpid()}"
+    server = None
+    report = {
+        'benchmark': {
+            'started_at': datetime.utcnow().isoformat(),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': dialect,
+            'mode': args.mode,
+            'rows': args.rows,
+            'skew': args.skew,
+            'seed': args.seed,
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'concurrency': args.concurrency,
+            'workers': args.workers if args.mode == 'http' else None
+        },
+        'results': []
+    }
+
+    try:
+        if args.mode == 'http':
+            if args.url:
+                host, _, port = args.url.replace('http://', '').rstrip('/').partition(':')
+                port = int(port or 80)
+            else:
+                host, port = '127.0.0.1', free_port()
+                server = start_gunicorn(args.workers, port, args.server_log)
+
+            def make_driver():
+                return HTTPDriver(host, port)
+        else:
+            def make_driver():
+                return ClientDriver(app)
+
+        for route in args.routes:
+            requests = build_requests(route, args.requests + args.warmup, codes, args.skew, rng, run_id)
+            result = run_route(route, requests, make_driver, args.concurrency, args.warmup)
+            result['mode'] = args.mode
+            report['results'].append(result)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+    return report
+
+
+def probe_startup(path):
+    """Runs in a fresh process: time importing the app and serving its first request."""
+    started = time.perf_counter()
+    from main import app
+    imported = time.perf_counter()
+    response = app.test_client().get(path)
+    print(json.dumps({
+        'import': imported - started,
+        'first_request': time.perf_counter() - imported,
+        'status': response.status_code
+    }))
+
+
+def run_startup(args):
+    """Cold start time of fresh processes, up to their first redirect."""
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('RATE_LIMITS', '')
+    path = '/' + seed_database(args.rows)[0]
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    samples = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        if args.mode == 'http':
+            server = start_gunicorn(1, free_port(), args.server_log, ready_path=path, poll_interval=0.005)
+            samples.append({'ready': time.perf_counter() - started})
+            server.terminate()
+            server.wait(timeout=30)
+        else:
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), 'startup-probe', path],
+                                    cwd=here, capture_output=True, text=True, check=True).stdout
+            sample = json.loads(output.strip().splitlines()[-1])
+            if sample.pop('status') not in EXPECTED_STATUS['redirect']:
+                raise RuntimeError(f"First request to {path} did not redirect")
+            sample['process'] = time.perf_counter() - started
+            samples.append(sample)
+
+    startup = {}
+    for key in samples[0]:
+        values = sorted(sample[key] * 1000 for sample in samples)
+        startup[key] = {'p50': _round(percentile(values, 50)), 'max': _round(values[-1])}
+    return {
+        'benchmark': {
+            'started_at': datetime.utcnow().isoformat(),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'mode': args.mode,
+            'runs': args.runs
+        },
+        'results': [],
+        'startup': startup
+    }
+
+
+def summary(report):
+    """Print a report as a table, one line per route or startup timing."""
+    for result in report['results']:
+        latency = result['latency_ms']
+        print(f"{result['mode']:6} {result['route']:12} {result['throughput_rps']:>9} req/s  "
+              f"p50 {latency['p50']}ms  p95 {latency['p95']}ms  p99 {latency['p99']}ms  "
+              f"errors {result['errors']}")
+    for key, timing in report.get('startup', {}).items():
+        print(f"{report['benchmark']['mode']:6} startup {key:14} p50 {timing['p50']}ms  max {timing['max']}ms")
+
+
+def compare(base, new, threshold):
+    """Print per-route changes between two reports; return 1 if any route regressed."""
+    base_results = {(r['mode'], r['route']): r for r in base['results']}
+    regressed = False
+    print(f"{'mode':6} {'route':12} {'rps':>20} {'p95 ms':>22} {'p99 ms':>22}")
+    for result in new['results']:
+        old = base_results.get((result['mode'], result['route']))
+        if old is None:
+            continue
+        row = [f"{result['mode']:6} {result['route']:12}"]
+        for key, higher_is_better in (('throughput_rps', True), ('p95', False), ('p99', False)):
+            before = old[key] if key == 'throughput_rps' else old['latency_ms'][key]
+            after = result[key] if key == 'throughput_rps' else result['latency_ms'][key]
+            if not before or after is None:
+                row.append(f"{'n/a':>22}")
+                continue
+            change = (after - before) / before
+            worse = -change if higher_is_better else change
+            flag = '!' if worse > threshold else ' '
+            regressed = regressed or worse > threshold
+            row.append(f"{before:>8} -> {after:>8} {change:+6.1%}{flag}")
+        print(' '.join(row))
+    for key, timing in new.get('startup', {}).items():
+        before = base.get('startup', {}).get(key, {}).get('p50')
+        if not before:
+            continue
+        change = (timing['p50'] - before) / before
+        flag = '!' if change > threshold else ' '
+        regressed = regressed or change > threshold
+        print(f"startup {key:14} p50 ms {before:>8} -> {timing['p50']:>8} {change:+6.1%}{flag}")
+    return 1 if regressed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the hot routes of the URL shortener.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    default_db = 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'url_shortener_bench.db')
+    seed = sub.add_parser('seed', help='Seed the benchmark database')
+    seed.add_argument('--database-url', default=os.environ.get('BENCH_DATABASE_URL', default_db))
+    seed.add_argument('--rows', type=int, default=10000)
+
+    run = sub.add_parser('run', help='Seed if needed, then benchmark')
+    run.add_argument('--database-url', default=os.environ.get('BENCH_DATABASE_URL', default_db))
+    run.add_argument('--rows', type=int, default=10000, help='Seeded URLs to draw codes from')
+    run.add_argument('--mode', choices=('client', 'http'), default='client')
+    run.add_argument('--routes', nargs='+', choices=ROUTES, default=list(ROUTES))
+    run.add_argument('--requests', type=int, default=2000, help='Measured requests per route')
+    run.add_argument('--warmup', type=int, default=100)
+    run.add_argument('--concurrency', type=int, default=8)
+    run.add_argument('--skew', type=float, default=1.0, help='Zipf exponent for code popularity (0 = uniform)')
+    run.add_argument('--seed', type=int, default=42)
+    run.add_argument('--workers', type=int, default=4, help='gunicorn workers in http mode')
+    run.add_argument('--url', help='Benchmark an already running server instead of starting gunicorn')
+    run.add_argument('--server-log', default=os.path.join(tempfile.gettempdir(), 'url_shortener_bench_server.log'))
+    run.add_argument('--output', help='Also write the JSON report to this file')
+    run.add_argument('--json', action='store_true', help='Print the JSON report instead of a table')
+
+    startup = sub.add_parser('startup', help='Measure import-to-first-request time of fresh processes')
+    startup.add_argument('--database-url', default=os.environ.get('BENCH_DATABASE_URL', default_db))
+    startup.add_argument('--rows', type=int, default=10000, help='Seeded URLs')
+    startup.add_argument('--mode', choices=('client', 'http'), default='client',
+                         help='client: import and one test client request; http: one gunicorn worker until it redirects')
+    startup.add_argument('--runs', type=int, default=10)
+    startup.add_argument('--server-log', default=os.path.join(tempfile.gettempdir(), 'url_shortener_bench_server.log'))
+    startup.add_argument('--output', help='Also write the JSON report to this file')
+    startup.add_argument('--json', action='store_true', help='Print the JSON report instead of a table')
+
+    probe = sub.add_parser('startup-probe')
+    probe.add_argument('path')
+
+    cmp = sub.add_parser('compare', help='Compare two JSON reports')
+    cmp.add_argument('base')
+    cmp.add_argument('new')
+    cmp.add_argument('--threshold', type=float, default=0.10, help='Allowed relative regression (default 0.10)')
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == 'compare':
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        return compare(base, new, args.threshold)
+
+    if args.command == 'startup-probe':
+        probe_startup(args.path)
+        return 0
+
+    if args.command == 'seed':
+        os.environ['DATABASE_URL'] = args.database_url
+        print(len(seed_database(args.rows)))
+        return 0
+
+    report = run_startup(args) if args.command == 'startup' else run_benchmark(args)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    if args.json:
+        print(output)
+    else:
+        summary(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
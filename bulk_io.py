@@ -0,0 +1,83 @@
+import io
+import csv
+import json
+from datetime import datetime
+from itertools import islice
+
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+# Columns of an exported link, in order. Imports accept the same names.
+EXPORT_FIELDS = ('short_code', 'original_url', 'created_at', 'expires_at', 'expiration_type', 'max_visits',
+                 'visits', 'is_custom', 'is_active', 'last_visited')
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def export_lines(result, fields, fmt):
+    """Serialize a ``yield_per`` result, yielding one string per fetched partition.
+
+    Only one partition is held at a time, so memory does not grow with the
+    number of rows.
+    """
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        yield buffer.getvalue()
+        for partition in result.partitions():
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows([_value(value) for value in row] for row in partition)
+            yield buffer.getvalue()
+    else:
+        for partition in result.partitions():
+            yield ''.join(json.dumps(dict(zip(fields, map(_value, row)))) + '\n' for row in partition)
+
+
+def import_payload(row):
+    """The /api/shorten payload for one import row.
+
+    Empty CSV cells count as missing. Exported rows are accepted as they
+    are: ``original_url`` is the URL and ``short_code`` becomes the alias,
+    so links keep their codes, and ``is_custom`` is kept so generated codes
+    are still found by deduplication. Anything else is passed on unchanged
+    and rejected by the validation.
+    """
+    if not isinstance(row, dict):
+        return row
+    payload = {key: value for key, value in row.items() if key and value not in (None, '')}
+    if 'url' not in payload and 'original_url' in payload:
+        payload['url'] = payload.pop('original_url')
+    if 'alias' not in payload and 'short_code' in payload:
+        payload['alias'] = payload.pop('short_code')
+    if isinstance(payload.get('is_custom'), str):
+        # CSV cells hold the exported Python booleans as text.
+        payload['is_custom'] = payload['is_custom'].strip().lower() not in ('false', '0')
+    return payload
+
+
+def read_import_items(stream, fmt):
+    """Yield import payloads from a binary CSV (with a header row) or NDJSON stream."""
+    if fmt == 'csv':
+        for row in csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')):
+            yield import_payload(row)
+        return
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield import_payload(json.loads(line))
+        except ValueError:
+            yield None
+
+
+def batches(items, size):
+    """Split an iterator into lists of at most ``size`` items."""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
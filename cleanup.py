@@ -0,0 +1,172 @@
+import sys
+import time
+import logging
+import argparse
+import threading
+from datetime import datetime
+from sqlalchemy import text, func
+
+# Key for pg_try_advisory_lock so only one worker per database runs the scheduled cleanup.
+ADVISORY_LOCK_KEY = 0x75726c73
+
+
+class CleanupReport:
+    __slots__ = ('action', 'count', 'chunks', 'elapsed', 'complete')
+
+    def __init__(self, action):
+        self.action = action
+        self.count = 0
+        self.chunks = 0
+        self.elapsed = 0.0
+        self.complete = True
+
+    def to_dict(self):
+        return {
+            'action': self.action,
+            'count': self.count,
+            'chunks': self.chunks,
+            'elapsed_ms': round(self.elapsed * 1000, 1),
+            'complete': self.complete
+        }
+
+
+def count_expired(db, URL, now=None):
+    return db.session.query(func.count(URL.id)).filter(URL.expired_clause(now)).scalar()
+
+
+def delete_expired(db, URL, chunk_size=1000, max_rows=None, on_deleted=None, progress=None):
+    """Delete expired URLs in keyset-ordered chunks, one short transaction each.
+
+    Rows are walked in primary key order so every chunk is a bounded index
+    range scan, and at most ``chunk_size`` rows are locked or held in memory
+    at a time. ``on_deleted`` receives the short codes of each deleted chunk
+    and ``progress`` the running CleanupReport.
+    """
+    report = CleanupReport('delete')
+    started = time.monotonic()
+    now = datetime.utcnow()
+    table = URL.__table__
+    last_id = 0
+
+    def remaining(limit):
+        return db.session.query(URL.id, URL.short_code).filter(
+            URL.id > last_id, URL.expired_clause(now)
+        ).order_by(URL.id).limit(limit).all()
+
+    while max_rows is None or report.count < max_rows:
+        limit = chunk_size if max_rows is None else min(chunk_size, max_rows - report.count)
+        rows = remaining(limit)
+        if not rows:
+            break
+
+        ids = [row.id for row in rows]
+        db.session.execute(table.delete().where(table.c.id.in_(ids)))
+        db.session.commit()
+
+        last_id = ids[-1]
+        report.count += len(rows)
+        report.chunks += 1
+        if on_deleted:
+            on_deleted([row.short_code for row in rows])
+        if progress:
+            progress(report)
+        if len(rows) < limit:
+            break
+    else:
+        # Stopped at max_rows: done only if no expired row is left.
+        report.complete = not remaining(1)
+
+    report.elapsed = time.monotonic() - started
+    return report
+
+
+def log_progress(report):
+    logging.info(f"Cleanup: deleted {report.count} expired URLs in {report.chunks} chunks")
+
+
+class CleanupScheduler:
+    """Runs delete_expired every ``interval`` seconds on a daemon thread.
+
+    On PostgreSQL a session-level advisory lock makes sure only one worker
+    across all processes does the work for a given run.
+    """
+
+    def __init__(self, app, db, URL, interval=3600, chunk_size=1000, on_deleted=None, max_rows=None):
+        self.app = app
+        self.db = db
+        self.URL = URL
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.on_deleted = on_deleted
+        self.max_rows = max_rows
+        self.last_report = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name='expired-url-cleanup', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self):
+        with self.app.app_context():
+            engine = self.db.engine
+            if engine.dialect.name != 'postgresql':
+                return self._delete()
+
+            with engine.connect() as lock_conn:
+                if not lock_conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {'key': ADVISORY_LOCK_KEY}).scalar():
+                    logging.debug("Cleanup skipped: another worker holds the lock")
+                    return None
+                try:
+                    return self._delete()
+                finally:
+                    lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': ADVISORY_LOCK_KEY})
+
+    def _delete(self):
+        self.last_report = delete_expired(
+            self.db, self.URL, self.chunk_size, self.max_rows, on_deleted=self.on_deleted, progress=log_progress
+        )
+        return self.last_report
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logging.error(f"Scheduled cleanup failed: {str(e)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Delete expired short URLs.')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--max-rows', type=int, default=None)
+    parser.add_argument('--interval', type=int, default=0, help='Repeat every N seconds instead of running once')
+    parser.add_argument('--dry-run', action='store_true', help='Only count expired URLs')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    from app import create_app, db, URL
+    app = create_app()
+
+    if args.dry_run:
+        with app.app_context():
+            logging.info(f"Found {count_expired(db, URL)} expired URLs")
+        return 0
+
+    scheduler = CleanupScheduler(app, db, URL, args.interval, args.chunk_size, max_rows=args.max_rows)
+    while True:
+        report = scheduler.run_once()
+        if report:
+            logging.info(f"Cleanup finished: {report.to_dict()}")
+        if args.interval <= 0:
+            return 0
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from rollups import prune_rollups
+
+PARTITION_PREFIX = 'click_events_'
+
+_id_lock = threading.Lock()
+_id_state = {'ms': 0, 'seq': 0}
+
+
+def new_event_id():
+    """Time-ordered 63-bit id: milliseconds, 10 bits of pid, 12-bit sequence.
+
+    Ids are generated in the worker so batched inserts need no RETURNING and
+    the primary key (clicked_at, id) is valid on a range-partitioned table.
+    """
+    with _id_lock:
+        ms = int(time.time() * 1000)
+        if ms <= _id_state['ms']:
+            _id_state['seq'] += 1
+            if _id_state['seq'] > 0xfff:
+                _id_state['ms'] += 1
+                _id_state['seq'] = 0
+            ms = _id_state['ms']
+        else:
+            _id_state['ms'] = ms
+            _id_state['seq'] = 0
+        return (ms << 22) | ((os.getpid() & 0x3ff) << 12) | _id_state['seq']
+
+
+def is_partitioned(engine):
+    return engine.dialect.name == 'postgresql'
+
+
+def partition_name(day):
+    return f"{PARTITION_PREFIX}{day.strftime('%Y%m%d')}"
+
+
+def ensure_partitions(engine, days_ahead=7, start=None):
+    """Create daily partitions from ``start`` (default today) through ``days_ahead``."""
+    if not is_partitioned(engine):
+        return []
+    first = (start or datetime.utcnow()).date()
+    created = []
+    with engine.connect() as conn:
+        for offset in range(days_ahead + 1):
+            day = first + timedelta(days=offset)
+            name = partition_name(day)
+            try:
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF click_events "
+                    f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+                ))
+                conn.commit()
+                created.append(name)
+            except Exception as e:
+                # Another worker may have created it concurrently.
+                conn.rollback()
+                logging.debug(f"Partition {name} not created: {str(e)}")
+    return created
+
+
+def list_partitions(engine):
+    if not is_partitioned(engine):
+        return []
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+            "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+            "WHERE parent.relname = 'click_events'"
+        )).fetchall()
+    return sorted(row[0] for row in rows)
+
+
+def drop_partitions_before(engine, cutoff, chunk_size=10000):
+    """Discard click events older than ``cutoff``.
+
+    On PostgreSQL whole daily partitions are dropped. Other databases store
+    events in a single table and fall back to chunked DELETEs.
+    """
+    cutoff_day = cutoff.date() if isinstance(cutoff, datetime) else cutoff
+    if is_partitioned(engine):
+        dropped = []
+        with engine.connect() as conn:
+            for name in list_partitions(engine):
+                try:
+                    day = datetime.strptime(name[len(PARTITION_PREFIX):], '%Y%m%d').date()
+                except ValueError:
+                    continue
+                if day < cutoff_day:
+                    conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                    conn.commit()
+                    dropped.append(name)
+        if dropped:
+            logging.info(f"Dropped click event partitions: {dropped}")
+        return len(dropped)
+
+    cutoff_at = datetime.combine(cutoff_day, datetime.min.time())
+    deleted = 0
+    with engine.connect() as conn:
+        while True:
+            result = conn.execute(text(
+                "DELETE FROM click_events WHERE id IN "
+                "(SELECT id FROM click_events WHERE clicked_at < :cutoff LIMIT :limit)"
+            ), {'cutoff': cutoff_at, 'limit': chunk_size})
+            conn.commit()
+            deleted += result.rowcount
+            if result.rowcount < chunk_size:
+                break
+    return deleted
+
+
+class ClickLogMaintenance:
+    """Keeps partitions ahead of the clock and applies retention once per day.
+
+    ``rollup_retention`` maps each click rollup granularity to the days its
+    buckets are kept (see rollups.py).
+    """
+
+    def __init__(self, retention_days=90, days_ahead=7, rollup_retention=None):
+        self.retention_days = retention_days
+        self.days_ahead = days_ahead
+        self.rollup_retention = rollup_retention or {}
+        self._last_run = None
+        self._lock = threading.Lock()
+
+    def run_if_due(self, engine):
+        today = datetime.utcnow().date()
+        with self._lock:
+            if self._last_run == today:
+                return False
+            self._last_run = today
+        try:
+            ensure_partitions(engine, self.days_ahead)
+            if self.retention_days > 0:
+                drop_partitions_before(engine, today - timedelta(days=self.retention_days))
+            if self.rollup_retention:
+                prune_rollups(engine, self.rollup_retention)
+        except Exception as e:
+            self._last_run = None
+            logging.error(f"Click log maintenance failed: {str(e)}")
+        return True
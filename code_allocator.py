@@ -0,0 +1,140 @@
+import os
+import string
+import hashlib
+import threading
+
+ALPHABET = string.digits + string.ascii_letters
+BASE = len(ALPHABET)
+DIGITS = {char: value for value, char in enumerate(ALPHABET)}
+FEISTEL_ROUNDS = 8
+
+
+def encode_base62(number, length):
+    chars = []
+    for _ in range(length):
+        number, digit = divmod(number, BASE)
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+def decode_base62(code):
+    number = 0
+    for char in code:
+        number = number * BASE + DIGITS[char]
+    return number
+
+
+class LocalBlockSource:
+    """In-process counter, for single-process use such as URLShortener."""
+
+    def __init__(self, start=0):
+        self.next_value = start
+        self._lock = threading.Lock()
+
+    def __call__(self, size):
+        with self._lock:
+            start = self.next_value
+            self.next_value += size
+            return start
+
+
+class CodeAllocator:
+    """Hands out unique short codes from reserved blocks of a global counter.
+
+    ``reserve_block(size)`` must atomically reserve ``size`` consecutive
+    counter values and return the first one; with a database-backed source
+    that is one round trip per block instead of one per code. Counter values
+    are split into length tiers: the first ``fill_ratio`` of the
+    ``min_length``-character keyspace, then of the next length, and so on, so
+    codes grow by one character whenever a tier is used up. Inside a tier the
+    index is encrypted with a keyed Feistel network over the tier's
+    keyspace, so without ``key`` one code says nothing about the next.
+
+    ``key`` is the secret (bytes or str), or a callable returning it, which
+    is called on first use. Every process sharing ``reserve_block`` must use
+    the same key, or their codes can collide.
+    """
+
+    def __init__(self, reserve_block, key, block_size=1000, min_length=6, fill_ratio=0.5):
+        self.reserve_block = reserve_block
+        self.key = key
+        self.block_size = block_size
+        self.min_length = min_length
+        self.fill_ratio = fill_ratio
+        self._next = 0
+        self._end = 0
+        self._pid = None
+        self._lock = threading.Lock()
+        self._round_hash = None
+
+    def next_code(self):
+        with self._lock:
+            return self.encode(self._take(1)[0])
+
+    def next_codes(self, count):
+        with self._lock:
+            return [self.encode(value) for value in self._take(count)]
+
+    def encode(self, value):
+        length = self.min_length
+        while True:
+            capacity = self.tier_capacity(length)
+            if value < capacity:
+                break
+            value -= capacity
+            length += 1
+        return encode_base62(self.permute(value, length), length)
+
+    def tier_capacity(self, length):
+        return max(1, int(BASE ** length * self.fill_ratio))
+
+    def _take(self, count):
+        # Reserved blocks belong to one process; a forked child must not
+        # reuse values its parent may also hand out.
+        pid = os.getpid()
+        if self._pid != pid:
+            self._pid = pid
+            self._next = self._end = 0
+
+        values = []
+        while len(values) < count:
+            if self._next >= self._end:
+                size = max(self.block_size, count - len(values))
+                self._next = self.reserve_block(size)
+                self._end = self._next + size
+            take = min(count - len(values), self._end - self._next)
+            values.extend(range(self._next, self._next + take))
+            self._next += take
+        return values
+
+    def permute(self, value, length):
+        """Map ``value`` to a unique number below ``BASE ** length``.
+
+        A balanced Feistel network runs over the smallest even number of bits
+        covering the keyspace; outputs outside of it are encrypted again
+        (cycle walking), which takes under four rounds on average.
+        """
+        space = BASE ** length
+        bits = space.bit_length()
+        half = (bits + 1) // 2
+        mask = (1 << half) - 1
+        round_hash = self._round_hash or self._load_key()
+        prefix = length.to_bytes(1, 'big')
+        while True:
+            left, right = value >> half, value & mask
+            for round_number in range(FEISTEL_ROUNDS):
+                digest = round_hash.copy()
+                digest.update(prefix + round_number.to_bytes(1, 'big') + right.to_bytes(16, 'big'))
+                left, right = right, left ^ (int.from_bytes(digest.digest(), 'big') & mask)
+            value = (left << half) | right
+            if value < space:
+                return value
+
+    def _load_key(self):
+        key = self.key() if callable(self.key) else self.key
+        if isinstance(key, str):
+            key = key.encode()
+        if not key:
+            raise ValueError("CodeAllocator needs a non-empty secret key")
+        self._round_hash = hashlib.blake2b(key=hashlib.sha256(key).digest(), digest_size=16)
+        return self._round_hash
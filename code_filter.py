@@ -0,0 +1,188 @@
+import os
+import math
+import time
+import hashlib
+import logging
+import threading
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings.
+
+    Sized for ``capacity`` items at ``error_rate`` false positives; it never
+    gives false negatives. Bit positions come from double hashing one
+    128-bit BLAKE2b digest.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+        self.size = max(8, int(math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.hashes = max(1, int(round(self.size / self.capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def add(self, item):
+        """Add ``item``; ``count`` only grows when it was not already present."""
+        bits = self.bits
+        new = False
+        for position in self._positions(item):
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                new = True
+        if new:
+            self.count += 1
+
+    def __contains__(self, item):
+        bits = self.bits
+        for position in self._positions(item):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class ShortCodeFilter:
+    """Per-worker Bloom filter over every short code in the database.
+
+    ``loader(after_id)`` yields ``(id, short_code)`` rows with
+    ``id > after_id`` in id order. ``sizer()`` returns an upper bound on the
+    number of rows, such as the highest id. The filter is built in a
+    background thread and rebuilt every ``rebuild_interval`` seconds, or
+    early once it holds more codes than it was sized for. Codes created by
+    this worker are added directly. Deleted codes stay in the filter (a
+    Bloom filter cannot remove them) until the next rebuild.
+
+    The filter is a hint, never the final word on a code: codes created by
+    other workers since the last sync, or committed below the highest id
+    seen (a long batch or import), are missing until a sync or rebuild
+    picks them up. Asking about a missing code while the last sync is over
+    ``max_staleness`` seconds old syncs first, reading only rows past the
+    highest id seen.
+
+    The first build waits ``start_delay`` seconds, so a freshly started
+    worker serves its first requests without scanning the whole table.
+    """
+
+    def __init__(self, loader, sizer, error_rate=0.01, max_staleness=1.0, rebuild_interval=3600,
+                 min_capacity=100000, start_delay=0):
+        self.loader = loader
+        self.sizer = sizer
+        self.error_rate = error_rate
+        self.max_staleness = max_staleness
+        self.rebuild_interval = rebuild_interval
+        self.min_capacity = min_capacity
+        self.start_delay = start_delay
+        self._filter = None
+        self._watermark = 0
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._rebuild_due = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.misses = 0
+        self.rebuilds = 0
+
+    def start(self):
+        """Build the filter in the background; until then it answers nothing."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return self
+            self._pid = os.getpid()
+            self._filter = None
+            self._thread = threading.Thread(target=self._run, name='short-code-filter', daemon=True)
+            self._thread.start()
+        return self
+
+    def add(self, short_code):
+        bloom = self._filter
+        if bloom is not None:
+            bloom.add(short_code)
+            if bloom.count > bloom.capacity:
+                self._rebuild_due.set()
+
+    def probably_contains(self, short_code):
+        """True if the filter is built and ``short_code`` may exist."""
+        bloom = self._filter
+        return bloom is not None and short_code in bloom
+
+    def stale(self):
+        """True if the next negative answer would first have to catch up with the database."""
+        return time.monotonic() - self._synced_at > self.max_staleness
+
+    def probably_absent(self, short_code):
+        """True if the filter is built and has not seen ``short_code``, even after syncing."""
+        if self._pid != os.getpid():
+            self.start()
+        bloom = self._filter
+        if bloom is None or short_code in bloom:
+            return False
+        if self.stale() and self._sync_lock.acquire(blocking=False):
+            # Catch up inline, unless another thread is already doing it.
+            try:
+                self._sync()
+            finally:
+                self._sync_lock.release()
+            if short_code in self._filter:
+                return False
+        self.misses += 1
+        return True
+
+    def rebuild(self):
+        started = time.monotonic()
+        watermark = 0
+        bloom = BloomFilter(max(self.min_capacity, (self.sizer() or 0) * 2), self.error_rate)
+        for url_id, short_code in self.loader(0):
+            bloom.add(short_code)
+            watermark = max(watermark, url_id)
+        with self._sync_lock:
+            self._filter = bloom
+            self._watermark = watermark
+            self._sync()
+        self.rebuilds += 1
+        logging.info(f"Short code filter built with {bloom.count} codes in {time.monotonic() - started:.1f}s "
+                     f"({len(bloom.bits) / 1024 / 1024:.1f} MiB)")
+
+    def _sync(self):
+        started = time.monotonic()
+        bloom = self._filter
+        watermark = self._watermark
+        for url_id, short_code in self.loader(watermark):
+            bloom.add(short_code)
+            watermark = max(watermark, url_id)
+        self._watermark = watermark
+        self._synced_at = started
+        if bloom.count > bloom.capacity:
+            self._rebuild_due.set()
+
+    def _run(self):
+        if self.start_delay > 0:
+            time.sleep(self.start_delay)
+        while True:
+            try:
+                self.rebuild()
+            except Exception as e:
+                logging.error(f"Short code filter rebuild failed: {str(e)}")
+                time.sleep(min(60, self.rebuild_interval))
+                continue
+            self._rebuild_due.wait(self.rebuild_interval)
+            self._rebuild_due.clear()
+
+    def stats(self):
+        bloom = self._filter
+        return {
+            'ready': bloom is not None,
+            'codes': bloom.count if bloom else 0,
+            'capacity': bloom.capacity if bloom else 0,
+            'bytes': len(bloom.bits) if bloom else 0,
+            'misses': self.misses,
+            'rebuilds': self.rebuilds
+        }
@@ -1,9 +1,98 @@
 import os
+import logging
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import ArgumentError
 
-def get_database_url():
-    database_url = os.environ.get('DATABASE_URL')
+def normalize_database_url(database_url):
     if database_url and database_url.startswith("postgres://"):
         database_url = database_url.replace("postgres://", "postgresql://", 1)
+    return database_url
+
+def mask_database_url(database_url):
+    """``database_url`` with the password hidden, for logs."""
+    if not database_url:
+        return database_url
+    try:
+        return make_url(database_url).render_as_string(hide_password=True)
+    except ArgumentError:
+        return '<unparseable>'
+
+def get_database_url():
+    database_url = normalize_database_url(os.environ.get('DATABASE_URL'))
     
-    print(f"Using database URL: {database_url}")
+    logging.info(f"Using database URL: {mask_database_url(database_url)}")
     return database_url
+
+def get_replica_urls():
+    """Read replica URLs from the comma separated DATABASE_REPLICA_URLS."""
+    return [normalize_database_url(url.strip()) for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+
+def get_int_setting(name, default):
+    value = os.environ.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logging.warning(f"Invalid integer for {name}: {value}, using {default}")
+        return default
+
+def get_float_setting(name, default):
+    value = os.environ.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        logging.warning(f"Invalid number for {name}: {value}, using {default}")
+        return default
+
+def get_engine_options(database_url, debug=False):
+    """Connection pool settings for ``database_url``.
+    
+    Pool sizing and libpq connect arguments only apply to server databases;
+    SQLite gets SQLAlchemy's defaults so local runs and benchmarks work.
+    """
+    if database_url and database_url.startswith('sqlite'):
+        return {'connect_args': {'check_same_thread': False}}
+    return {
+        'pool_size': get_int_setting('DB_POOL_SIZE', 10),
+        'pool_recycle': 300,
+        'pool_pre_ping': True,
+        'max_overflow': get_int_setting('DB_MAX_OVERFLOW', 20),
+        'connect_args': {
+            'connect_timeout': 10,
+            'application_name': 'url_shortener',
+        },
+        'pool_timeout': 30,
+        'echo_pool': debug
+    }
+
+def get_async_database_url(database_url):
+    """The async driver equivalent of ``database_url`` (asyncpg or aiosqlite)."""
+    database_url = normalize_database_url(database_url)
+    if not database_url:
+        return database_url
+    scheme, sep, rest = database_url.partition('://')
+    if scheme in ('postgresql', 'postgresql+psycopg2'):
+        # asyncpg takes ``ssl`` where libpq takes ``sslmode``.
+        return 'postgresql+asyncpg://' + rest.replace('sslmode=', 'ssl=')
+    if scheme == 'sqlite':
+        return 'sqlite+aiosqlite://' + rest
+    return database_url
+
+def get_async_engine_options(database_url):
+    """Pool settings for the async engine; mirrors ``get_engine_options``."""
+    if database_url and database_url.startswith('sqlite'):
+        return {}
+    return {
+        'pool_size': get_int_setting('ASYNC_DB_POOL_SIZE', 20),
+        'pool_recycle': 300,
+        'pool_pre_ping': True,
+        'max_overflow': get_int_setting('ASYNC_DB_MAX_OVERFLOW', 20),
+        'connect_args': {
+            'timeout': 10,
+            'server_settings': {'application_name': 'url_shortener_asgi'},
+        },
+        'pool_timeout': 30
+    }
@@ -1,7 +1,6 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, BooleanField, SubmitField
 from wtforms.validators import DataRequired, Length, Email, EqualTo, ValidationError
-from app import User  # Import User model
 
 class LoginForm(FlaskForm):
     """Form for user login."""
@@ -20,12 +19,14 @@ class RegistrationForm(FlaskForm):
 
     def validate_username(self, username):
         """Check if username is already taken."""
+        from app import User
         user = User.query.filter_by(username=username.data).first()
         if user:
             raise ValidationError('That username is already taken. Please choose a different one.')
 
     def validate_email(self, email):
         """Check if email is already registered."""
+        from app import User
         user = User.query.filter_by(email=email.data).first()
         if user:
             raise ValidationError('That email is already registered. Please use a different one.')
\ No newline at end of file
@@ -0,0 +1,10 @@
+def on_starting(server):
+    # Metrics snapshots of a previous run would otherwise be merged into this one.
+    from metrics import clear_snapshots
+    clear_snapshots()
+
+def worker_exit(server, worker):
+    # Write out buffered visit counters before the worker process goes away.
+    from app import visit_buffer, metrics
+    visit_buffer.stop()
+    metrics.write_snapshot()
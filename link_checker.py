@@ -0,0 +1,240 @@
+import ssl
+import sys
+import socket
+import math
+import time
+import asyncio
+import logging
+import argparse
+import ipaddress
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+from sqlalchemy import bindparam
+
+USER_AGENT = 'url-shortener-health-check/1.0'
+
+
+class BlockedAddress(ValueError):
+    """The link resolves to an address the checker must not connect to."""
+
+
+def is_public_address(address):
+    ip = ipaddress.ip_address(address)
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+class CheckResult:
+    __slots__ = ('url_id', 'status_code', 'response_time', 'checked_at', 'error')
+
+    def __init__(self, url_id, status_code, response_time, checked_at, error=None):
+        self.url_id = url_id
+        self.status_code = status_code
+        self.response_time = response_time
+        self.checked_at = checked_at
+        self.error = error
+
+
+class LinkChecker:
+    """Checks link targets concurrently on one asyncio event loop.
+
+    Concurrency is bounded globally and per host. Each link gets a HEAD
+    request, retried as GET when the server rejects HEAD. Only the status
+    line and headers are read, so large bodies are never downloaded.
+
+    Links are user input, so each host is resolved first and the checker
+    connects only to the resolved address; hosts resolving to loopback,
+    private, link-local or reserved addresses are skipped unless
+    ``allow_private`` is set (for local testing).
+    """
+
+    def __init__(self, concurrency=200, per_host=4, timeout=10.0, allow_private=False):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.allow_private = allow_private
+        self._global = None
+        self._hosts = {}
+        self._ssl = ssl.create_default_context()
+
+    async def check_many(self, links):
+        """Check ``(url_id, url)`` pairs and return their CheckResults."""
+        self._global = asyncio.Semaphore(self.concurrency)
+        self._hosts = {}
+        return await asyncio.gather(*(self.check(url_id, url) for url_id, url in links))
+
+    async def check(self, url_id, url):
+        if self._global is None:
+            self._global = asyncio.Semaphore(self.concurrency)
+        host = (urlsplit(url).hostname or '').lower()
+        host_limit = self._hosts.get(host)
+        if host_limit is None:
+            host_limit = self._hosts[host] = asyncio.Semaphore(self.per_host)
+
+        # Wait for the host slot before taking a global one, so checks queued
+        # behind a busy host do not hold global slots other hosts could use.
+        async with host_limit, self._global:
+            started = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(self.request('HEAD', url), self.timeout)
+                if status in (403, 405, 501):
+                    status = await asyncio.wait_for(self.request('GET', url), self.timeout)
+                error = None
+            except BlockedAddress as e:
+                # Nothing about the target is recorded, not even the timing.
+                return CheckResult(url_id, None, None, datetime.utcnow(), f"BlockedAddress: {e}")
+            except Exception as e:
+                status = None
+                error = f"{type(e).__name__}: {e}"
+            elapsed = (time.perf_counter() - started) * 1000
+            return CheckResult(url_id, status, round(elapsed, 2), datetime.utcnow(), error)
+
+    async def resolve(self, host, port):
+        """The address to connect to for ``host``; raises BlockedAddress if it is not public."""
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addresses = [info[4][0] for info in infos]
+        if not addresses:
+            raise OSError(f"{host} did not resolve")
+        if not self.allow_private:
+            # Every address must be public, or a host could list a private one
+            # next to a public one and win the connection race.
+            blocked = [address for address in addresses if not is_public_address(address)]
+            if blocked:
+                raise BlockedAddress(f"{host} resolves to {blocked[0]}")
+        return addresses[0]
+
+    async def request(self, method, url):
+        """Send one request and return the response status code."""
+        parts = urlsplit(url)
+        secure = parts.scheme == 'https'
+        port = parts.port or (443 if secure else 80)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        host_header = parts.hostname if parts.port is None else f"{parts.hostname}:{parts.port}"
+
+        address = await self.resolve(parts.hostname, port)
+        reader, writer = await asyncio.open_connection(
+            address, port,
+            ssl=self._ssl if secure else None,
+            server_hostname=parts.hostname if secure else None
+        )
+        try:
+            writer.write((
+                f"{method} {path} HTTP/1.1\r\n"
+                f"Host: {host_header}\r\n"
+                f"User-Agent: {USER_AGENT}\r\n"
+                "Accept: */*\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode('latin-1'))
+            await writer.drain()
+            status_line = await reader.readline()
+            fields = status_line.decode('latin-1').split()
+            if len(fields) < 2 or not fields[0].startswith('HTTP/'):
+                raise ValueError(f"Malformed status line: {status_line[:80]!r}")
+            return int(fields[1])
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+
+def priority(visits, last_checked, now):
+    """Higher is checked first: never-checked links, then stale, busy links."""
+    if last_checked is None:
+        return float('inf')
+    age_hours = (now - last_checked).total_seconds() / 3600
+    return age_hours * math.log2(2 + (visits or 0))
+
+
+def select_links(db, URL, batch_size, min_age, candidate_factor=4):
+    """Pick the next batch by staleness and traffic from a bounded candidate window.
+
+    Never-checked links are taken first, then the oldest checks; both reads
+    walk ix_urls_last_checked instead of sorting the table.
+    """
+    now = datetime.utcnow()
+    cutoff = now - min_age
+    limit = batch_size * candidate_factor
+    columns = (URL.id, URL.original_url, URL.visits, URL.last_checked)
+    candidates = db.session.query(*columns).filter(URL.last_checked.is_(None)).limit(limit).all()
+    if len(candidates) < limit:
+        candidates += db.session.query(*columns).filter(URL.last_checked < cutoff).order_by(
+            URL.last_checked
+        ).limit(limit - len(candidates)).all()
+    candidates.sort(key=lambda row: priority(row.visits, row.last_checked, now), reverse=True)
+    return [(row.id, row.original_url) for row in candidates[:batch_size]]
+
+
+def write_results(db, URL, results):
+    # is_active records whether the target answered at all; the status code
+    # tells a healthy link from an error page.
+    table = URL.__table__
+    stmt = table.update().where(table.c.id == bindparam('b_id')).values(
+        last_checked=bindparam('b_checked'),
+        is_active=bindparam('b_active'),
+        status_code=bindparam('b_status'),
+        response_time=bindparam('b_time')
+    )
+    db.session.execute(stmt, [{
+        'b_id': result.url_id,
+        'b_checked': result.checked_at,
+        'b_active': result.status_code is not None,
+        'b_status': result.status_code,
+        'b_time': result.response_time
+    } for result in results])
+    db.session.commit()
+
+
+def run(batch_size=1000, min_age_minutes=60, concurrency=200, per_host=4, timeout=10.0, once=False, idle_sleep=30,
+        allow_private=False):
+    """Check links in batches until nothing is stale (``once``) or forever."""
+    from app import create_app, db, URL
+    app = create_app()
+
+    checker = LinkChecker(concurrency=concurrency, per_host=per_host, timeout=timeout, allow_private=allow_private)
+    min_age = timedelta(minutes=min_age_minutes)
+    total = 0
+    with app.app_context():
+        while True:
+            links = select_links(db, URL, batch_size, min_age)
+            if not links:
+                if once:
+                    break
+                time.sleep(idle_sleep)
+                continue
+
+            started = time.perf_counter()
+            results = asyncio.run(checker.check_many(links))
+            write_results(db, URL, results)
+            total += len(results)
+            elapsed = time.perf_counter() - started
+            failures = sum(1 for result in results if result.status_code is None)
+            logging.info(f"Checked {len(results)} links in {elapsed:.1f}s "
+                         f"({len(results) / elapsed:.0f}/s, {failures} unreachable, {total} total)")
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check the health of shortened link targets.')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--min-age', type=int, default=60, help='Minutes before a link is checked again')
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--per-host', type=int, default=4)
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('--once', action='store_true', help='Exit when no stale links are left')
+    parser.add_argument('--allow-private', action='store_true',
+                        help='Also check links to loopback and private addresses (local testing only)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    run(args.batch_size, args.min_age, args.concurrency, args.per_host, args.timeout, args.once,
+        allow_private=args.allow_private)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from config import get_int_setting
+
+# Loggers for the request hot paths; sampling rates are set per category.
+CATEGORY_PREFIX = 'url_shortener.'
+
+_handler = None
+
+# Attributes every LogRecord has; anything else was passed with ``extra=``.
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def get_logger(category):
+    return logging.getLogger(CATEGORY_PREFIX + category)
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, including any ``extra=`` fields."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process,
+            'thread': record.threadName
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a ``rate`` fraction of records below WARNING; warnings and errors always pass."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+class BackgroundQueueHandler(QueueHandler):
+    """Hands records to a QueueListener thread that formats and writes them.
+
+    Records are queued as they are, so message interpolation and formatting
+    happen off the request thread. The queue is bounded: when the output
+    stalls, new records are dropped and counted instead of blocking. The
+    listener is restarted in forked workers, which do not inherit threads.
+    Since arguments are interpolated later, pass plain values, not ORM objects.
+    """
+
+    def __init__(self, handlers, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.handlers = handlers
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            if self._listener is not None and self._pid is not None:
+                # Inherited from the parent process; its thread does not exist here.
+                self.queue = queue.Queue(self.maxsize)
+            self._listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def stop(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+            self._pid = None
+
+
+def parse_sampling(value):
+    """Parse ``"redirect=0.01,shorten=0.5"`` into ``{'redirect': 0.01, 'shorten': 0.5}``."""
+    rates = {}
+    for item in (value or '').split(','):
+        category, _, rate = item.partition('=')
+        if not category.strip():
+            continue
+        try:
+            rates[category.strip()] = float(rate)
+        except ValueError:
+            logging.warning(f"Invalid LOG_SAMPLING rate for {category}: {rate}")
+    return rates
+
+
+def configure_logging():
+    """Set up root logging from LOG_LEVEL, LOG_FORMAT, LOG_FILE and LOG_SAMPLING."""
+    global _handler
+    if _handler is not None:
+        return _handler
+    root = logging.getLogger()
+
+    level = getattr(logging, os.environ.get('LOG_LEVEL', 'INFO').upper(), logging.INFO)
+    log_file = os.environ.get('LOG_FILE')
+    output = logging.FileHandler(log_file) if log_file else logging.StreamHandler(sys.stderr)
+    if os.environ.get('LOG_FORMAT', 'text').lower() == 'json':
+        output.setFormatter(JSONFormatter())
+    else:
+        output.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s'))
+
+    handler = BackgroundQueueHandler([output], maxsize=get_int_setting('LOG_QUEUE_SIZE', 10000))
+    root.handlers = [handler]
+    root.setLevel(level)
+    _handler = handler
+    atexit.register(handler.stop)
+
+    for category, rate in parse_sampling(os.environ.get('LOG_SAMPLING')).items():
+        get_logger(category).addFilter(SamplingFilter(rate))
+    return handler
@@ -0,0 +1,314 @@
+import os
+import json
+import time
+import atexit
+import logging
+import tempfile
+import threading
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help). Metrics not listed here are exported as untyped.
+METRICS = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by route, method and status'),
+    'redirect_outcomes_total': ('counter', 'Short code redirects by outcome'),
+    'db_queries_total': ('counter', 'SQL statements executed, by statement type'),
+    'db_query_duration_seconds': ('histogram', 'SQL statement execution time, by statement type'),
+    'db_pool_checkout_wait_seconds': ('histogram', 'Time spent waiting for a pooled connection'),
+    'db_pool_checkout_timeouts_total': ('counter', 'Connection checkouts that hit pool_timeout'),
+    'db_pool_size': ('gauge', 'Configured pool_size per worker'),
+    'db_pool_max_overflow': ('gauge', 'Configured max_overflow per worker'),
+    'db_pool_checked_out': ('gauge', 'Connections currently checked out'),
+    'db_pool_overflow': ('gauge', 'Connections open beyond pool_size'),
+    'cache_hits_total': ('counter', 'Cache hits by cache'),
+    'cache_misses_total': ('counter', 'Cache misses by cache'),
+    'cache_evictions_total': ('counter', 'Entries evicted by cache'),
+    'cache_entries': ('gauge', 'Entries currently held by cache'),
+    'visit_buffer_pending': ('gauge', 'Visits waiting to be flushed'),
+    'visit_buffer_flushes_total': ('counter', 'Visit buffer flushes'),
+    'visit_buffer_failed_flushes_total': ('counter', 'Visit buffer flushes that failed'),
+    'code_filter_codes': ('gauge', 'Short codes in the negative lookup filter'),
+    'code_filter_bytes': ('gauge', 'Size of the negative lookup filter'),
+    'code_filter_short_circuits_total': ('counter', 'Redirects answered 404 by the filter without a query'),
+    'rate_limited_total': ('counter', 'Requests rejected with 429, by scope'),
+    'requests_shed_total': ('counter', 'Requests rejected with 503 under pool pressure, by scope'),
+    'db_pool_pressure_seconds': ('gauge', 'Decayed average connection checkout wait used for load shedding'),
+    'log_records_dropped_total': ('counter', 'Log records dropped because the log queue was full'),
+    'worker_processes': ('gauge', 'Live worker processes reporting metrics'),
+}
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+def default_directory():
+    return os.environ.get('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'url_shortener_metrics')
+
+
+def clear_snapshots(directory=None):
+    """Remove snapshots left by a previous server run."""
+    directory = directory or default_directory()
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        if name.endswith('.json'):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+class Metrics:
+    """Process-local counters, gauges and histograms, merged across workers on read.
+
+    Every worker periodically writes a JSON snapshot of its values to
+    ``directory``; ``render`` sums all snapshots into Prometheus text format,
+    so whichever worker serves /metrics reports the whole server. Snapshots
+    of exited workers still count towards counters and histograms, but their
+    gauges are dropped. Collectors registered with ``add_collector`` are
+    called at snapshot time to sample gauges and stats from other objects.
+    """
+
+    def __init__(self, directory=None, flush_interval=5.0):
+        self.directory = directory or default_directory()
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._collectors = []
+        self._pid = None
+        self._reset()
+        atexit.register(self.write_snapshot)
+
+    def _reset(self):
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._last_write = time.monotonic()
+        self._pid = os.getpid()
+
+    def _check_pid(self):
+        # Values inherited from a preloading parent must not be reported twice.
+        if self._pid != os.getpid():
+            self._reset()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _key(labels))
+        with self._lock:
+            self._check_pid()
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._check_pid()
+            self._gauges[(name, _key(labels))] = value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, _key(labels))
+        with self._lock:
+            self._check_pid()
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def add_collector(self, collector):
+        """Register ``collector(metrics)``, called before every snapshot."""
+        self._collectors.append(collector)
+
+    def maybe_write_snapshot(self):
+        if time.monotonic() - self._last_write >= self.flush_interval:
+            self.write_snapshot()
+
+    def write_snapshot(self):
+        for collector in self._collectors:
+            try:
+                collector(self)
+            except Exception as e:
+                logging.warning(f"Metrics collector failed: {str(e)}")
+        with self._lock:
+            self._check_pid()
+            self._last_write = time.monotonic()
+            snapshot = {
+                'pid': self._pid,
+                'counters': [[name, labels, value] for (name, labels), value in self._counters.items()],
+                'gauges': [[name, labels, value] for (name, labels), value in self._gauges.items()],
+                'histograms': [[name, labels, list(h.buckets), h.counts, h.sum, h.count]
+                               for (name, labels), h in self._histograms.items()]
+            }
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.snapshot-')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, os.path.join(self.directory, f"{snapshot['pid']}.json"))
+        except OSError as e:
+            logging.warning(f"Could not write metrics snapshot: {str(e)}")
+
+    def load_snapshots(self):
+        try:
+            names = [name for name in os.listdir(self.directory) if name.endswith('.json')]
+        except OSError:
+            return []
+        snapshots = []
+        for name in names:
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self):
+        """Prometheus text exposition of all workers' latest snapshots."""
+        self.write_snapshot()
+        counters, gauges, histograms = {}, {}, {}
+        live = 0
+        for snapshot in self.load_snapshots():
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, buckets, counts, total, count in snapshot['histograms']:
+                key = (name, tuple(map(tuple, labels)))
+                merged = histograms.get(key)
+                if merged is None:
+                    merged = histograms[key] = Histogram(tuple(buckets))
+                merged.counts = [a + b for a, b in zip(merged.counts, counts)]
+                merged.sum += total
+                merged.count += count
+            if _process_alive(snapshot['pid']):
+                live += 1
+                for name, labels, value in snapshot['gauges']:
+                    key = (name, tuple(map(tuple, labels)))
+                    gauges[key] = gauges.get(key, 0) + value
+        gauges[('worker_processes', ())] = live
+
+        lines = []
+        samples = {}
+        for (name, labels), value in counters.items():
+            samples.setdefault(name, []).append(f"{name}{_labels(labels)} {_number(value)}")
+        for (name, labels), value in gauges.items():
+            samples.setdefault(name, []).append(f"{name}{_labels(labels)} {_number(value)}")
+        for (name, labels), histogram in histograms.items():
+            rows = samples.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                rows.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {cumulative}")
+            rows.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+            rows.append(f"{name}_sum{_labels(labels)} {_number(histogram.sum)}")
+            rows.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        for name in sorted(samples):
+            kind, help_text = METRICS.get(name, ('untyped', name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(sorted(samples[name]) if kind != 'histogram' else samples[name])
+        return '\n'.join(lines) + '\n'
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = ('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for k, v in labels)
+    return '{' + ','.join(escaped) + '}'
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return str(value)
+
+
+def statement_type(statement):
+    word = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else ''
+    return word if word in ('select', 'insert', 'update', 'delete', 'with') else 'other'
+
+
+def instrument_engine(engine, metrics):
+    """Count and time every statement executed through ``engine``."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        kind = statement_type(statement)
+        metrics.inc('db_queries_total', statement=kind)
+        metrics.observe('db_query_duration_seconds', time.perf_counter() - started, statement=kind)
+
+    @event.listens_for(engine, 'handle_error')
+    def _error(context):
+        if context.connection is not None:
+            stack = context.connection.info.get('query_started')
+            if stack:
+                stack.pop()
+
+
+def timed_pool_class(metrics, on_wait=None):
+    """A QueuePool subclass that reports how long each checkout waited for a connection.
+
+    ``on_wait(seconds)`` is also called with every wait, e.g. to drive load shedding.
+    """
+
+    class TimedQueuePool(QueuePool):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            except PoolTimeoutError:
+                metrics.inc('db_pool_checkout_timeouts_total')
+                raise
+            finally:
+                waited = time.perf_counter() - started
+                metrics.observe('db_pool_checkout_wait_seconds', waited)
+                if on_wait is not None:
+                    on_wait(waited)
+
+    return TimedQueuePool
+
+
+def pool_collector(engine):
+    def collect(metrics):
+        pool = engine.pool
+        if not isinstance(pool, QueuePool):
+            return
+        metrics.set('db_pool_size', pool.size())
+        metrics.set('db_pool_max_overflow', pool._max_overflow)
+        metrics.set('db_pool_checked_out', pool.checkedout())
+        metrics.set('db_pool_overflow', max(pool.overflow(), 0))
+    return collect
@@ -1,79 +1,122 @@
-import os
+import sys
 import logging
-from app import app, db
+import argparse
+from app import create_app, db, ClickEvent
+from click_log import ensure_partitions, is_partitioned
+from migrations import AddColumn, Backfill, CreateIndex, Migration, MigrationRunner, Python
+from url_utils import url_digest
 
 logging.basicConfig(level=logging.INFO)
 
-def migrate_database():
-    """Migrate database schema to match current model definitions."""
+def create_tables(engine):
+    # Only creates missing tables, with their indexes; existing ones are left alone.
+    if is_partitioned(engine):
+        ClickEvent.__table__.dialect_options['postgresql']['partition_by'] = 'RANGE (clicked_at)'
+    db.metadata.create_all(engine)
+
+def fetch_missing_url_hashes(conn, after_id, limit):
+    return conn.execute(db.text(
+        "SELECT id, original_url FROM urls WHERE id > :after_id AND url_hash IS NULL ORDER BY id LIMIT :limit"
+    ), {'after_id': after_id, 'limit': limit}).fetchall()
+
+def write_url_hashes(conn, rows):
+    conn.execute(db.text("UPDATE urls SET url_hash = :url_hash WHERE id = :id"),
+                 [{'id': row.id, 'url_hash': url_digest(row.original_url)} for row in rows])
+
+def count_missing_url_hashes(conn):
+    return conn.execute(db.text("SELECT COUNT(*) FROM urls WHERE url_hash IS NULL")).scalar()
+
+# Append new migrations with the next version; never edit or renumber applied ones.
+MIGRATIONS = [
+    Migration(1, 'Create tables', Python('create missing tables', create_tables)),
+    Migration(
+        2, 'Add urls columns of older releases',
+        AddColumn('urls', 'expires_at', 'TIMESTAMP'),
+        AddColumn('urls', 'is_custom', 'BOOLEAN DEFAULT false'),
+        AddColumn('urls', 'last_checked', 'TIMESTAMP'),
+        AddColumn('urls', 'is_active', 'BOOLEAN DEFAULT true'),
+        AddColumn('urls', 'status_code', 'INTEGER'),
+        AddColumn('urls', 'response_time', 'FLOAT'),
+        AddColumn('urls', 'expiration_type', "VARCHAR(20) DEFAULT 'never'"),
+        AddColumn('urls', 'max_visits', 'INTEGER'),
+        AddColumn('urls', 'user_id', 'INTEGER REFERENCES users(id) ON DELETE SET NULL'),
+        AddColumn('urls', 'referer', 'VARCHAR(2048)'),
+        AddColumn('urls', 'user_agent', 'VARCHAR(512)'),
+        AddColumn('urls', 'ip_address', 'VARCHAR(45)'),
+        AddColumn('urls', 'last_visited', 'TIMESTAMP'),
+        AddColumn('urls', 'url_hash', 'VARCHAR(64)')
+    ),
+    Migration(3, 'Index urls by url_hash', CreateIndex('ix_urls_url_hash', 'urls', ['url_hash'])),
+    Migration(4, 'Index urls by user and creation time',
+              CreateIndex('ix_urls_user_created', 'urls', ['user_id', 'created_at', 'id'])),
+    Migration(5, 'Backfill urls.url_hash',
+              Backfill('url_hash of rows created before the column', fetch_missing_url_hashes,
+                       write_url_hashes, count_missing_url_hashes)),
+    Migration(6, 'Index urls by creation time for the recent list',
+              CreateIndex('ix_urls_created', 'urls', ['created_at', 'id'])),
+    Migration(7, 'Create click rollup table', Python('create missing tables', create_tables)),
+    Migration(8, 'Create app secrets table', Python('create missing tables', create_tables)),
+    Migration(9, 'Index urls by last check time for the link checker',
+              CreateIndex('ix_urls_last_checked', 'urls', ['last_checked'])),
+]
+
+def migrate_database(target=None, batch_size=1000, pause=0.0):
+    """Apply pending migrations; returns False if one failed."""
     try:
+        app = create_app()
         with app.app_context():
-            db.create_all()
-            
-            engine = db.engine
-            inspector = db.inspect(engine)
-            
-            columns = inspector.get_columns('urls')
-            column_names = [col['name'] for col in columns]
-            
-            logging.info(f"Existing columns: {column_names}")
-            
-            missing_columns = []
-            
-            if 'expires_at' not in column_names:
-                missing_columns.append("ALTER TABLE urls ADD COLUMN expires_at TIMESTAMP;")
-                
-            if 'is_custom' not in column_names:
-                missing_columns.append("ALTER TABLE urls ADD COLUMN is_custom BOOLEAN DEFAULT false;")
-                
-            if 'last_checked' not in column_names:
-                missing_columns.append("ALTER TABLE urls ADD COLUMN last_checked TIMESTAMP;")
-                
-            if 'is_active' not in column_names:
-                missing_columns.append("ALTER TABLE urls ADD COLUMN is_active BOOLEAN DEFAULT true;")
-                
-            if 'status_code' not in column_names:
-                missing_columns.append("ALTER TABLE urls ADD COLUMN status_code INTEGER;")
-                
-            if 'response_time' not in column_names:
-                missing_columns.append("ALTER TABLE urls ADD COLUMN response_time FLOAT;")
-                
-            if 'expiration_type' not in column_names:
-                missing_columns.append("ALTER TABLE urls ADD COLUMN expiration_type VARCHAR(20) DEFAULT 'never';")
-                
-            if 'max_visits' not in column_names:
-                missing_columns.append("ALTER TABLE urls ADD COLUMN max_visits INTEGER;")
-                
-            if 'user_id' not in column_names:
-                missing_columns.append("ALTER TABLE urls ADD COLUMN user_id INTEGER REFERENCES users(id) ON DELETE SET NULL;")
-                
-            if 'referer' not in column_names:
-                missing_columns.append("ALTER TABLE urls ADD COLUMN referer VARCHAR(2048);")
-                
-            if 'user_agent' not in column_names:
-                missing_columns.append("ALTER TABLE urls ADD COLUMN user_agent VARCHAR(512);")
-                
-            if 'ip_address' not in column_names:
-                missing_columns.append("ALTER TABLE urls ADD COLUMN ip_address VARCHAR(45);")
-                
-            if 'last_visited' not in column_names:
-                missing_columns.append("ALTER TABLE urls ADD COLUMN last_visited TIMESTAMP;")
-            
-            if missing_columns:
-                logging.info("Applying database migrations...")
-                with engine.connect() as conn:
-                    for statement in missing_columns:
-                        logging.info(f"Executing: {statement}")
-                        conn.execute(db.text(statement))
-                        conn.commit()
-                logging.info("Database migration completed successfully.")
+            runner = MigrationRunner(db.engine, MIGRATIONS, batch_size=batch_size, pause=pause)
+            applied = runner.run(target)
+            ensure_partitions(db.engine)
+            if applied:
+                logging.info(f"Applied migrations: {applied}")
             else:
                 logging.info("No migrations needed. Database schema is up to date.")
-                
             return True
     except Exception as e:
         logging.error(f"Migration error: {str(e)}")
         return False
 
+def show_plan(target=None, batch_size=1000):
+    with create_app().app_context():
+        runner = MigrationRunner(db.engine, MIGRATIONS, batch_size=batch_size)
+        plan = runner.plan(target)
+        if not plan:
+            print("No migrations needed.")
+        for migration, statements in plan:
+            print(f"{migration.version}: {migration.name}")
+            for statement in statements or ['-- nothing to do']:
+                print(f"    {statement}")
+
+def show_status():
+    with create_app().app_context():
+        applied = MigrationRunner(db.engine, MIGRATIONS).applied()
+    for migration in MIGRATIONS:
+        row = applied.get(migration.version)
+        state = row.status if row else 'pending'
+        detail = ''
+        if row is not None and row.finished_at:
+            detail = f" at {row.finished_at.isoformat(timespec='seconds')} ({row.duration:.1f}s)"
+        elif row is not None and row.checkpoint:
+            detail = f" (checkpoint {row.checkpoint})"
+        print(f"{migration.version:4} {state:8} {migration.name}{detail}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Apply versioned database migrations.')
+    parser.add_argument('--to', type=int, dest='target', help='Stop after this version')
+    parser.add_argument('--dry-run', action='store_true', help='Print what would run without changing anything')
+    parser.add_argument('--status', action='store_true', help='List migrations and whether they are applied')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Rows per backfill transaction')
+    parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between backfill batches')
+    args = parser.parse_args(argv)
+
+    if args.status:
+        show_status()
+        return 0
+    if args.dry_run:
+        show_plan(args.target, args.batch_size)
+        return 0
+    return 0 if migrate_database(args.target, args.batch_size, args.pause) else 1
+
 if __name__ == "__main__":
-    migrate_database()
+    sys.exit(main())
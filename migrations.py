@@ -0,0 +1,322 @@
+import time
+import logging
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Float, Integer, MetaData, String, Table, inspect, text
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+
+# pg_advisory_lock key held while migrations run, so two deploys never migrate at once.
+MIGRATION_LOCK_KEY = 0x6d696772
+
+metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', metadata,
+    Column('version', Integer, primary_key=True, autoincrement=False),
+    Column('name', String(200), nullable=False),
+    Column('status', String(20), nullable=False),
+    # Progress of an interrupted backfill, e.g. the last id written.
+    Column('checkpoint', String(200), nullable=True),
+    Column('started_at', DateTime, nullable=False),
+    Column('finished_at', DateTime, nullable=True),
+    Column('duration', Float, nullable=True)
+)
+
+
+class Migration:
+    """A numbered list of steps. Every step must be safe to run again, since
+    a migration interrupted halfway is resumed by running all of its steps."""
+
+    def __init__(self, version, name, *steps):
+        self.version = version
+        self.name = name
+        self.steps = steps
+
+
+class Step:
+    def describe(self, runner):
+        """Human readable plan, for dry runs."""
+        raise NotImplementedError
+
+    def apply(self, runner, migration):
+        raise NotImplementedError
+
+
+class SQL(Step):
+    """Statements run in one transaction under a short lock_timeout.
+
+    On PostgreSQL, DDL that cannot get its lock within ``lock_timeout`` is
+    retried instead of queueing behind a long transaction while every
+    later query on the table queues behind it.
+    """
+
+    def __init__(self, *statements, postgresql_only=False):
+        self.statements = statements
+        self.postgresql_only = postgresql_only
+
+    def skipped(self, runner):
+        return self.postgresql_only and runner.dialect != 'postgresql'
+
+    def describe(self, runner):
+        return [] if self.skipped(runner) else list(self.statements)
+
+    def apply(self, runner, migration):
+        if not self.skipped(runner):
+            runner.run_ddl(self.statements)
+
+
+class AddColumn(Step):
+    """``ALTER TABLE ... ADD COLUMN`` if the column is missing.
+
+    Keep new columns nullable and without volatile defaults, so PostgreSQL
+    only changes the catalog instead of rewriting the table.
+    """
+
+    def __init__(self, table, column, definition):
+        self.table = table
+        self.column = column
+        self.definition = definition
+
+    def statement(self):
+        return f"ALTER TABLE {self.table} ADD COLUMN {self.column} {self.definition}"
+
+    def describe(self, runner):
+        # A table created by an earlier migration already has the column.
+        if not inspect(runner.engine).has_table(self.table) or runner.has_column(self.table, self.column):
+            return []
+        return [self.statement()]
+
+    def apply(self, runner, migration):
+        if not runner.has_column(self.table, self.column):
+            runner.run_ddl([self.statement()])
+
+
+class CreateIndex(Step):
+    """Builds an index; on PostgreSQL with ``CREATE INDEX CONCURRENTLY``.
+
+    A concurrent build does not block writes, but runs outside a transaction
+    and leaves an INVALID index behind if it fails; such an index is
+    dropped and built again.
+    """
+
+    def __init__(self, name, table, columns, unique=False, where=None):
+        self.name = name
+        self.table = table
+        self.columns = columns
+        self.unique = unique
+        self.where = where
+
+    def statement(self, concurrently):
+        sql = (f"CREATE {'UNIQUE ' if self.unique else ''}INDEX {'CONCURRENTLY ' if concurrently else ''}"
+               f"IF NOT EXISTS {self.name} ON {self.table} ({', '.join(self.columns)})")
+        if self.where:
+            sql += f" WHERE {self.where}"
+        return sql
+
+    def describe(self, runner):
+        state = runner.index_state(self.name)
+        if state == 'valid':
+            return []
+        statements = [self.statement(runner.dialect == 'postgresql')]
+        if state == 'invalid':
+            statements.insert(0, f"DROP INDEX CONCURRENTLY IF EXISTS {self.name}")
+        return statements
+
+    def apply(self, runner, migration):
+        if runner.dialect != 'postgresql':
+            runner.run_ddl([self.statement(False)])
+            return
+        state = runner.index_state(self.name)
+        if state == 'valid':
+            return
+        with runner.autocommit() as conn:
+            if state == 'invalid':
+                logging.warning(f"Dropping invalid index {self.name} left by an interrupted build")
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {self.name}"))
+            started = time.monotonic()
+            conn.execute(text(self.statement(True)))
+        logging.info(f"Built index {self.name} in {time.monotonic() - started:.1f}s")
+
+
+class Backfill(Step):
+    """Rewrites rows in keyset-ordered batches, one short transaction each.
+
+    ``fetch(conn, after_id, limit)`` returns the next rows to change, ordered
+    by id, each with an ``id`` attribute; ``update(conn, rows)`` writes
+    them. The last id of every batch is saved as the migration's
+    checkpoint, so an interrupted backfill continues where it stopped.
+    ``count(conn)`` estimates the remaining rows for dry runs. The runner's
+    ``pause`` sleeps between batches to leave room for live traffic.
+    """
+
+    def __init__(self, description, fetch, update, count=None):
+        self.description = description
+        self.fetch = fetch
+        self.update = update
+        self.count = count
+
+    def describe(self, runner):
+        remaining = ''
+        if self.count is not None:
+            try:
+                with runner.engine.connect() as conn:
+                    remaining = f" ({self.count(conn)} rows)"
+            except SQLAlchemyError:
+                # The table or column comes from a migration that has not run yet.
+                remaining = ''
+        return [f"-- backfill: {self.description}{remaining}, {runner.batch_size} rows per batch"]
+
+    def apply(self, runner, migration):
+        last_id = int(runner.checkpoint(migration) or 0)
+        if last_id:
+            logging.info(f"Resuming backfill after id {last_id}")
+        total = batches = 0
+        started = time.monotonic()
+        while True:
+            with runner.engine.begin() as conn:
+                rows = self.fetch(conn, last_id, runner.batch_size)
+                if not rows:
+                    break
+                self.update(conn, rows)
+                last_id = rows[-1].id
+                runner.save_checkpoint(conn, migration, last_id)
+            total += len(rows)
+            batches += 1
+            if batches % 10 == 0:
+                logging.info(f"Backfilled {total} rows ({total / max(time.monotonic() - started, 0.001):.0f}/s)")
+            if runner.pause:
+                time.sleep(runner.pause)
+        logging.info(f"Backfill done: {self.description}, {total} rows in {time.monotonic() - started:.1f}s")
+
+
+class Python(Step):
+    """Arbitrary ``func(engine)``; it must be idempotent."""
+
+    def __init__(self, description, func):
+        self.description = description
+        self.func = func
+
+    def describe(self, runner):
+        return [f"-- {self.description}"]
+
+    def apply(self, runner, migration):
+        self.func(runner.engine)
+
+
+class MigrationRunner:
+    """Applies the pending migrations of ``migrations`` in version order.
+
+    Applied versions are recorded in ``schema_migrations``. On PostgreSQL
+    an advisory lock serializes runners, and DDL is retried up to
+    ``ddl_retries`` times when it cannot get its lock within
+    ``lock_timeout``.
+    """
+
+    def __init__(self, engine, migrations, batch_size=1000, pause=0.0, lock_timeout='5s', ddl_retries=10):
+        self.engine = engine
+        self.migrations = sorted(migrations, key=lambda migration: migration.version)
+        self.batch_size = batch_size
+        self.pause = pause
+        self.lock_timeout = lock_timeout
+        self.ddl_retries = ddl_retries
+        self.dialect = engine.dialect.name
+
+    def autocommit(self):
+        return self.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+
+    def has_column(self, table, column):
+        inspector = inspect(self.engine)
+        return inspector.has_table(table) and column in [col['name'] for col in inspector.get_columns(table)]
+
+    def index_state(self, name):
+        """'valid', 'invalid' or None when the index does not exist."""
+        with self.engine.connect() as conn:
+            if self.dialect == 'postgresql':
+                valid = conn.execute(text(
+                    "SELECT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid WHERE c.relname = :name"
+                ), {'name': name}).scalar()
+            else:
+                valid = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :name"
+                ), {'name': name}).scalar()
+        if valid is None:
+            return None
+        return 'valid' if valid else 'invalid'
+
+    def run_ddl(self, statements):
+        for attempt in range(self.ddl_retries):
+            try:
+                with self.engine.begin() as conn:
+                    if self.dialect == 'postgresql':
+                        conn.execute(text(f"SET LOCAL lock_timeout = '{self.lock_timeout}'"))
+                    for statement in statements:
+                        logging.info(f"Executing: {statement}")
+                        conn.execute(text(statement))
+                return
+            except OperationalError as e:
+                if 'lock timeout' not in str(e) or attempt == self.ddl_retries - 1:
+                    raise
+                logging.warning(f"Lock not available, retrying in {2 ** attempt}s")
+                time.sleep(min(2 ** attempt, 60))
+
+    def applied(self):
+        """``{version: row}`` for every recorded migration, finished or not."""
+        if not inspect(self.engine).has_table(schema_migrations.name):
+            return {}
+        with self.engine.connect() as conn:
+            return {row.version: row for row in conn.execute(schema_migrations.select())}
+
+    def pending(self, target=None):
+        applied = self.applied()
+        return [migration for migration in self.migrations
+                if (target is None or migration.version <= target)
+                and (migration.version not in applied or applied[migration.version].status != 'applied')]
+
+    def checkpoint(self, migration):
+        with self.engine.connect() as conn:
+            return conn.execute(schema_migrations.select().where(
+                schema_migrations.c.version == migration.version
+            )).first().checkpoint
+
+    def save_checkpoint(self, conn, migration, value):
+        conn.execute(schema_migrations.update().where(
+            schema_migrations.c.version == migration.version
+        ).values(checkpoint=str(value)))
+
+    def plan(self, target=None):
+        """``[(migration, [statement, ...])]`` of what ``run`` would do."""
+        return [(migration, [line for step in migration.steps for line in step.describe(self)])
+                for migration in self.pending(target)]
+
+    def run(self, target=None):
+        """Apply pending migrations up to ``target``; returns the versions applied."""
+        if self.dialect != 'postgresql':
+            return self._run(target)
+        with self.engine.connect() as lock_conn:
+            lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {'key': MIGRATION_LOCK_KEY})
+            lock_conn.commit()
+            try:
+                return self._run(target)
+            finally:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': MIGRATION_LOCK_KEY})
+                lock_conn.commit()
+
+    def _run(self, target):
+        applied = []
+        metadata.create_all(self.engine, tables=[schema_migrations])
+        existing = self.applied()
+        for migration in self.pending(target):
+            started = time.monotonic()
+            logging.info(f"Applying migration {migration.version}: {migration.name}")
+            with self.engine.begin() as conn:
+                if migration.version not in existing:
+                    conn.execute(schema_migrations.insert().values(
+                        version=migration.version, name=migration.name, status='running',
+                        started_at=datetime.utcnow()
+                    ))
+            for step in migration.steps:
+                step.apply(self, migration)
+            with self.engine.begin() as conn:
+                conn.execute(schema_migrations.update().where(
+                    schema_migrations.c.version == migration.version
+                ).values(status='applied', finished_at=datetime.utcnow(), duration=time.monotonic() - started))
+            applied.append(migration.version)
+        return applied
@@ -0,0 +1,131 @@
+import os
+import math
+import time
+import random
+import sqlite3
+import logging
+import tempfile
+import threading
+
+# How "30/60" style periods may be written.
+PERIODS = {'s': 1, 'second': 1, 'm': 60, 'minute': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+class RateLimit:
+    """``capacity`` requests per burst, refilled at ``rate`` tokens per second."""
+
+    __slots__ = ('capacity', 'rate')
+
+    def __init__(self, capacity, period):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+
+
+def parse_limits(value):
+    """Parse ``"shorten=20/60,api=60/minute"`` into ``{scope: RateLimit}``."""
+    limits = {}
+    for item in (value or '').split(','):
+        scope, _, spec = item.partition('=')
+        if not scope.strip():
+            continue
+        count, _, period = spec.strip().partition('/')
+        try:
+            period = PERIODS[period] if period in PERIODS else float(period or 1)
+            limits[scope.strip()] = RateLimit(int(count), period)
+        except ValueError:
+            logging.warning(f"Invalid rate limit for {scope}: {spec}")
+    return limits
+
+
+class TokenBucketStore:
+    """Token buckets kept in a local SQLite file shared by all workers on a host.
+
+    Each ``take`` is one short ``BEGIN IMMEDIATE`` transaction, so concurrent
+    workers see a consistent bucket. If the file cannot be used the store
+    fails open and lets the request through.
+    """
+
+    def __init__(self, path=None, busy_timeout=0.5):
+        self.path = path or os.path.join(tempfile.gettempdir(), 'url_shortener_ratelimit.db')
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute('CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def take(self, key, limit, cost=1):
+        """Take ``cost`` tokens from ``key``'s bucket; return ``(allowed, retry_after_seconds)``."""
+        now = time.time()
+        try:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+                tokens = limit.capacity if row is None else min(limit.capacity, row[0] + (now - row[1]) * limit.rate)
+                allowed = tokens >= cost
+                if allowed:
+                    tokens -= cost
+                conn.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)', (key, tokens, now))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            if random.random() < 0.001:
+                self._prune(conn, now)
+        except sqlite3.Error as e:
+            logging.warning(f"Rate limit store unavailable, allowing request: {str(e)}")
+            return True, 0
+        if allowed:
+            return True, 0
+        return False, math.ceil((cost - tokens) / limit.rate) if limit.rate > 0 else 60
+
+    def _prune(self, conn, now):
+        # Full buckets carry no state, so rows idle for a day can go.
+        conn.execute('DELETE FROM buckets WHERE updated < ?', (now - 86400,))
+
+
+class LoadShedder:
+    """Decides when to turn away low-priority requests to protect redirects.
+
+    Tracks a time-decayed average of connection pool checkout waits; while it
+    is above ``threshold`` seconds, ``should_shed`` is true. The average
+    decays with ``half_life`` even when nothing checks out connections, so
+    shedding stops on its own once the pool recovers.
+    """
+
+    def __init__(self, threshold=0.1, half_life=2.0):
+        self.threshold = threshold
+        self.half_life = half_life
+        self._value = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.shed = 0
+
+    def _decayed(self, now):
+        return self._value * 0.5 ** ((now - self._updated) / self.half_life)
+
+    def observe(self, wait):
+        now = time.monotonic()
+        with self._lock:
+            # Weight each sample like ~10% of the average, on top of the time decay.
+            self._value = self._decayed(now) * 0.9 + wait * 0.1
+            self._updated = now
+
+    def pressure(self):
+        return self._decayed(time.monotonic())
+
+    def should_shed(self):
+        if self.threshold <= 0:
+            return False
+        if self.pressure() > self.threshold:
+            self.shed += 1
+            return True
+        return False
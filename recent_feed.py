@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class RecentURL:
+    """A URL in the recent list, with what index.html reads.
+
+    The feed only stores ``FIELDS``, which do not change once a link is
+    created. ``LIVE_FIELDS`` change with every visit or check and are looked
+    up when the list is shown (see ``with_live_fields``).
+    """
+
+    FIELDS = ('short_code', 'original_url', 'created_at', 'expiration_type', 'max_visits')
+    LIVE_FIELDS = ('expires_at', 'visits', 'is_active', 'last_checked', 'status_code')
+
+    __slots__ = FIELDS + LIVE_FIELDS
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_model(cls, url_entry):
+        return cls(**{name: getattr(url_entry, name) for name in cls.FIELDS})
+
+    @classmethod
+    def from_dict(cls, data):
+        fields = {name: data.get(name) for name in cls.FIELDS}
+        if fields['created_at']:
+            fields['created_at'] = datetime.fromisoformat(fields['created_at'])
+        return cls(**fields)
+
+    def to_dict(self):
+        data = {name: getattr(self, name) for name in self.FIELDS}
+        if data['created_at']:
+            data['created_at'] = data['created_at'].isoformat()
+        return data
+
+    def with_live_fields(self, live):
+        """A copy with ``LIVE_FIELDS`` taken from the mapping ``live``; entries are shared, so never changed."""
+        fields = {name: getattr(self, name) for name in self.FIELDS}
+        fields.update((name, live[name]) for name in self.LIVE_FIELDS)
+        return RecentURL(**fields)
+
+    def is_expired(self):
+        time_expired = self.expires_at is not None and datetime.utcnow() > self.expires_at
+        visits_expired = (self.max_visits is not None and self.expiration_type in ['visits', 'both']
+                          and (self.visits or 0) >= self.max_visits)
+        if self.expiration_type == 'both':
+            return time_expired or visits_expired
+        elif self.expiration_type == 'date':
+            return time_expired
+        elif self.expiration_type == 'visits':
+            return visits_expired
+        return False
+
+
+class RecentFeed:
+    """Newest-first list of recently shortened URLs shared by all workers on a host.
+
+    The list lives in a small JSON file that writers replace atomically under
+    an flock. Each worker keeps the parsed list in memory and only re-reads
+    the file when its mtime changes, so a read costs two stat() calls and no
+    query. ``loader(limit)`` rebuilds the file from the database on a cold
+    start and every ``refresh_interval`` seconds, which also picks up links
+    created on other hosts. The time of the last rebuild is the mtime of a
+    separate stamp file that add() does not touch, and only one worker on
+    the host rebuilds at a time; the others keep serving the current list.
+    """
+
+    def __init__(self, path=None, maxlen=100, loader=None, refresh_interval=300):
+        self.path = path or os.path.join(tempfile.gettempdir(), 'url_shortener_recent.json')
+        self.maxlen = maxlen
+        self.loader = loader
+        self.refresh_interval = refresh_interval
+        self._entries = []
+        self._stamp = None
+        self._lock = threading.Lock()
+        self._rebuilding = threading.Lock()
+        self._rebuilt_path = self.path + '.rebuilt'
+
+    def get(self, count=10):
+        if self.loader is not None and self._rebuild_due():
+            # Only a cold start waits for a rebuild running elsewhere.
+            self.rebuild(only_if_due=True, wait=self._file_stamp() is None)
+        stamp = self._file_stamp()
+        if stamp != self._stamp:
+            with self._lock:
+                self._read(stamp)
+        return self._entries[:count]
+
+    def add(self, entries):
+        """Prepend new entries (RecentURL objects, newest last in the list)."""
+        if not entries:
+            return
+        if self._file_stamp() is None and self.loader is not None:
+            self.rebuild()
+
+        def update(current):
+            codes = {entry.short_code for entry in entries}
+            fresh = [entry.to_dict() for entry in reversed(entries)]
+            return (fresh + [item for item in current if item['short_code'] not in codes])[:self.maxlen]
+        self._update(update)
+
+    def remove(self, short_codes):
+        codes = set(short_codes)
+        if codes:
+            self._update(lambda current: [item for item in current if item['short_code'] not in codes])
+
+    def rebuild(self, only_if_due=False, wait=True):
+        """Reload the list from the database.
+
+        With ``wait=False`` the call returns at once if another thread or
+        process is already rebuilding; with ``only_if_due`` it also returns
+        if someone else rebuilt while it waited.
+        """
+        if self.loader is None:
+            return
+        if not self._rebuilding.acquire(blocking=wait):
+            return
+        try:
+            with _FileLock(self.path + '.rebuild.lock', blocking=wait) as lock:
+                if not lock.acquired or (only_if_due and not self._rebuild_due()):
+                    return
+                try:
+                    entries = [RecentURL.from_model(url_entry).to_dict() for url_entry in self.loader(self.maxlen)]
+                except Exception as e:
+                    logging.error(f"Error rebuilding recent URLs feed: {str(e)}")
+                    return
+                newest = entries[0]['created_at'] if entries else None
+
+                def replace(current):
+                    # Keep entries added while the query ran.
+                    codes = {item['short_code'] for item in entries}
+                    added = [item for item in current if item['short_code'] not in codes and
+                             (newest is None or (item.get('created_at') or '') > newest)]
+                    return (added + entries)[:self.maxlen]
+                self._update(replace)
+                with open(self._rebuilt_path, 'a'):
+                    pass
+                os.utime(self._rebuilt_path)
+        finally:
+            self._rebuilding.release()
+
+    def _rebuild_due(self):
+        try:
+            rebuilt_at = os.stat(self._rebuilt_path).st_mtime
+        except OSError:
+            return True
+        return self.refresh_interval > 0 and time.time() - rebuilt_at > self.refresh_interval
+
+    def _update(self, change):
+        with self._lock:
+            with self._file_lock():
+                current = self._load_file()
+                self._write_file(change(current))
+                self._read(self._file_stamp())
+
+    def _read(self, stamp):
+        self._entries = [RecentURL.from_dict(item) for item in self._load_file()]
+        self._stamp = stamp
+
+    def _file_stamp(self):
+        try:
+            info = os.stat(self.path)
+        except OSError:
+            return None
+        return (info.st_mtime_ns, info.st_size, info.st_ino)
+
+    def _load_file(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _write_file(self, items):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), prefix='.recent-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(items, f)
+        os.replace(tmp_path, self.path)
+
+    def _file_lock(self):
+        return _FileLock(self.path + '.lock')
+
+
+class _FileLock:
+    def __init__(self, path, blocking=True):
+        self.path = path
+        self.blocking = blocking
+        self.acquired = False
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a')
+        if fcntl is None:
+            self.acquired = True
+            return self
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX if self.blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self.acquired = True
+        except BlockingIOError:
+            pass
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None and self.acquired:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
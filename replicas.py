@@ -0,0 +1,173 @@
+import time
+import random
+import logging
+import threading
+import functools
+from flask import has_request_context, session as flask_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, text
+
+# Flask session key holding the time until which this client reads from the primary.
+PRIMARY_UNTIL_KEY = '_primary_until'
+# session.info key marking writes that are not the client's own, like
+# counting a redirect: they do not pin the client to the primary.
+NO_PIN_KEY = 'no_pin'
+
+POSTGRES_LAG_QUERY = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class Replica:
+    __slots__ = ('url', 'engine', 'lag', 'checked_at', 'healthy')
+
+    def __init__(self, url, engine):
+        self.url = url
+        self.engine = engine
+        self.lag = None
+        self.checked_at = 0.0
+        self.healthy = False
+
+
+class ReplicaSet:
+    """Read replicas with lag-aware selection.
+
+    A replica is used only if its last check succeeded and its replication
+    lag was at most ``max_lag`` seconds. Checks run inline, at most every
+    ``check_interval`` seconds per replica, and never block other threads:
+    while one thread re-checks, the others use the previous result.
+    """
+
+    def __init__(self, urls, engine_options=None, max_lag=5.0, check_interval=5.0, on_engine=None):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.replicas = []
+        for url in urls:
+            engine = create_engine(url, **(engine_options(url) if callable(engine_options) else engine_options or {}))
+            if on_engine is not None:
+                on_engine(engine)
+            self.replicas.append(Replica(url, engine))
+        self._checking = threading.Lock()
+        self.fallbacks = 0
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def choose(self):
+        """Return a usable replica engine, or None to read from the primary."""
+        now = time.monotonic()
+        for replica in self.replicas:
+            if now - replica.checked_at > self.check_interval and self._checking.acquire(blocking=False):
+                try:
+                    self.check(replica)
+                finally:
+                    self._checking.release()
+        usable = [replica for replica in self.replicas if replica.healthy and replica.lag <= self.max_lag]
+        if not usable:
+            self.fallbacks += 1
+            return None
+        return random.choice(usable).engine
+
+    def check(self, replica):
+        replica.checked_at = time.monotonic()
+        try:
+            with replica.engine.connect() as conn:
+                if conn.dialect.name == 'postgresql':
+                    replica.lag = float(conn.execute(POSTGRES_LAG_QUERY).scalar() or 0)
+                else:
+                    conn.execute(text('SELECT 1'))
+                    replica.lag = 0.0
+            replica.healthy = True
+        except Exception as e:
+            if replica.healthy:
+                logging.warning(f"Read replica unavailable, using the primary: {str(e)}")
+            replica.healthy = False
+
+    def stats(self):
+        return {
+            'replicas': [{
+                'healthy': replica.healthy,
+                'lag': replica.lag
+            } for replica in self.replicas],
+            'max_lag': self.max_lag,
+            'fallbacks': self.fallbacks
+        }
+
+
+class RoutingSession(Session):
+    """Session that sends the reads of replica-marked requests to a read replica.
+
+    Reads go to a replica only while ``session.info['use_replica']`` is set
+    (see ``replica_reads``), the client has not written recently, and a
+    replica is within the lag limit. Flushes and INSERT/UPDATE/DELETE
+    statements always use the primary. After a commit that wrote anything,
+    the client is pinned to the primary for ``read_your_writes`` seconds via
+    its Flask session, so it sees its own changes on the next request,
+    unless ``session.info[NO_PIN_KEY]`` is set.
+    """
+
+    def __init__(self, db, replicas=None, read_your_writes=10.0, **kwargs):
+        super().__init__(db, **kwargs)
+        self.replicas = replicas
+        self.read_your_writes = read_your_writes
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and self.replicas and self.info.get('use_replica') and not self._flushing
+                and not getattr(clause, 'is_dml', False) and not self.info.get('wrote')
+                and not _pinned_to_primary()):
+            engine = self.replicas.choose()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _pinned_to_primary():
+    return has_request_context() and flask_session.get(PRIMARY_UNTIL_KEY, 0) > time.time()
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_flush(session, flush_context):
+    if session.new or session.dirty or session.deleted:
+        session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _mark_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _pin_after_write(session):
+    if (session.info.pop('wrote', False) and session.replicas and has_request_context()
+            and not session.info.get(NO_PIN_KEY)):
+        flask_session[PRIMARY_UNTIL_KEY] = time.time() + session.read_your_writes
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _clear_write_mark(session):
+    session.info.pop('wrote', None)
+
+
+def replica_reads(db):
+    """Decorator for read-only views whose queries may be served by a replica.
+
+    Writes made by such a view (visit counts) do not pin the client to the
+    primary.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(*args, **kwargs):
+            if not db.session().replicas:
+                return view(*args, **kwargs)
+            db.session.info['use_replica'] = True
+            db.session.info[NO_PIN_KEY] = True
+            try:
+                return view(*args, **kwargs)
+            finally:
+                db.session.info.pop('use_replica', None)
+                db.session.info.pop(NO_PIN_KEY, None)
+        return wrapped
+    return decorator
@@ -0,0 +1,133 @@
+import re
+import logging
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+from sqlalchemy import text
+
+# Bucket widths in seconds; every click is counted once per granularity.
+GRANULARITIES = {'minute': 60, 'hour': 3600, 'day': 86400}
+
+DIRECT = '(direct)'
+INVALID = '(invalid)'
+AGENT_CLASSES = ('bot', 'tablet', 'mobile', 'desktop', 'other', 'unknown')
+
+_BOT_RE = re.compile(r'bot|crawl|spider|slurp|preview|facebookexternalhit|whatsapp|curl|wget|'
+                     r'python-requests|httpclient|headless', re.IGNORECASE)
+_TABLET_RE = re.compile(r'ipad|tablet|kindle|silk|playbook', re.IGNORECASE)
+_MOBILE_RE = re.compile(r'mobi|iphone|ipod|android|windows phone|blackberry|opera mini', re.IGNORECASE)
+_DESKTOP_RE = re.compile(r'windows nt|macintosh|x11|linux|cros', re.IGNORECASE)
+
+
+def referer_domain(referer):
+    """Host of ``referer`` without a leading ``www.``, or a placeholder."""
+    if not referer:
+        return DIRECT
+    try:
+        host = urlsplit(referer.strip()).hostname
+    except ValueError:
+        host = None
+    if not host:
+        return INVALID
+    if host.startswith('www.'):
+        host = host[4:]
+    return host[:255]
+
+
+def agent_class(user_agent):
+    """Coarse device class of a User-Agent header, one of AGENT_CLASSES."""
+    if not user_agent:
+        return 'unknown'
+    if _BOT_RE.search(user_agent):
+        return 'bot'
+    if _TABLET_RE.search(user_agent) or ('android' in user_agent.lower() and 'mobile' not in user_agent.lower()):
+        return 'tablet'
+    if _MOBILE_RE.search(user_agent):
+        return 'mobile'
+    if _DESKTOP_RE.search(user_agent):
+        return 'desktop'
+    return 'other'
+
+
+def bucket_start(moment, granularity):
+    if granularity == 'minute':
+        return moment.replace(second=0, microsecond=0)
+    if granularity == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def bucket_end(moment, granularity):
+    """Start of the first bucket at or after ``moment``."""
+    start = bucket_start(moment, granularity)
+    return start if start == moment else start + timedelta(seconds=GRANULARITIES[granularity])
+
+
+def aggregate(events):
+    """Rollup rows for a batch of ClickEventRecords, one per distinct key.
+
+    Rows are sorted by key so that concurrent flushes lock them in the same
+    order.
+    """
+    counts = {}
+    for event in events:
+        domain = referer_domain(event.referer)
+        agent = agent_class(event.user_agent)
+        for granularity in GRANULARITIES:
+            key = (event.url_id, granularity, bucket_start(event.clicked_at, granularity), domain, agent)
+            counts[key] = counts.get(key, 0) + 1
+    return [{
+        'url_id': url_id,
+        'granularity': granularity,
+        'bucket_start': start,
+        'referer_domain': domain,
+        'agent_class': agent,
+        'clicks': clicks
+    } for (url_id, granularity, start, domain, agent), clicks in sorted(counts.items())]
+
+
+def upsert_statement(table, dialect_name):
+    """``INSERT ... ON CONFLICT DO UPDATE`` adding to the clicks of existing buckets."""
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[column.name for column in table.primary_key.columns],
+        set_={'clicks': table.c.clicks + stmt.excluded.clicks}
+    )
+
+
+def prune_rollups(engine, retention, now=None):
+    """Delete buckets older than ``retention[granularity]`` days; 0 keeps them forever.
+
+    Old buckets are deleted sixty buckets' worth of time at a time (an hour
+    of minute buckets, 60 hours of hour buckets, 60 days of day buckets),
+    each slice in its own short transaction.
+    """
+    now = now or datetime.utcnow()
+    deleted = 0
+    with engine.connect() as conn:
+        for granularity, days in retention.items():
+            if not days or days <= 0:
+                continue
+            cutoff = bucket_start(now - timedelta(days=days), 'day')
+            step = timedelta(seconds=GRANULARITIES[granularity] * 60)
+            oldest = conn.execute(text(
+                "SELECT MIN(bucket_start) FROM click_rollups WHERE granularity = :granularity"
+            ), {'granularity': granularity}).scalar()
+            conn.commit()
+            if isinstance(oldest, str):
+                oldest = datetime.fromisoformat(oldest)
+            while oldest is not None and oldest < cutoff:
+                upper = min(oldest + step, cutoff)
+                result = conn.execute(text(
+                    "DELETE FROM click_rollups WHERE granularity = :granularity "
+                    "AND bucket_start >= :lower AND bucket_start < :upper"
+                ), {'granularity': granularity, 'lower': oldest, 'upper': upper})
+                conn.commit()
+                deleted += result.rowcount
+                oldest = upper
+    if deleted:
+        logging.info(f"Pruned {deleted} old click rollup rows")
+    return deleted
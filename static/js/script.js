@@ -164,6 +164,52 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         });
     }
+
+    const dashboardMore = document.getElementById('dashboard-more');
+    if (dashboardMore) {
+        const rows = document.getElementById('dashboard-rows');
+        const moreBtn = document.getElementById('dashboard-more-btn');
+        let loading = false;
+        
+        function loadMore() {
+            const cursor = dashboardMore.dataset.cursor;
+            if (loading || !cursor) {
+                return;
+            }
+            loading = true;
+            moreBtn.disabled = true;
+            
+            const url = new URL(dashboardMore.dataset.url, window.location.origin);
+            url.searchParams.set('cursor', cursor);
+            fetch(url, {headers: {'Accept': 'application/json'}})
+                .then(response => response.json())
+                .then(data => {
+                    rows.insertAdjacentHTML('beforeend', data.html);
+                    if (data.next_cursor) {
+                        dashboardMore.dataset.cursor = data.next_cursor;
+                    } else {
+                        observer.disconnect();
+                        dashboardMore.remove();
+                    }
+                })
+                .catch(err => {
+                    console.error('Failed to load more URLs: ', err);
+                    showAlert('Failed to load more URLs', 'danger');
+                })
+                .finally(() => {
+                    loading = false;
+                    moreBtn.disabled = false;
+                });
+        }
+        
+        const observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadMore();
+            }
+        }, {rootMargin: '400px'});
+        observer.observe(dashboardMore);
+        moreBtn.addEventListener('click', loadMore);
+    }
 });
 
 function showAlert(message, type) {
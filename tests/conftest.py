@@ -0,0 +1,31 @@
+import os
+import tempfile
+
+import pytest
+
+# app.py reads its settings at import time, so point it at a throwaway
+# SQLite database and per-run state files before any test imports it.
+_state_dir = tempfile.mkdtemp(prefix='url_shortener_tests_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_state_dir, 'test.db')
+os.environ['RATE_LIMITS'] = ''
+os.environ['RATE_LIMIT_PATH'] = os.path.join(_state_dir, 'rate_limits')
+os.environ['RECENT_FEED_PATH'] = os.path.join(_state_dir, 'recent.json')
+os.environ['METRICS_DIR'] = os.path.join(_state_dir, 'metrics')
+os.environ['CODE_FILTER_ENABLED'] = '0'
+os.environ['CODE_SECRET'] = 'test secret'
+
+
+@pytest.fixture(scope='session')
+def app():
+    import migrate_db
+    from app import create_app
+    assert migrate_db.migrate_database()
+    return create_app()
+
+
+@pytest.fixture
+def db(app):
+    from app import db
+    with app.app_context():
+        yield db
+        db.session.rollback()
@@ -0,0 +1,27 @@
+import pytest
+
+
+@pytest.fixture
+def client(app, monkeypatch):
+    monkeypatch.setenv('ADMIN_TOKEN', 'admin-token')
+    return app.test_client()
+
+
+@pytest.mark.parametrize('path', ['/api/cleanup', '/api/admin/export'])
+@pytest.mark.parametrize('header', [None, 'Bearer x', 'Bearer admin-token2'])
+def test_admin_endpoints_reject_other_tokens(client, path, header):
+    method = client.post if path == '/api/cleanup' else client.get
+    headers = {'Authorization': header} if header else {}
+    assert method(path, headers=headers).status_code == 401
+
+
+def test_admin_endpoints_are_disabled_without_a_token(app, monkeypatch):
+    monkeypatch.delenv('ADMIN_TOKEN', raising=False)
+    response = app.test_client().post('/api/cleanup', headers={'Authorization': 'Bearer '})
+    assert response.status_code == 401
+
+
+def test_cleanup_accepts_the_admin_token(client):
+    response = client.post('/api/cleanup', headers={'Authorization': 'Bearer admin-token'})
+    assert response.status_code == 200
+    assert 'count' in response.get_json()
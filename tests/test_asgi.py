@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+import pytest
+
+
+@pytest.fixture
+def server(app, db):
+    import asgi
+    from app import URL, url_cache
+    db.session.add_all([
+        URL(original_url='https://example.com/async', short_code='async01'),
+        URL(original_url='https://example.com/async-limited', short_code='async02',
+            expiration_type='visits', max_visits=1),
+    ])
+    db.session.commit()
+    url_cache.invalidate_many(['async01', 'async02'])
+    yield asgi.AsyncServer(asgi.flask_app, asgi.flask_app.config['SQLALCHEMY_DATABASE_URI'])
+    URL.query.filter(URL.short_code.in_(['async01', 'async02'])).delete()
+    db.session.commit()
+    url_cache.invalidate_many(['async01', 'async02'])
+
+
+def request(server, method, path, headers=()):
+    """Call the ASGI app with an empty body and return (status, headers, body)."""
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    async def call():
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+            'headers': [(b'host', b'localhost')] + [(name.encode(), value.encode()) for name, value in headers],
+            'client': ('192.0.2.1', 1234), 'server': ('localhost', 80)
+        }
+        try:
+            await server(scope, receive, send)
+        finally:
+            if server._engine is not None:
+                await server._engine.dispose()
+
+    asyncio.run(call())
+    start = messages[0]
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    return start['status'], {name.decode(): value.decode() for name, value in start['headers']}, body
+
+
+def test_redirects_are_served_on_the_async_engine(server):
+    from app import url_cache
+    status, headers, _ = request(server, 'GET', '/async01', [('referer', 'https://news.example/')])
+    assert status == 301
+    assert headers['location'] == 'https://example.com/async'
+    assert url_cache.get('async01') is not None
+    status, headers, _ = request(server, 'GET', '/async01')
+    assert (status, headers['location']) == (301, 'https://example.com/async')
+
+
+def test_visit_limited_links_expire_after_their_last_visit(server, db):
+    from app import URL
+    assert request(server, 'GET', '/async02')[0] == 302
+    assert request(server, 'GET', '/async02')[0] == 410
+    db.session.expire_all()
+    assert URL.query.filter_by(short_code='async02').one().visits == 1
+
+
+def test_missing_codes_get_the_flask_error_page(server):
+    status, headers, body = request(server, 'GET', '/nothing01')
+    assert status == 404
+    assert headers['content-type'].startswith('text/html')
+    assert b'not found' in body
+
+
+def test_status_and_health(server):
+    status, headers, body = request(server, 'GET', '/api/status/async01')
+    assert status == 200
+    payload = json.loads(body)
+    assert (payload['short_code'], payload['original_url']) == ('async01', 'https://example.com/async')
+    status, _, _ = request(server, 'GET', '/api/status/async01', [('if-none-match', headers['etag'])])
+    assert status == 304
+    assert request(server, 'GET', '/api/status/nothing01')[0] == 404
+    status, _, body = request(server, 'GET', '/health')
+    assert status == 200
+    assert json.loads(body)['status']
@@ -0,0 +1,56 @@
+import json
+
+
+def test_batch_results_follow_the_input_order(app, db):
+    from app import URL
+    db.session.add_all([
+        URL(original_url='https://example.com/batch-existing', short_code='bexist'),
+        URL(original_url='https://example.com/batch-taken', short_code='btaken', is_custom=True),
+    ])
+    db.session.commit()
+
+    response = app.test_client().post('/api/shorten/batch', json=[
+        'https://example.com/batch-new',
+        {'url': 'https://example.com/batch-existing'},
+        {'url': 'https://example.com/batch-aliased', 'alias': 'bmine'},
+        {'url': 'https://example.com/batch-other', 'alias': 'btaken'},
+        {'url': 'https://'},
+        {'url': 'https://example.com/batch-new'},
+        {'url': 'https://example.com/batch-twice', 'alias': 'bmine'},
+    ])
+    assert response.status_code == 200
+    body = response.get_json()
+    results = body['results']
+    assert body['created'] == 2
+    assert body['existing'] == 2
+    assert body['errors'] == 3
+    assert [result['index'] for result in results] == list(range(7))
+    assert [result['status'] for result in results] == [201, 200, 201, 409, 400, 200, 409]
+
+    new_code = results[0]['short_code']
+    assert results[5]['short_code'] == new_code
+    assert results[1]['short_code'] == 'bexist'
+    assert (results[2]['short_code'], results[2]['is_custom']) == ('bmine', True)
+    assert results[0]['short_url'].endswith('/' + new_code)
+    assert URL.query.filter_by(short_code=new_code).one().original_url == 'https://example.com/batch-new'
+    assert URL.query.filter_by(original_url='https://example.com/batch-new').count() == 1
+    assert URL.query.filter_by(short_code='btaken').one().original_url == 'https://example.com/batch-taken'
+
+
+def test_batch_results_can_be_streamed_as_ndjson(app):
+    response = app.test_client().post(
+        '/api/shorten/batch',
+        data='{"url": "https://example.com/batch-stream-1"}\n\n{"url": "https://example.com/batch-stream-2"}\n',
+        headers={'Content-Type': 'application/x-ndjson', 'Accept': 'application/x-ndjson'}
+    )
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [(result['index'], result['status']) for result in results] == [(0, 201), (1, 201)]
+    assert results[1]['original_url'] == 'https://example.com/batch-stream-2'
+
+
+def test_oversized_batches_are_rejected(app, monkeypatch):
+    monkeypatch.setenv('BATCH_MAX_ITEMS', '2')
+    response = app.test_client().post('/api/shorten/batch', json=['https://example.com/1'] * 3)
+    assert response.status_code == 413
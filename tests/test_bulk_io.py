@@ -0,0 +1,62 @@
+import pytest
+
+from bulk_io import import_payload
+
+
+def test_import_payload_maps_export_columns():
+    payload = import_payload({'short_code': 'abc123', 'original_url': 'https://example.com/',
+                              'is_custom': 'False', 'expires_at': ''})
+    assert payload == {'alias': 'abc123', 'url': 'https://example.com/', 'is_custom': False}
+    assert import_payload({'short_code': 'abc123', 'is_custom': 'True'})['is_custom'] is True
+    assert import_payload({'short_code': 'abc123', 'is_custom': False})['is_custom'] is False
+
+
+@pytest.fixture
+def user_client(app, db):
+    from app import User
+    user = User(username='porter', email='porter@example.com')
+    user.set_password('secret')
+    db.session.add(user)
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+    yield client, user.id
+    db.session.delete(db.session.get(User, user.id))
+    db.session.commit()
+
+
+def user_links(db, user_id):
+    from app import URL
+    return {url.short_code: (url.original_url, url.is_custom)
+            for url in URL.query.filter_by(user_id=user_id).order_by(URL.id)}
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'ndjson'])
+def test_export_import_round_trip(user_client, db, fmt):
+    from app import URL, forget_short_codes
+    client, user_id = user_client
+    db.session.add_all([
+        URL(original_url=f'https://example.com/generated-{fmt}', short_code=f'gen{fmt}1', user_id=user_id),
+        URL(original_url=f'https://example.com/custom-{fmt}', short_code=f'mine-{fmt}', is_custom=True,
+            user_id=user_id),
+    ])
+    db.session.commit()
+    before = user_links(db, user_id)
+
+    export = client.get(f'/api/export?format={fmt}')
+    assert export.status_code == 200
+    exported = export.get_data()
+    URL.query.filter_by(user_id=user_id).delete()
+    db.session.commit()
+    forget_short_codes(list(before))
+
+    response = client.post(f'/api/import?format={fmt}', data=exported)
+    assert response.status_code == 200
+    assert response.get_data(as_text=True).splitlines()[-1] == \
+        '{"summary": {"created": 2, "existing": 0, "errors": 0, "rows": 2}}'
+    assert user_links(db, user_id) == before
+
+    # The imported generated code is reused for the same URL.
+    again = client.post('/api/shorten', json={'url': f'https://example.com/generated-{fmt}'})
+    assert again.get_json()['short_code'] == f'gen{fmt}1'
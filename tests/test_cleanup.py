@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from cleanup import count_expired, delete_expired
+
+
+@pytest.fixture
+def expired_links(db):
+    from app import URL
+    URL.query.delete()
+    past = datetime.utcnow() - timedelta(days=1)
+    db.session.add_all([URL(original_url=f'https://example.com/{n}', short_code=f'cleanup{n}', expires_at=past,
+                            expiration_type='date') for n in range(5)])
+    db.session.add(URL(original_url='https://example.com/live', short_code='cleanuplive'))
+    db.session.commit()
+    return URL
+
+
+@pytest.mark.parametrize('max_rows, complete', [(3, False), (5, True), (None, True), (10, True)])
+def test_delete_reports_whether_expired_rows_are_left(db, expired_links, max_rows, complete):
+    deleted = []
+    report = delete_expired(db, expired_links, chunk_size=2, max_rows=max_rows, on_deleted=deleted.extend)
+
+    expected = min(5, max_rows or 5)
+    assert (report.count, report.complete) == (expected, complete)
+    assert len(deleted) == expected
+    assert count_expired(db, expired_links) == 5 - expected
+    assert expired_links.query.filter_by(short_code='cleanuplive').count() == 1
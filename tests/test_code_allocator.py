@@ -0,0 +1,28 @@
+import pytest
+
+from code_allocator import BASE, CodeAllocator, LocalBlockSource, decode_base62
+
+
+def test_permutation_is_a_bijection_of_the_keyspace():
+    allocator = CodeAllocator(LocalBlockSource(), b'secret')
+    space = BASE ** 3
+    assert sorted(allocator.permute(value, 3) for value in range(space)) == list(range(space))
+
+
+def test_codes_depend_on_the_key():
+    first = CodeAllocator(LocalBlockSource(), b'first key').next_codes(50)
+    second = CodeAllocator(LocalBlockSource(), b'second key').next_codes(50)
+    assert len(set(first)) == 50
+    assert first != second
+    assert CodeAllocator(LocalBlockSource(), b'first key').next_codes(50) == first
+
+
+def test_consecutive_codes_are_not_an_arithmetic_sequence():
+    values = [decode_base62(code) for code in CodeAllocator(LocalBlockSource(), b'secret').next_codes(3)]
+    assert values[1] - values[0] != values[2] - values[1]
+
+
+def test_key_is_required():
+    for key in (b'', '', lambda: None):
+        with pytest.raises(ValueError):
+            CodeAllocator(LocalBlockSource(), key).next_code()
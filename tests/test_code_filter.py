@@ -0,0 +1,91 @@
+import os
+
+from code_filter import ShortCodeFilter
+
+
+class FakeTable:
+    """Ids are assigned at insert, rows become visible at commit, like a sequence-backed table."""
+
+    def __init__(self):
+        self.next_id = 1
+        self.visible = []
+        self.pending = {}
+        self.rows_read = 0
+
+    def insert(self, transaction, short_code):
+        self.pending.setdefault(transaction, []).append((self.next_id, short_code))
+        self.next_id += 1
+
+    def commit(self, transaction):
+        self.visible.extend(self.pending.pop(transaction))
+
+    def load(self, after_id):
+        rows = sorted(row for row in self.visible if row[0] > after_id)
+        self.rows_read += len(rows)
+        return rows
+
+
+def build_filter(table, **kwargs):
+    code_filter = ShortCodeFilter(table.load, lambda: table.next_id, max_staleness=0, min_capacity=1000, **kwargs)
+    code_filter._pid = os.getpid()
+    code_filter.rebuild()
+    return code_filter
+
+
+def test_syncs_only_read_rows_past_the_highest_id_seen():
+    table = FakeTable()
+    for number in range(500):
+        table.insert(f'request{number}', f'req{number}')
+        table.commit(f'request{number}')
+    code_filter = build_filter(table)
+
+    table.rows_read = 0
+    for number in range(100):
+        assert code_filter.probably_absent(f'probe{number}')
+    assert table.rows_read == 0
+
+    table.insert('new', 'new1')
+    table.commit('new')
+    assert not code_filter.probably_absent('new1')
+    assert table.rows_read == 1
+
+
+def test_stale_answers_wait_for_max_staleness():
+    table = FakeTable()
+    code_filter = build_filter(table)
+    code_filter.max_staleness = 3600
+    table.insert('new', 'new1')
+    table.commit('new')
+    assert code_filter.probably_absent('new1')
+    assert code_filter.stats()['misses'] == 1
+
+
+def test_rows_committed_below_the_highest_id_are_picked_up_by_the_rebuild():
+    table = FakeTable()
+    table.insert('import', 'imp1')
+    table.insert('request', 'req1')
+    table.commit('request')
+    code_filter = build_filter(table)
+    table.commit('import')
+    # The filter is only a hint; callers still check the database.
+    assert code_filter.probably_absent('imp1')
+    code_filter.rebuild()
+    assert not code_filter.probably_absent('imp1')
+
+
+def test_codes_the_filter_has_not_seen_still_redirect(app, db, monkeypatch):
+    import app as app_module
+    from app import URL
+    table = FakeTable()
+    code_filter = build_filter(table)
+    code_filter.max_staleness = 3600
+    monkeypatch.setattr(app_module, 'code_filter', code_filter)
+    # Created by another worker after this one's filter last synced.
+    db.session.add(URL(original_url='https://example.com/elsewhere', short_code='else01'))
+    db.session.commit()
+
+    response = app.test_client().get('/else01')
+    assert response.status_code == 301
+    assert response.headers['Location'] == 'https://example.com/elsewhere'
+    assert code_filter.stats()['misses'] == 1
+    assert app.test_client().get('/never01').status_code == 404
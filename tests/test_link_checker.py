@@ -0,0 +1,82 @@
+import time
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import link_checker
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_HEAD(self):
+        self.server.requests.append(self.path)
+        if self.path == '/slow':
+            time.sleep(1.5)
+        if self.path == '/moved':
+            self.send_response(301)
+            self.send_header('Location', '/ok')
+        else:
+            self.send_response(200 if self.path in ('/ok', '/slow') else 404)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    do_GET = do_HEAD
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f'http://127.0.0.1:{server.server_port}'
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def add_links(db, urls):
+    from app import URL
+    entries = [URL(original_url=url, short_code=f'lc{time.monotonic_ns()}{n}', created_at=datetime.utcnow())
+               for n, url in enumerate(urls)]
+    db.session.add_all(entries)
+    db.session.commit()
+    return [entry.id for entry in entries]
+
+
+def stored(db, url_id):
+    from app import URL
+    db.session.expire_all()
+    return db.session.get(URL, url_id)
+
+
+def test_results_of_a_stub_server_are_stored(db, stub_server):
+    ok, missing, moved, slow = add_links(db, [stub_server.url + path for path in ('/ok', '/missing', '/moved', '/slow')])
+
+    checked = link_checker.run(timeout=0.5, once=True, allow_private=True)
+
+    assert checked >= 4
+    for url_id, status in ((ok, 200), (missing, 404), (moved, 301)):
+        entry = stored(db, url_id)
+        assert (entry.is_active, entry.status_code) == (True, status)
+        assert entry.last_checked is not None
+        assert 0 <= entry.response_time < 500
+    timed_out = stored(db, slow)
+    assert (timed_out.is_active, timed_out.status_code) == (False, None)
+    assert timed_out.response_time >= 500
+
+
+def test_private_addresses_are_not_contacted(db, stub_server):
+    url_id, = add_links(db, [stub_server.url + '/ok'])
+
+    link_checker.run(timeout=0.5, once=True)
+
+    entry = stored(db, url_id)
+    assert stub_server.requests == []
+    assert (entry.status_code, entry.response_time) == (None, None)
+    assert entry.last_checked is not None
@@ -0,0 +1,104 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from migrations import AddColumn, Backfill, CreateIndex, Migration, MigrationRunner, SQL
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    yield engine
+    engine.dispose()
+
+
+def statuses(runner):
+    return {version: row.status for version, row in runner.applied().items()}
+
+
+def test_migrations_run_once_in_version_order(engine):
+    migrations = [
+        Migration(2, 'Add label', AddColumn('items', 'label', 'VARCHAR(20)')),
+        Migration(1, 'Create items', SQL('CREATE TABLE items (id INTEGER PRIMARY KEY)')),
+        Migration(3, 'Index labels', CreateIndex('ix_items_label', 'items', ['label'])),
+    ]
+    runner = MigrationRunner(engine, migrations)
+    assert [migration.version for migration, _ in runner.plan()] == [1, 2, 3]
+    assert runner.run(target=2) == [1, 2]
+    assert runner.run() == [3]
+    assert runner.run() == []
+    assert runner.plan() == []
+    assert statuses(runner) == {1: 'applied', 2: 'applied', 3: 'applied'}
+    assert runner.index_state('ix_items_label') == 'valid'
+
+
+def test_add_column_skips_columns_that_exist(engine):
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE items (id INTEGER PRIMARY KEY, label VARCHAR(20))'))
+    runner = MigrationRunner(engine, [Migration(1, 'Add label', AddColumn('items', 'label', 'VARCHAR(20)'))])
+    assert runner.plan() == [(runner.migrations[0], [])]
+    assert runner.run() == [1]
+
+
+class FlakyWriter:
+    """Writes doubled values, failing once before the batch after ``fail_after`` rows."""
+
+    def __init__(self, fail_after):
+        self.fail_after = fail_after
+        self.written = []
+
+    def fetch(self, conn, after_id, limit):
+        return conn.execute(text(
+            'SELECT id, value FROM items WHERE id > :after_id AND doubled IS NULL ORDER BY id LIMIT :limit'
+        ), {'after_id': after_id, 'limit': limit}).fetchall()
+
+    def update(self, conn, rows):
+        if self.fail_after is not None and len(self.written) >= self.fail_after:
+            self.fail_after = None
+            raise RuntimeError('connection lost')
+        conn.execute(text('UPDATE items SET doubled = :doubled WHERE id = :id'),
+                     [{'id': row.id, 'doubled': row.value * 2} for row in rows])
+        self.written.extend(row.id for row in rows)
+
+
+def test_an_interrupted_backfill_resumes_from_its_checkpoint(engine):
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE items (id INTEGER PRIMARY KEY, value INTEGER, doubled INTEGER)'))
+        conn.execute(text('INSERT INTO items (id, value) VALUES (:id, :id)'), [{'id': n} for n in range(1, 26)])
+    writer = FlakyWriter(fail_after=10)
+    migration = Migration(1, 'Double values', Backfill('items.doubled', writer.fetch, writer.update))
+    runner = MigrationRunner(engine, [migration], batch_size=5)
+
+    with pytest.raises(RuntimeError):
+        runner.run()
+    assert statuses(runner) == {1: 'running'}
+    assert runner.checkpoint(migration) == '10'
+
+    assert runner.run() == [1]
+    # The batches committed before the failure were not written again.
+    assert writer.written == list(range(1, 26))
+    with engine.connect() as conn:
+        assert conn.execute(text('SELECT COUNT(*) FROM items WHERE doubled = value * 2')).scalar() == 25
+    assert statuses(runner) == {1: 'applied'}
+
+
+def test_the_app_migrations_upgrade_a_legacy_database(engine):
+    from migrate_db import MIGRATIONS
+    from url_utils import url_digest
+    with engine.begin() as conn:
+        conn.execute(text(
+            'CREATE TABLE urls (id INTEGER PRIMARY KEY, original_url VARCHAR(2048) NOT NULL, '
+            'short_code VARCHAR(50) NOT NULL UNIQUE, created_at TIMESTAMP, visits INTEGER DEFAULT 0)'
+        ))
+        conn.execute(text("INSERT INTO urls (original_url, short_code, visits) VALUES (:url, :code, 3)"),
+                     [{'url': f'https://example.com/{n}', 'code': f'old{n}'} for n in range(12)])
+    runner = MigrationRunner(engine, MIGRATIONS, batch_size=5)
+
+    assert runner.run() == [migration.version for migration in MIGRATIONS]
+    columns = {column['name'] for column in inspect(engine).get_columns('urls')}
+    assert {'url_hash', 'expires_at', 'user_id', 'last_checked'} <= columns
+    assert {'ix_urls_url_hash', 'ix_urls_last_checked'} <= {index['name'] for index in inspect(engine).get_indexes('urls')}
+    with engine.connect() as conn:
+        rows = conn.execute(text('SELECT original_url, url_hash, visits FROM urls')).fetchall()
+    assert len(rows) == 12
+    assert all(row.url_hash == url_digest(row.original_url) and row.visits == 3 for row in rows)
+    assert runner.run() == []
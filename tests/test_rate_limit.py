@@ -0,0 +1,87 @@
+import logging
+
+import pytest
+
+import rate_limit
+from rate_limit import LoadShedder, RateLimit, TokenBucketStore, parse_limits
+
+
+def test_parse_limits(caplog):
+    with caplog.at_level(logging.WARNING):
+        limits = parse_limits('shorten=20/60, api=60/minute,batch=5/h,broken=x/60,')
+    assert sorted(limits) == ['api', 'batch', 'shorten']
+    assert (limits['shorten'].capacity, limits['shorten'].rate) == (20, 20 / 60)
+    assert limits['api'].rate == 1
+    assert limits['batch'].rate == 5 / 3600
+    assert 'Invalid rate limit for broken' in caplog.text
+    assert parse_limits('') == {}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, 'time', lambda: now[0])
+    return now
+
+
+def test_buckets_allow_a_burst_then_refill(tmp_path, clock):
+    store = TokenBucketStore(path=str(tmp_path / 'buckets.db'))
+    limit = RateLimit(3, 60)
+    assert [store.take('api:ip:1', limit)[0] for _ in range(3)] == [True, True, True]
+    assert store.take('api:ip:1', limit) == (False, 20)
+    # Other clients have buckets of their own.
+    assert store.take('api:ip:2', limit) == (True, 0)
+
+    clock[0] += 20
+    assert store.take('api:ip:1', limit) == (True, 0)
+    assert store.take('api:ip:1', limit)[0] is False
+    clock[0] += 3600
+    assert [store.take('api:ip:1', limit)[0] for _ in range(4)] == [True, True, True, False]
+
+
+def test_buckets_are_shared_by_the_workers_of_a_host(tmp_path, clock):
+    path = str(tmp_path / 'buckets.db')
+    workers = [TokenBucketStore(path=path) for _ in range(3)]
+    limit = RateLimit(4, 60)
+    allowed = [worker.take('shorten:ip:1', limit)[0] for _ in range(2) for worker in workers]
+    assert allowed == [True, True, True, True, False, False]
+
+
+def test_an_unusable_store_fails_open(tmp_path):
+    store = TokenBucketStore(path=str(tmp_path))
+    assert store.take('api:ip:1', RateLimit(1, 60)) == (True, 0)
+    assert store.take('api:ip:1', RateLimit(1, 60)) == (True, 0)
+
+
+def test_load_shedder_sheds_under_pool_pressure_and_recovers(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(rate_limit.time, 'monotonic', lambda: now[0])
+    shedder = LoadShedder(threshold=0.1, half_life=2.0)
+    assert not shedder.should_shed()
+    for _ in range(20):
+        shedder.observe(1.0)
+    assert shedder.should_shed()
+    now[0] += 20
+    assert not shedder.should_shed()
+    assert shedder.shed == 1
+
+
+def test_api_requests_over_the_limit_get_429(app, tmp_path, monkeypatch):
+    import app as app_module
+    monkeypatch.setattr(app_module, 'rate_limits', {'api': RateLimit(2, 60)})
+    monkeypatch.setattr(app_module, 'rate_limiter', TokenBucketStore(path=str(tmp_path / 'buckets.db')))
+    client = app.test_client()
+    statuses = [client.post('/api/shorten', json={'url': f'https://example.com/limited{n}'}).status_code
+                for n in range(3)]
+    assert statuses == [201, 201, 429]
+    response = client.post('/api/shorten', json={'url': 'https://example.com/limited'})
+    assert int(response.headers['Retry-After']) > 0
+    assert response.get_json() == {'error': 'Too many requests, please slow down.'}
+
+
+def test_requests_are_shed_under_pool_pressure(app, monkeypatch):
+    import app as app_module
+    monkeypatch.setattr(app_module.load_shedder, 'should_shed', lambda: True)
+    response = app.test_client().post('/api/shorten', json={'url': 'https://example.com/shed'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
@@ -0,0 +1,73 @@
+import os
+import time
+import threading
+from datetime import datetime, timedelta
+
+from recent_feed import RecentFeed, RecentURL
+
+
+class Database:
+    def __init__(self, delay=0.0):
+        self.rows = []
+        self.delay = delay
+        self.queries = 0
+
+    def create(self, short_code):
+        row = RecentURL(short_code=short_code, original_url=f'https://example.com/{short_code}',
+                        created_at=datetime.utcnow() + timedelta(microseconds=len(self.rows)))
+        self.rows.append(row)
+        return row
+
+    def load(self, limit):
+        self.queries += 1
+        time.sleep(self.delay)
+        return list(reversed(self.rows))[:limit]
+
+
+def age_rebuild_stamp(feed, seconds):
+    past = time.time() - seconds
+    os.utime(feed.path + '.rebuilt', (past, past))
+
+
+def test_links_from_other_hosts_appear_although_local_adds_keep_writing(tmp_path):
+    database = Database()
+    feed = RecentFeed(path=str(tmp_path / 'recent.json'), loader=database.load, refresh_interval=60)
+    feed.add([database.create('local1')])
+    database.create('remote1')
+    age_rebuild_stamp(feed, 120)
+    # A local add rewrites the list file but does not count as a rebuild.
+    feed.add([database.create('local2')])
+    assert [entry.short_code for entry in feed.get(10)] == ['local2', 'remote1', 'local1']
+
+
+def test_only_one_rebuild_runs_at_a_time(tmp_path):
+    database = Database()
+    feed = RecentFeed(path=str(tmp_path / 'recent.json'), loader=database.load, refresh_interval=60)
+    database.create('first')
+    feed.get(10)
+    age_rebuild_stamp(feed, 120)
+    database.delay = 0.2
+    database.queries = 0
+    workers = [RecentFeed(path=feed.path, loader=database.load, refresh_interval=60) for _ in range(8)]
+    threads = [threading.Thread(target=worker.get, args=(10,)) for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert database.queries == 1
+
+
+def test_recent_list_reads_visits_and_expiry_live(app, db):
+    from app import URL, recent_urls, save_new_url
+    save_new_url(URL(original_url='https://example.com/live', short_code='live01',
+                     expiration_type='visits', max_visits=2))
+    save_new_url(URL(original_url='https://example.com/gone', short_code='gone01'))
+    URL.query.filter_by(short_code='live01').update({'visits': 2})
+    # Deleted on another host: still in this host's feed.
+    URL.query.filter_by(short_code='gone01').delete()
+    db.session.commit()
+
+    entries = {entry.short_code: entry for entry in recent_urls(100)}
+    assert entries['live01'].visits == 2
+    assert entries['live01'].is_expired()
+    assert 'gone01' not in entries
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def flask_calls(app, monkeypatch):
+    """Record the requests that get past the fast path into Flask."""
+    calls = []
+    fast_path = app.wsgi_app
+    flask_app = fast_path.wsgi_app
+
+    def wrapped(environ, start_response):
+        calls.append(environ['PATH_INFO'])
+        return flask_app(environ, start_response)
+
+    monkeypatch.setattr(fast_path, 'wsgi_app', wrapped)
+    return calls
+
+
+def add_url(db, short_code, **kwargs):
+    from app import URL
+    db.session.add(URL(original_url=f'https://example.com/{short_code}', short_code=short_code, **kwargs))
+    db.session.commit()
+
+
+def test_cached_redirect_is_served_before_flask(app, db, flask_calls):
+    from app import visit_buffer
+    add_url(db, 'fast1')
+    client = app.test_client()
+
+    first = client.get('/fast1')
+    pending = visit_buffer.stats()['pending_events']
+    second = client.get('/fast1', headers={'Referer': 'https://referrer.example/'})
+
+    assert first.status_code == second.status_code == 301
+    assert second.headers['Location'] == 'https://example.com/fast1'
+    assert second.headers['Cache-Control'] == first.headers['Cache-Control']
+    assert flask_calls == ['/fast1']
+    assert visit_buffer.stats()['pending_events'] == pending + 1
+
+
+def test_visit_limited_and_expired_links_go_to_flask(app, db, flask_calls):
+    add_url(db, 'fastlim', expiration_type='visits', max_visits=5)
+    add_url(db, 'fastexp', expiration_type='date', expires_at=datetime.utcnow() + timedelta(seconds=1))
+    client = app.test_client()
+
+    assert [client.get('/fastlim').status_code for _ in range(2)] == [302, 302]
+    client.get('/fastexp')
+    from app import url_cache
+    url_cache.get('fastexp').expires_at = datetime.utcnow() - timedelta(seconds=1)
+
+    assert client.get('/fastexp').status_code == 410
+    assert flask_calls == ['/fastlim', '/fastlim', '/fastexp', '/fastexp']
+
+
+def test_other_routes_and_methods_go_to_flask(app, flask_calls):
+    client = app.test_client()
+    client.get('/health')
+    client.post('/fast1')
+    client.get('/missing-code')
+    assert flask_calls == ['/health', '/fast1', '/missing-code']
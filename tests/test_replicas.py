@@ -0,0 +1,68 @@
+import time
+
+import pytest
+from sqlalchemy import insert
+
+from replicas import ReplicaSet
+
+
+@pytest.fixture
+def replica_set(app, db, tmp_path, monkeypatch):
+    """A replica holding its own copy of ``rep01``, so reads show where they went."""
+    from app import URL
+    replica_set = ReplicaSet([f"sqlite:///{tmp_path / 'replica.db'}"], max_lag=5.0, check_interval=3600)
+    replica = replica_set.replicas[0]
+    db.metadata.create_all(replica.engine)
+    with replica.engine.begin() as conn:
+        conn.execute(insert(URL.__table__), [{'original_url': 'https://example.com/replica', 'short_code': 'rep01',
+                                              'visits': 0, 'is_custom': False, 'is_active': True,
+                                              'expiration_type': 'never'}])
+    replica_set.check(replica)
+    db.session.add(URL(original_url='https://example.com/primary', short_code='rep01'))
+    db.session.add(URL(original_url='https://example.com/primary-only', short_code='rep02'))
+    db.session.commit()
+    monkeypatch.setitem(db.session.session_factory.kw, 'replicas', replica_set)
+    # Requests share the test's app context, and so its session.
+    db.session.remove()
+    yield replica_set
+    db.session.remove()
+    monkeypatch.undo()
+    URL.query.filter(URL.short_code.in_(['rep01', 'rep02'])).delete()
+    db.session.commit()
+    replica.engine.dispose()
+
+
+def status_url(client, short_code):
+    response = client.get(f'/api/status/{short_code}')
+    return response.status_code, response.get_json().get('original_url')
+
+
+def test_reads_go_to_a_replica_and_misses_to_the_primary(app, replica_set):
+    client = app.test_client()
+    assert status_url(client, 'rep01') == (200, 'https://example.com/replica')
+    # Not replicated yet: looked up again on the primary.
+    assert status_url(client, 'rep02') == (200, 'https://example.com/primary-only')
+    assert status_url(client, 'rep03') == (404, None)
+
+
+def test_clients_read_their_own_writes_from_the_primary(app, replica_set):
+    client = app.test_client()
+    assert client.post('/api/shorten', json={'url': 'https://example.com/replica-write'}).status_code == 201
+    assert status_url(client, 'rep01') == (200, 'https://example.com/primary')
+    # Other clients are not pinned.
+    assert status_url(app.test_client(), 'rep01') == (200, 'https://example.com/replica')
+
+    with client.session_transaction() as session:
+        session['_primary_until'] = time.time() - 1
+    assert status_url(client, 'rep01') == (200, 'https://example.com/replica')
+
+
+def test_a_lagging_replica_is_not_read(app, replica_set):
+    replica = replica_set.replicas[0]
+    replica.lag = replica_set.max_lag + 1
+    assert status_url(app.test_client(), 'rep01') == (200, 'https://example.com/primary')
+    assert replica_set.fallbacks >= 1
+
+    replica.lag = 0.0
+    replica.healthy = False
+    assert status_url(app.test_client(), 'rep01') == (200, 'https://example.com/primary')
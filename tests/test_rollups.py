@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert, select
+
+from rollups import agent_class, aggregate, bucket_end, bucket_start, prune_rollups, referer_domain
+from visit_buffer import ClickEventRecord
+
+
+def test_referer_domains_and_agent_classes():
+    assert referer_domain(None) == '(direct)'
+    assert referer_domain('https://www.Example.com/a?b') == 'example.com'
+    assert referer_domain('not a url') == '(invalid)'
+    assert agent_class('Googlebot/2.1') == 'bot'
+    assert agent_class('Mozilla/5.0 (iPad; CPU OS 17_0)') == 'tablet'
+    assert agent_class('Mozilla/5.0 (Linux; Android 14)') == 'tablet'
+    assert agent_class('Mozilla/5.0 (Linux; Android 14) Mobile') == 'mobile'
+    assert agent_class('Mozilla/5.0 (Windows NT 10.0; Win64; x64)') == 'desktop'
+    assert agent_class('') == 'unknown'
+
+
+def test_buckets():
+    moment = datetime(2026, 3, 4, 5, 6, 7, 8)
+    assert bucket_start(moment, 'minute') == datetime(2026, 3, 4, 5, 6)
+    assert bucket_start(moment, 'hour') == datetime(2026, 3, 4, 5)
+    assert bucket_start(moment, 'day') == datetime(2026, 3, 4)
+    assert bucket_end(moment, 'hour') == datetime(2026, 3, 4, 6)
+    assert bucket_end(datetime(2026, 3, 4, 5), 'hour') == datetime(2026, 3, 4, 5)
+
+
+def test_aggregate_counts_each_click_once_per_granularity():
+    clicked_at = datetime(2026, 3, 4, 5, 6, 7)
+    events = [
+        ClickEventRecord(1, 'a', clicked_at, 'https://www.news.example/x', 'curl/8.0', None),
+        ClickEventRecord(1, 'a', clicked_at + timedelta(minutes=1), 'https://news.example/y', 'curl/8.0', None),
+        ClickEventRecord(2, 'b', clicked_at, None, None, None),
+    ]
+    rows = aggregate(events)
+    counts = {(row['url_id'], row['granularity'], row['bucket_start']): row['clicks'] for row in rows}
+    assert counts == {
+        (1, 'day', datetime(2026, 3, 4)): 2,
+        (1, 'hour', datetime(2026, 3, 4, 5)): 2,
+        (1, 'minute', datetime(2026, 3, 4, 5, 6)): 1,
+        (1, 'minute', datetime(2026, 3, 4, 5, 7)): 1,
+        (2, 'day', datetime(2026, 3, 4)): 1,
+        (2, 'hour', datetime(2026, 3, 4, 5)): 1,
+        (2, 'minute', datetime(2026, 3, 4, 5, 6)): 1,
+    }
+    assert {(row['referer_domain'], row['agent_class']) for row in rows} == {
+        ('news.example', 'bot'), ('(direct)', 'unknown')
+    }
+    keys = [(row['url_id'], row['granularity'], row['bucket_start']) for row in rows]
+    assert keys == sorted(keys)
+
+
+def test_prune_rollups_keeps_buckets_inside_the_retention(tmp_path):
+    from app import ClickRollup
+    engine = create_engine(f"sqlite:///{tmp_path / 'rollups.db'}")
+    table = ClickRollup.__table__
+    table.create(engine)
+    now = datetime(2026, 3, 10, 12)
+    buckets = [('minute', now - timedelta(days=3)), ('minute', now - timedelta(hours=1)),
+               ('hour', now - timedelta(days=40)), ('hour', now - timedelta(days=20)),
+               ('day', now - timedelta(days=400))]
+    with engine.begin() as conn:
+        conn.execute(insert(table), [{
+            'url_id': 1, 'granularity': granularity, 'bucket_start': bucket_start(moment, granularity),
+            'referer_domain': '(direct)', 'agent_class': 'unknown', 'clicks': 1
+        } for granularity, moment in buckets])
+
+    assert prune_rollups(engine, {'minute': 2, 'hour': 30, 'day': 0}, now=now) == 2
+    with engine.connect() as conn:
+        kept = conn.execute(select(table.c.granularity, table.c.bucket_start).order_by(table.c.bucket_start)).all()
+    assert [tuple(row) for row in kept] == [
+        ('day', datetime(2025, 2, 3)),
+        ('hour', datetime(2026, 2, 18, 12)),
+        ('minute', datetime(2026, 3, 10, 11)),
+    ]
+    engine.dispose()
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import url_cache as url_cache_module
+from url_cache import CachedURL, URLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(url_cache_module.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = URLCache(max_size=2, ttl=60)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = URLCache(max_size=10, ttl=60)
+    cache.put('a', 1)
+    clock[0] += 60
+    assert cache.get('a') == 1
+    clock[0] += 1
+    assert cache.get('a') is None
+    stats = cache.stats()
+    assert (stats['size'], stats['expirations']) == (0, 1)
+    assert (stats['hits'], stats['misses'], stats['hit_ratio']) == (1, 1, 0.5)
+
+
+def test_invalidation_and_a_disabled_cache(clock):
+    cache = URLCache(max_size=10, ttl=60)
+    for key in 'abc':
+        cache.put(key, key)
+    cache.invalidate_many(['a', 'b', 'missing'])
+    assert [cache.get(key) for key in 'abc'] == [None, None, 'c']
+
+    disabled = URLCache(max_size=0)
+    disabled.put('a', 1)
+    assert disabled.get('a') is None
+    assert disabled.stats()['misses'] == 0
+
+
+def test_cached_urls_only_evaluate_date_expiry():
+    now = datetime(2026, 1, 1)
+    assert not CachedURL(1, 'https://example.com/').is_expired(now)
+    assert CachedURL(1, 'https://example.com/', now - timedelta(seconds=1), 'date').is_expired(now)
+    assert not CachedURL(1, 'https://example.com/', now - timedelta(seconds=1), 'visits', 5).is_expired(now)
+    assert CachedURL(1, 'https://example.com/', None, 'visits', 5).is_visit_limited()
+    assert not CachedURL(1, 'https://example.com/', None, 'date', 5).is_visit_limited()
+
+
+def test_deleted_links_stop_redirecting(app, db):
+    from app import URL, User, url_cache
+    user = User(username='deleter', email='deleter@example.com')
+    user.set_password('secret')
+    db.session.add(user)
+    db.session.commit()
+    url = URL(original_url='https://example.com/deleted', short_code='gone01', user_id=user.id)
+    db.session.add(url)
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+    assert client.get('/gone01').status_code == 301
+    assert url_cache.get('gone01') is not None
+
+    assert client.get(f'/url/delete/{url.id}').status_code == 302
+    assert url_cache.get('gone01') is None
+    assert client.get('/gone01').status_code == 404
+    db.session.delete(db.session.get(User, user.id))
+    db.session.commit()
@@ -0,0 +1,55 @@
+import threading
+
+from url_shortener import CompactURLStore, ReadThroughURLStore, URLRecord, URLStore
+
+
+class CountingBackend(URLStore):
+    def __init__(self, records):
+        self.records = {record.short_code: record for record in records}
+
+    def lookup(self, short_code):
+        return self.records.get(short_code)
+
+
+def test_read_through_refreshes_do_not_grow_the_front_tier():
+    records = [URLRecord(f'code{n}', f'https://example.com/{n}', id=n + 1) for n in range(10)]
+    store = ReadThroughURLStore(CountingBackend(records), ttl=-1)
+    for _ in range(2000):
+        for record in records:
+            assert store.lookup(record.short_code).original_url == record.original_url
+    assert len(store.front) == 10
+    assert len(store.front._flags) == 10
+
+
+def test_tombstones_are_compacted():
+    store = CompactURLStore()
+    codes = [store.create(f'https://example.com/{n}') for n in range(5000)]
+    for code in codes[:4000]:
+        store.delete(code)
+    store.put(URLRecord('moved', 'https://example.com/a'))
+    store.put(URLRecord('moved', 'https://example.com/b'))
+    assert len(store) == 1001
+    assert len(store._flags) < 2 * len(store) + 1024
+    assert store.lookup(codes[0]) is None
+    assert store.lookup(codes[4500]).original_url == 'https://example.com/4500'
+    assert store.find_by_url('https://example.com/4999') == codes[4999]
+    assert store.lookup('moved').original_url == 'https://example.com/b'
+
+
+def test_concurrent_puts_and_deletes():
+    store = CompactURLStore(dedup=False)
+
+    def churn(worker):
+        for n in range(3000):
+            code = f'w{worker}c{n % 50}'
+            store.put(URLRecord(code, f'https://example.com/{worker}/{n % 7}'))
+            if n % 3 == 0:
+                store.delete(code)
+
+    threads = [threading.Thread(target=churn, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    live = [f'w{worker}c{n}' for worker in range(8) for n in range(50) if store.lookup(f'w{worker}c{n}')]
+    assert len(store) == len(live)
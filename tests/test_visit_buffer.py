@@ -0,0 +1,109 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from visit_buffer import VisitBuffer
+
+
+class Sink:
+    def __init__(self, failures=0):
+        self.batches = []
+        self.failures = failures
+
+    def __call__(self, batch, events):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('database unavailable')
+        self.batches.append(({url_id: pending.count for url_id, pending in batch}, events))
+
+
+@pytest.fixture
+def make_buffer():
+    """Builds buffers that are drained and stopped after the test, not at exit."""
+    buffers = []
+
+    def make(sink, **kwargs):
+        buffers.append((sink, VisitBuffer(sink, **kwargs)))
+        return buffers[-1][1]
+    yield make
+    for sink, buffer in buffers:
+        if isinstance(sink, Sink):
+            sink.failures = 0
+        buffer.stop()
+
+
+def test_visits_are_coalesced_per_url_until_flushed(make_buffer):
+    sink = Sink()
+    buffer = make_buffer(sink, flush_interval=3600)
+    for url_id in (1, 2, 1, 1):
+        buffer.record(url_id, short_code=f'code{url_id}', visited_at=datetime.utcnow())
+    buffer.record_event(3, short_code='code3', visited_at=datetime.utcnow())
+    assert sink.batches == []
+    assert buffer.pending_count() == 4
+
+    assert buffer.flush() == 4
+    counts, events = sink.batches[0]
+    assert counts == {1: 3, 2: 1}
+    assert [event.url_id for event in events] == [1, 2, 1, 1, 3]
+    assert buffer.flush() == 0
+    assert len(sink.batches) == 1
+
+
+def test_failed_flushes_are_retried_with_later_visits(make_buffer):
+    sink = Sink(failures=1)
+    buffer = make_buffer(sink, flush_interval=3600)
+    buffer.record(1, visited_at=datetime.utcnow())
+    buffer.record(1, visited_at=datetime.utcnow())
+    assert buffer.flush() == 0
+    assert buffer.stats()['failed_flushes'] == 1
+
+    buffer.record(1, visited_at=datetime.utcnow())
+    assert buffer.flush() == 3
+    counts, events = sink.batches[0]
+    assert counts == {1: 3}
+    assert len(events) == 3
+
+
+def test_retained_events_are_bounded_while_the_database_is_down(make_buffer):
+    sink = Sink(failures=10)
+    buffer = make_buffer(sink, flush_interval=3600, max_retained=5)
+    for url_id in range(8):
+        buffer.record(url_id, visited_at=datetime.utcnow())
+    buffer.flush()
+    stats = buffer.stats()
+    assert stats['pending_events'] == 5
+    assert stats['pending_urls'] == 5
+    assert stats['dropped_visits'] == 3
+
+
+def test_a_full_buffer_wakes_the_flusher(make_buffer):
+    sink = Sink()
+    buffer = make_buffer(sink, flush_interval=3600, max_pending=3)
+    for url_id in range(3):
+        buffer.record(url_id, visited_at=datetime.utcnow())
+    deadline = time.monotonic() + 5
+    while not sink.batches and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sink.batches[0][0] == {0: 1, 1: 1, 2: 1}
+
+
+def test_flush_visits_writes_counters_click_events_and_rollups(app, db, make_buffer):
+    from app import URL, ClickEvent, ClickRollup, flush_visits
+    url = URL(original_url='https://example.com/counted', short_code='count01')
+    db.session.add(url)
+    db.session.commit()
+    buffer = make_buffer(flush_visits, flush_interval=3600)
+    clicked_at = datetime(2026, 1, 2, 3, 4, 5)
+    for referer in ('https://www.news.example/a', 'https://www.news.example/b', None):
+        buffer.record(url.id, short_code='count01', referer=referer, user_agent='Mozilla/5.0 (iPhone; Mobile)',
+                      ip_address='192.0.2.1', visited_at=clicked_at)
+
+    assert buffer.flush() == 3
+    db.session.expire_all()
+    assert db.session.get(URL, url.id).visits == 3
+    assert db.session.get(URL, url.id).last_visited == clicked_at
+    assert ClickEvent.query.filter_by(url_id=url.id).count() == 3
+    hours = {(rollup.referer_domain, rollup.agent_class): rollup.clicks
+             for rollup in ClickRollup.query.filter_by(url_id=url.id, granularity='hour')}
+    assert hours == {('news.example', 'mobile'): 2, ('(direct)', 'mobile'): 1}
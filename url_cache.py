@@ -0,0 +1,97 @@
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+
+class CachedURL:
+    """Redirect metadata for one short code, detached from the ORM session."""
+
+    __slots__ = ('id', 'original_url', 'expires_at', 'expiration_type', 'max_visits')
+
+    def __init__(self, id, original_url, expires_at=None, expiration_type='never', max_visits=None):
+        self.id = id
+        self.original_url = original_url
+        self.expires_at = expires_at
+        self.expiration_type = expiration_type
+        self.max_visits = max_visits
+
+    def is_visit_limited(self):
+        return self.max_visits is not None and self.expiration_type in ['visits', 'both']
+
+    def is_expired(self, now=None):
+        # Visit limits need the live counter, so only date expiry is evaluated
+        # here; clicks on visit-limited links are checked by claim_visit().
+        if self.expiration_type not in ['date', 'both'] or self.expires_at is None:
+            return False
+        return (now or datetime.utcnow()) > self.expires_at
+
+
+class URLCache:
+    """Bounded LRU cache with a per-entry TTL, shared by all threads of a worker."""
+
+    def __init__(self, max_size=10000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        if self.max_size <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, stored_at = item
+            if now - stored_at > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -1,60 +1,496 @@
-import random
-import string
+import os
+import re
+import time
 import logging
+import threading
+from array import array
 from datetime import datetime
 from collections import deque
+from code_allocator import CodeAllocator, LocalBlockSource, BASE, DIGITS, encode_base62
+
+EXPIRATION_TYPES = ('never', 'date', 'visits', 'both')
+URL_PREFIXES = ('', 'http://', 'https://', 'http://www.', 'https://www.')
+
+_EMPTY = -1
+_DELETED = -2
+_FLAG_DELETED = 0x80
+_FLAG_CUSTOM = 0x40
+# Deleted rows are reclaimed once there are more of them than live rows, and at least this many.
+_COMPACT_MIN_TOMBSTONES = 1024
+_CODE_RE = re.compile(r'^[0-9A-Za-z]{1,10}$')
+# _LENGTH_OFFSETS[n] is the first integer key used by codes of length n, so
+# that e.g. "0" and "00" get different keys.
+_LENGTH_OFFSETS = [0, 0]
+for _length in range(2, 12):
+    _LENGTH_OFFSETS.append(_LENGTH_OFFSETS[-1] + BASE ** (_length - 1))
+
+
+def code_key(code):
+    """Map an alphanumeric code of up to 10 characters to a unique 64-bit int, else None."""
+    if not _CODE_RE.match(code):
+        return None
+    number = 0
+    for char in code:
+        number = number * BASE + DIGITS[char]
+    return _LENGTH_OFFSETS[len(code)] + number
+
+
+def key_code(key):
+    length = 1
+    while key >= _LENGTH_OFFSETS[length + 1]:
+        length += 1
+    return encode_base62(key - _LENGTH_OFFSETS[length], length)
+
+
+class URLRecord:
+    """A short code mapping as returned by every URLStore."""
+
+    __slots__ = ('id', 'short_code', 'original_url', 'expires_at', 'expiration_type', 'max_visits', 'visits')
+
+    def __init__(self, short_code, original_url, expires_at=None, expiration_type='never',
+                 max_visits=None, visits=0, id=None):
+        self.id = id
+        self.short_code = short_code
+        self.original_url = original_url
+        self.expires_at = expires_at
+        self.expiration_type = expiration_type or 'never'
+        self.max_visits = max_visits
+        self.visits = visits or 0
+
+    def is_visit_limited(self):
+        return self.max_visits is not None and self.expiration_type in ['visits', 'both']
+
+    def is_expired(self, now=None):
+        time_expired = self.expires_at is not None and (now or datetime.utcnow()) > self.expires_at
+        visits_expired = self.is_visit_limited() and self.visits >= self.max_visits
+        if self.expiration_type == 'both':
+            return time_expired or visits_expired
+        elif self.expiration_type == 'date':
+            return time_expired
+        elif self.expiration_type == 'visits':
+            return visits_expired
+        return False
+
+
+class URLStore:
+    """Interface shared by the in-memory and the SQLAlchemy storage backends."""
+
+    def lookup(self, short_code):
+        """Return the URLRecord for ``short_code`` or None."""
+        raise NotImplementedError
+
+    def create(self, original_url, short_code=None, expires_at=None, expiration_type='never', max_visits=None):
+        """Store a new mapping and return its short code (allocated when not given)."""
+        raise NotImplementedError
+
+    def find_by_url(self, original_url):
+        """Return the short code of a live, non-custom mapping for ``original_url`` or None."""
+        raise NotImplementedError
+
+    def record_visit(self, short_code):
+        """Count one visit and return the new visit count, or None if the code is unknown."""
+        raise NotImplementedError
+
+    def claim_visit(self, short_code):
+        """Atomically count one visit of a live visit-limited mapping.
+
+        Returns the URLRecord after the visit, or None if the code is unknown,
+        not visit-limited, expired or has no visits left.
+        """
+        raise NotImplementedError
+
+    def delete(self, short_code):
+        raise NotImplementedError
+
+    def invalidate(self, short_codes):
+        """Forget cached state for ``short_codes``; a no-op for stores without a cache."""
+
+
+class CompactURLStore(URLStore):
+    """In-memory URL store laid out in flat arrays instead of Python objects.
+
+    Each mapping is a row index into parallel typed arrays; the URL itself is
+    stored as UTF-8 in one contiguous bytearray, addressed through an offsets
+    array, with a one-byte code for common scheme prefixes. Alphanumeric codes
+    of up to 10 characters are interned as 64-bit integers; other custom
+    aliases fall back to a small dict. Lookups go through open-addressing
+    hash tables that store only 4-byte row indexes. The fixed cost is about 50
+    bytes per mapping plus the URL bytes, versus several hundred bytes for
+    dicts of strings. Deleted rows are tombstoned and reclaimed by a
+    compaction once they outnumber the live ones. All access is serialized
+    by one lock, as the store is shared by a worker's request threads.
+    """
+
+    def __init__(self, initial_capacity=1024, dedup=True, allocator=None):
+        self.dedup = dedup
+        self.allocator = allocator or CodeAllocator(LocalBlockSource(), os.urandom(32))
+        self._lock = threading.RLock()
+        self._reset(initial_capacity)
+
+    def _reset(self, initial_capacity):
+        self._keys = array('q')
+        self._offsets = array('Q', [0])
+        self._url_bytes = bytearray()
+        self._flags = bytearray()
+        self._expires = array('I')
+        self._max_visits = array('i')
+        self._visits = array('i')
+        self._ids = array('i')
+        self._loaded_at = array('I')
+        self._aliases = {}
+        self._alias_rows = {}
+        self._live = 0
+        capacity = 1
+        while capacity < initial_capacity:
+            capacity *= 2
+        self._code_table = array('i', [_EMPTY]) * capacity
+        self._code_used = 0
+        self._url_table = array('i', [_EMPTY]) * capacity if self.dedup else None
+        self._url_used = 0
+
+    def __len__(self):
+        return self._live
+
+    def lookup(self, short_code, max_age=None):
+        with self._lock:
+            row = self._find_code(short_code)
+            if row is None:
+                return None
+            if max_age is not None and time.monotonic() - self._loaded_at[row] > max_age:
+                return None
+            return self._record(row, short_code)
+
+    def create(self, original_url, short_code=None, expires_at=None, expiration_type='never',
+               max_visits=None, visits=0, url_id=None, is_custom=None):
+        with self._lock:
+            if short_code is None:
+                short_code = self.allocator.next_code()
+                while self._find_code(short_code) is not None:
+                    short_code = self.allocator.next_code()
+                is_custom = False if is_custom is None else is_custom
+            elif self._find_code(short_code) is not None:
+                raise ValueError(f"Short code already exists: {short_code}")
+            elif is_custom is None:
+                is_custom = True
+            self._append(short_code, original_url, expires_at, expiration_type, max_visits, visits, url_id, is_custom)
+            return short_code
+
+    def put(self, record, is_custom=False):
+        """Insert or replace a mapping, e.g. when filling a read-through tier.
+
+        A mapping whose URL and custom flag are unchanged, the usual case for
+        a refresh, is overwritten in place instead of leaving a tombstone.
+        """
+        with self._lock:
+            row = self._find_code(record.short_code)
+            if (row is not None and self._url_at(row) == self._encode_url(record.original_url)
+                    and bool(self._flags[row] & _FLAG_CUSTOM) == bool(is_custom)):
+                self._flags[row] = (self._flags[row] & ~0x03) | EXPIRATION_TYPES.index(record.expiration_type or 'never')
+                self._set_values(row, record.expires_at, record.max_visits, record.visits, record.id)
+                return
+            self.delete(record.short_code)
+            self._append(record.short_code, record.original_url, record.expires_at, record.expiration_type,
+                         record.max_visits, record.visits, record.id, is_custom)
+
+    def find_by_url(self, original_url):
+        if not self.dedup:
+            return None
+        encoded = self._encode_url(original_url)
+        with self._lock:
+            mask = len(self._url_table) - 1
+            slot = hash(encoded) & mask
+            found = None
+            while True:
+                row = self._url_table[slot]
+                if row == _EMPTY:
+                    break
+                if row >= 0 and not self._flags[row] & (_FLAG_DELETED | _FLAG_CUSTOM) and self._url_at(row) == encoded:
+                    found = row
+                slot = (slot + 1) & mask
+            if found is None:
+                return None
+            short_code = self._code_at(found)
+            if self._record(found, short_code).is_expired():
+                return None
+            return short_code
+
+    def record_visit(self, short_code):
+        with self._lock:
+            row = self._find_code(short_code)
+            if row is None:
+                return None
+            self._visits[row] += 1
+            return self._visits[row]
+
+    def claim_visit(self, short_code):
+        with self._lock:
+            row = self._find_code(short_code)
+            if row is None:
+                return None
+            record = self._record(row, short_code)
+            if not record.is_visit_limited() or record.is_expired():
+                return None
+            self._visits[row] += 1
+            record.visits += 1
+            return record
+
+    def delete(self, short_code):
+        with self._lock:
+            key = code_key(short_code)
+            if key is None:
+                row = self._aliases.pop(short_code, None)
+                if row is None:
+                    return False
+                del self._alias_rows[row]
+            else:
+                slot = self._code_slot(key)
+                if slot is None:
+                    return False
+                row = self._code_table[slot]
+                self._code_table[slot] = _DELETED
+            self._flags[row] |= _FLAG_DELETED
+            self._live -= 1
+            if len(self._flags) - self._live > max(_COMPACT_MIN_TOMBSTONES, self._live):
+                self._compact()
+            return True
+
+    def invalidate(self, short_codes):
+        with self._lock:
+            for short_code in short_codes:
+                self.delete(short_code)
+
+    def memory_usage(self):
+        """Approximate bytes held by the store's arrays and buffers."""
+        with self._lock:
+            arrays = [self._keys, self._offsets, self._expires, self._max_visits, self._visits,
+                      self._ids, self._loaded_at, self._code_table]
+            if self._url_table is not None:
+                arrays.append(self._url_table)
+            total = sum(len(a) * a.itemsize for a in arrays)
+            return total + len(self._url_bytes) + len(self._flags)
+
+    def _compact(self):
+        """Rewrite the arrays with live rows only, once tombstones outnumber them."""
+        rows = [(self._record(row, self._code_at(row)), bool(self._flags[row] & _FLAG_CUSTOM), self._loaded_at[row])
+                for row in self._live_rows()]
+        self._reset(self._table_size(len(rows)))
+        for record, is_custom, loaded_at in rows:
+            self._append(record.short_code, record.original_url, record.expires_at, record.expiration_type,
+                         record.max_visits, record.visits, record.id, is_custom)
+            self._loaded_at[-1] = loaded_at
+
+    def _set_values(self, row, expires_at, max_visits, visits, url_id):
+        self._expires[row] = int((expires_at - datetime(1970, 1, 1)).total_seconds()) if expires_at else 0
+        self._max_visits[row] = max_visits if max_visits is not None else -1
+        self._visits[row] = visits or 0
+        self._ids[row] = url_id or 0
+        self._loaded_at[row] = int(time.monotonic())
+
+    def _append(self, short_code, original_url, expires_at, expiration_type, max_visits, visits, url_id, is_custom):
+        row = len(self._flags)
+        key = code_key(short_code)
+        encoded = self._encode_url(original_url)
+        prefix, body = encoded[0], encoded[1:]
+
+        self._keys.append(key if key is not None else -1)
+        self._url_bytes += body
+        self._offsets.append(len(self._url_bytes))
+        flags = EXPIRATION_TYPES.index(expiration_type or 'never') | (prefix << 2)
+        if is_custom:
+            flags |= _FLAG_CUSTOM
+        self._flags.append(flags)
+        for values in (self._expires, self._max_visits, self._visits, self._ids, self._loaded_at):
+            values.append(0)
+        self._set_values(row, expires_at, max_visits, visits, url_id)
+        self._live += 1
+
+        if key is None:
+            self._aliases[short_code] = row
+            self._alias_rows[row] = short_code
+        else:
+            self._code_used = self._insert_slot(self._code_table, key * 0x9E3779B97F4A7C15 >> 7, row, self._code_used)
+            if self._code_used * 10 > len(self._code_table) * 7:
+                self._code_table, self._code_used = self._rehash_codes()
+        if self.dedup and not is_custom:
+            self._url_used = self._insert_slot(self._url_table, hash(encoded), row, self._url_used)
+            if self._url_used * 10 > len(self._url_table) * 7:
+                self._url_table, self._url_used = self._rehash_urls()
+
+    def _record(self, row, short_code):
+        flags = self._flags[row]
+        expires = self._expires[row]
+        max_visits = self._max_visits[row]
+        return URLRecord(
+            short_code,
+            self._decode_url(self._url_at(row)),
+            datetime.utcfromtimestamp(expires) if expires else None,
+            EXPIRATION_TYPES[flags & 0x03],
+            max_visits if max_visits >= 0 else None,
+            self._visits[row],
+            self._ids[row] or None
+        )
+
+    def _find_code(self, short_code):
+        key = code_key(short_code)
+        if key is None:
+            return self._aliases.get(short_code)
+        slot = self._code_slot(key)
+        return None if slot is None else self._code_table[slot]
+
+    def _code_slot(self, key):
+        table = self._code_table
+        mask = len(table) - 1
+        slot = (key * 0x9E3779B97F4A7C15 >> 7) & mask
+        while True:
+            row = table[slot]
+            if row == _EMPTY:
+                return None
+            if row >= 0 and self._keys[row] == key:
+                return slot
+            slot = (slot + 1) & mask
+
+    def _code_at(self, row):
+        key = self._keys[row]
+        return self._alias_rows[row] if key < 0 else key_code(key)
+
+    def _url_at(self, row):
+        prefix = (self._flags[row] >> 2) & 0x0f
+        return bytes([prefix]) + bytes(self._url_bytes[self._offsets[row]:self._offsets[row + 1]])
+
+    @staticmethod
+    def _encode_url(url):
+        # Longest matching prefix wins: 'https://www.' before 'https://'.
+        for index in range(len(URL_PREFIXES) - 1, 0, -1):
+            if url.startswith(URL_PREFIXES[index]):
+                return bytes([index]) + url[len(URL_PREFIXES[index]):].encode('utf-8')
+        return b'\x00' + url.encode('utf-8')
+
+    @staticmethod
+    def _decode_url(encoded):
+        return URL_PREFIXES[encoded[0]] + encoded[1:].decode('utf-8')
+
+    @staticmethod
+    def _insert_slot(table, hash_value, row, used):
+        mask = len(table) - 1
+        slot = hash_value & mask
+        while table[slot] >= 0:
+            slot = (slot + 1) & mask
+        if table[slot] == _EMPTY:
+            used += 1
+        table[slot] = row
+        return used
+
+    def _live_rows(self):
+        return (row for row in range(len(self._flags)) if not self._flags[row] & _FLAG_DELETED)
+
+    def _rehash_codes(self):
+        live = [row for row in self._live_rows() if self._keys[row] >= 0]
+        table = array('i', [_EMPTY]) * self._table_size(len(live))
+        used = 0
+        for row in live:
+            used = self._insert_slot(table, self._keys[row] * 0x9E3779B97F4A7C15 >> 7, row, used)
+        return table, used
+
+    def _rehash_urls(self):
+        live = [row for row in self._live_rows() if not self._flags[row] & _FLAG_CUSTOM]
+        table = array('i', [_EMPTY]) * self._table_size(len(live))
+        used = 0
+        for row in live:
+            used = self._insert_slot(table, hash(self._url_at(row)), row, used)
+        return table, used
+
+    @staticmethod
+    def _table_size(count):
+        size = 1024
+        while size * 7 < count * 20:
+            size *= 2
+        return size
+
+
+class ReadThroughURLStore(URLStore):
+    """Serves lookups from a CompactURLStore tier in front of another store.
+
+    Entries are trusted for ``ttl`` seconds. Visit-limited mappings are never
+    kept in the front tier because they depend on the live counter.
+    """
+
+    def __init__(self, backend, front=None, ttl=300):
+        self.backend = backend
+        self.front = front or CompactURLStore(dedup=False)
+        self.ttl = ttl
+
+    def lookup(self, short_code):
+        record = self.front.lookup(short_code, max_age=self.ttl)
+        if record is not None:
+            return record
+        record = self.backend.lookup(short_code)
+        if record is not None and not record.is_visit_limited():
+            self.front.put(record)
+        return record
+
+    def create(self, original_url, short_code=None, expires_at=None, expiration_type='never', max_visits=None):
+        return self.backend.create(original_url, short_code, expires_at, expiration_type, max_visits)
+
+    def find_by_url(self, original_url):
+        return self.backend.find_by_url(original_url)
+
+    def record_visit(self, short_code):
+        return self.backend.record_visit(short_code)
+
+    def claim_visit(self, short_code):
+        return self.backend.claim_visit(short_code)
+
+    def delete(self, short_code):
+        self.front.delete(short_code)
+        return self.backend.delete(short_code)
+
+    def invalidate(self, short_codes):
+        self.front.invalidate(short_codes)
+        self.backend.invalidate(short_codes)
+
 
 class URLShortener:
-    
-    
-    def __init__(self):
-        self.url_to_code = {}  
-        self.code_to_url = {}  
-        self.recent_urls = deque(maxlen=100)  
-        self.code_length = 6  
+
+
+    def __init__(self, store=None):
+        self.store = store or CompactURLStore()
+        self.recent_urls = deque(maxlen=100)
+        self.code_length = 6
         logging.debug("URL Shortener initialized")
-    
-    def shorten(self, url):
-        if url in self.url_to_code:
-            code = self.url_to_code[url]
+
+    def shorten(self, url, expires_at=None, expiration_type='never', max_visits=None):
+        code = self.store.find_by_url(url)
+        if code is not None:
             logging.debug(f"URL already shortened: {url} -> {code}")
             return code
-        
-        code = self._generate_unique_code()
-        
-        self.url_to_code[url] = code
-        self.code_to_url[code] = url
-        
+
+        code = self.store.create(url, expires_at=expires_at, expiration_type=expiration_type, max_visits=max_visits)
+
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self.recent_urls.appendleft({
             'original_url': url,
             'short_code': code,
             'timestamp': timestamp
         })
-        
+
         logging.debug(f"URL shortened: {url} -> {code}")
         return code
-    
+
     def expand(self, code):
-        
-        if code in self.code_to_url:
-            url = self.code_to_url[code]
-            logging.debug(f"URL expanded: {code} -> {url}")
-            return url
+
+        record = self.store.lookup(code)
+        if record is not None and record.is_visit_limited():
+            record = self.store.claim_visit(code)
+        elif record is not None and not record.is_expired():
+            self.store.record_visit(code)
+        else:
+            record = None
+        if record is not None:
+            logging.debug(f"URL expanded: {code} -> {record.original_url}")
+            return record.original_url
         logging.debug(f"No URL found for code: {code}")
         return None
-    
+
     def get_recent_urls(self, count=10):
-        
+
         return list(self.recent_urls)[:count]
-    
-    def _generate_unique_code(self):
-        
-        while True:
-            code = ''.join(random.choices(
-                string.ascii_letters + string.digits, 
-                k=self.code_length
-            ))
-            
-            if code not in self.code_to_url:
-                return code
@@ -0,0 +1,38 @@
+import hashlib
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_PORTS = {'http': '80', 'https': '443'}
+
+
+def canonicalize_url(url):
+    """Normalize parts of a URL that do not change what it points to.
+
+    Lowercases the scheme and host, drops the scheme's default port and
+    gives an empty path a trailing slash. Path, query and fragment are case
+    sensitive and are kept as they are.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+
+    userinfo, _, hostport = parts.netloc.rpartition('@')
+    port = ''
+    if hostport.startswith('['):
+        end = hostport.find(']')
+        host, rest = hostport[:end + 1], hostport[end + 1:]
+        if rest.startswith(':'):
+            port = rest[1:]
+    elif ':' in hostport:
+        host, _, port = hostport.rpartition(':')
+    else:
+        host = hostport
+
+    if port and DEFAULT_PORTS.get(scheme) == port:
+        port = ''
+    netloc = (userinfo + '@' if userinfo else '') + host.lower() + (':' + port if port else '')
+
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, parts.fragment))
+
+
+def url_digest(url):
+    """Fixed-width SHA-256 hex digest of the canonical form of ``url``."""
+    return hashlib.sha256(canonicalize_url(url).encode('utf-8')).hexdigest()
@@ -0,0 +1,178 @@
+import os
+import time
+import atexit
+import logging
+import threading
+
+
+class PendingVisits:
+    """Coalesced visits for one URL since the last flush."""
+
+    __slots__ = ('count', 'last_visited')
+
+    def __init__(self):
+        self.count = 0
+        self.last_visited = None
+
+
+class ClickEventRecord:
+    """One raw click, kept until it is appended to the click event log."""
+
+    __slots__ = ('url_id', 'short_code', 'clicked_at', 'referer', 'user_agent', 'ip_address')
+
+    def __init__(self, url_id, short_code, clicked_at, referer, user_agent, ip_address):
+        self.url_id = url_id
+        self.short_code = short_code
+        self.clicked_at = clicked_at
+        self.referer = referer
+        self.user_agent = user_agent
+        self.ip_address = ip_address
+
+
+class VisitBuffer:
+    """Per-worker write-behind buffer for visit counters.
+
+    Visits are aggregated per URL id and handed to ``flush_callback`` as a list
+    of ``(url_id, PendingVisits)`` pairs together with the list of raw
+    ``ClickEventRecord`` objects, either every ``flush_interval`` seconds or as
+    soon as ``max_pending`` distinct URLs or clicks are waiting. A
+    ``flush_interval`` of 0 disables buffering and flushes inside ``record``.
+    """
+
+    def __init__(self, flush_callback, flush_interval=5.0, max_pending=1000, max_retained=100000):
+        self.flush_callback = flush_callback
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retained = max_retained
+        self._pending = {}
+        self._events = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._stopped = False
+        self.flushes = 0
+        self.flushed_visits = 0
+        self.failed_flushes = 0
+        self.dropped_visits = 0
+        atexit.register(self.stop)
+
+    def record(self, url_id, short_code=None, referer=None, user_agent=None, ip_address=None, visited_at=None):
+        with self._lock:
+            self._ensure_worker()
+            pending = self._pending.get(url_id)
+            if pending is None:
+                pending = self._pending[url_id] = PendingVisits()
+            pending.count += 1
+            pending.last_visited = visited_at
+            self._events.append(ClickEventRecord(url_id, short_code, visited_at, referer, user_agent, ip_address))
+            size = max(len(self._pending), len(self._events))
+
+        if self.flush_interval <= 0 or self._stopped:
+            self.flush()
+        elif size >= self.max_pending:
+            self._wakeup.set()
+
+    def record_event(self, url_id, short_code=None, referer=None, user_agent=None, ip_address=None, visited_at=None):
+        """Log a click whose counter was already written elsewhere."""
+        with self._lock:
+            self._ensure_worker()
+            self._events.append(ClickEventRecord(url_id, short_code, visited_at, referer, user_agent, ip_address))
+            size = len(self._events)
+
+        if self.flush_interval <= 0 or self._stopped:
+            self.flush()
+        elif size >= self.max_pending:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write all pending visits; returns the number of visits written."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending and not self._events:
+                    return 0
+                batch = list(self._pending.items())
+                events = self._events
+                self._pending = {}
+                self._events = []
+
+            try:
+                self.flush_callback(batch, events)
+            except Exception as e:
+                self.failed_flushes += 1
+                logging.error(f"Error flushing visit buffer: {str(e)}")
+                self._requeue(batch, events)
+                return 0
+
+            count = sum(pending.count for _, pending in batch)
+            self.flushes += 1
+            self.flushed_visits += count
+            return count
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
+        if self._pid == os.getpid():
+            self.flush()
+
+    def pending_count(self):
+        with self._lock:
+            return sum(pending.count for pending in self._pending.values())
+
+    def stats(self):
+        return {
+            'pending_urls': len(self._pending),
+            'pending_visits': self.pending_count(),
+            'pending_events': len(self._events),
+            'flush_interval': self.flush_interval,
+            'flushes': self.flushes,
+            'flushed_visits': self.flushed_visits,
+            'failed_flushes': self.failed_flushes,
+            'dropped_visits': self.dropped_visits
+        }
+
+    def _requeue(self, batch, events):
+        # Put failed deltas back so the next flush retries them, merging with
+        # anything recorded meanwhile. Raw events beyond the retention bound
+        # are dropped oldest first; the counters are kept.
+        with self._lock:
+            self._events = events + self._events
+            overflow = len(self._events) - self.max_retained
+            if overflow > 0:
+                del self._events[:overflow]
+            for url_id, failed in batch:
+                pending = self._pending.get(url_id)
+                if pending is None:
+                    if len(self._pending) >= self.max_retained:
+                        self.dropped_visits += failed.count
+                        continue
+                    self._pending[url_id] = failed
+                else:
+                    pending.count += failed.count
+                    if pending.last_visited is None:
+                        pending.last_visited = failed.last_visited
+
+    def _ensure_worker(self):
+        # Called with self._lock held. Threads do not survive fork, so a
+        # worker forked from a preloaded master starts its own flusher and
+        # discards whatever the parent had buffered (the parent flushes it).
+        pid = os.getpid()
+        if self._pid != pid:
+            if self._pid is not None:
+                self._pending = {}
+                self._events = []
+            self._pid = pid
+            self._thread = None
+        if self._thread is None and self.flush_interval > 0:
+            self._thread = threading.Thread(target=self._run, name='visit-buffer-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            started = time.monotonic()
+            count = self.flush()
+            if count:
+                logging.debug(f"Flushed {count} buffered visits in {(time.monotonic() - started) * 1000:.1f}ms")